@@ -0,0 +1,131 @@
+"""
+So sánh backend của embedding-api (PyTorch, ONNX, ONNX int8) trên máy hiện tại.
+
+Mỗi backend được dựng bằng đúng adapter mà service dùng (HuggingFaceEmbeddingAdapter /
+OnnxEmbeddingAdapter), rồi đo trên cùng một tập text:
+- single_ms: độ trễ trung vị của embed() một câu (đường đi của chat)
+- texts/s: thông lượng embed_batch (đường đi của indexing)
+- cosine: độ tương đồng cosine với vector PyTorch (mean / min), backend có min < --min-cosine là FAIL
+
+Tập text: file .txt (mỗi dòng một text) hoặc .jsonl có trường "text"; bỏ trống thì dùng câu mẫu.
+
+    python scripts/benchmark_embedding_backends.py --texts chunks.jsonl --backends torch,onnx,onnx-int8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "embedding-api"))
+
+import numpy as np
+
+from src.infrastructure.huggingface_adapter import HuggingFaceEmbeddingAdapter
+from src.infrastructure.onnx_adapter import OnnxEmbeddingAdapter
+
+SAMPLE_TEXTS = [
+    "Thời gian thử việc tối đa là bao lâu?",
+    "Điều 25. Thời gian thử việc do hai bên thỏa thuận căn cứ vào tính chất và mức độ phức tạp của công việc.",
+    "Người sử dụng đất được Nhà nước giao đất, cho thuê đất có quyền và nghĩa vụ theo quy định của Luật Đất đai.",
+    "Tội trộm cắp tài sản bị phạt cải tạo không giam giữ đến 03 năm hoặc phạt tù từ 06 tháng đến 03 năm.",
+    "Hợp đồng lao động phải được giao kết bằng văn bản và được làm thành 02 bản, người lao động giữ 01 bản.",
+]
+
+
+def load_texts(path: str, limit: int):
+    if not path:
+        return (SAMPLE_TEXTS * (limit // len(SAMPLE_TEXTS) + 1))[:limit]
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    if path.endswith(".jsonl"):
+        lines = [json.loads(line)["text"] for line in lines]
+    return lines[:limit]
+
+
+def build_adapter(backend: str):
+    os.environ["EMBEDDING_ONNX_INT8"] = "true" if backend == "onnx-int8" else "false"
+    if backend == "torch":
+        return HuggingFaceEmbeddingAdapter()
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddingAdapter()
+    raise ValueError(f"Backend không hợp lệ: {backend} (torch | onnx | onnx-int8)")
+
+
+def benchmark(adapter, texts, single_runs: int):
+    adapter.embed_batch(texts[:8])  # warm-up
+
+    single = []
+    for text in texts[:single_runs]:
+        started = time.perf_counter()
+        adapter.embed(text)
+        single.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    vectors = np.asarray(adapter.embed_batch(texts), dtype=np.float32)
+    batch_s = time.perf_counter() - started
+    return {
+        "single_ms": round(statistics.median(single) * 1000, 2) if single else None,
+        "texts_per_second": round(len(texts) / batch_s, 1)
+    }, vectors
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", help="File .txt hoặc .jsonl chứa text cần embed")
+    parser.add_argument("--limit", type=int, default=512, help="Số text tối đa")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="Backend đầu tiên phải là torch (mốc so sánh)")
+    parser.add_argument("--single-runs", type=int, default=50, help="Số lần đo embed() một câu")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Cosine tối thiểu so với vector PyTorch")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if backends[0] != "torch":
+        parser.error("Backend đầu tiên phải là torch để làm mốc so sánh")
+
+    texts = load_texts(args.texts, args.limit)
+    print(f"Model: {os.getenv('MODEL_NAME', 'huyydangg/DEk21_hcmute_embedding')} | {len(texts)} texts")
+
+    results, baseline = [], None
+    for backend in backends:
+        print(f"[{backend}] Đang tải model...")
+        result, vectors = benchmark(build_adapter(backend), texts, args.single_runs)
+        result["backend"] = backend
+        if baseline is None:
+            baseline = vectors
+        else:
+            cos = cosine_rows(baseline, vectors)
+            result["cosine_mean"] = round(float(cos.mean()), 5)
+            result["cosine_min"] = round(float(cos.min()), 5)
+            result["parity"] = "PASS" if cos.min() >= args.min_cosine else "FAIL"
+        results.append(result)
+
+    base_tps = results[0]["texts_per_second"]
+    print("\n===== Kết quả =====")
+    print(f"{'backend':<10} {'single_ms':>10} {'texts/s':>9} {'speedup':>8} {'cos_mean':>9} {'cos_min':>9} {'parity':>7}")
+    for r in results:
+        r["speedup"] = round(r["texts_per_second"] / base_tps, 2) if base_tps else None
+        print(
+            f"{r['backend']:<10} {r['single_ms']:>10} {r['texts_per_second']:>9} {r['speedup']:>8} "
+            f"{r.get('cosine_mean', 1.0):>9} {r.get('cosine_min', 1.0):>9} {r.get('parity', '-'):>7}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if any(r.get("parity") == "FAIL" for r in results):
+        print(f"\nCó backend lệch quá ngưỡng cosine {args.min_cosine}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
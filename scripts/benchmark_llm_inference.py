@@ -0,0 +1,130 @@
+"""
+So sánh các LLM_INFERENCE_PROFILE của llm-gateway (fp16 gốc, cpu-bf16, cpu-int8) trên máy hiện tại.
+
+Mỗi profile được tải bằng đúng hàm load_causal_lm mà QwenLocalAdapter dùng, chạy warm-up
+rồi đo trên cùng một prompt pháp luật (thinking tắt, greedy):
+- load_s: thời gian tải model
+- ttft_ms: thời gian tới token đầu tiên (prefill + 1 token)
+- tokens/s: thông lượng decode với --max-new-tokens token
+- agree: tỉ lệ token trùng với profile đầu tiên (kiểm tra lượng tử hoá không làm lệch câu trả lời)
+
+    python scripts/benchmark_llm_inference.py --profiles fp16,cpu-bf16,cpu-int8 --threads 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "llm-gateway"))
+
+import torch
+from transformers import AutoTokenizer
+
+from src.infrastructure.inference_profile import INFERENCE_PROFILES, configure_cpu_threads, is_cpu_profile, load_causal_lm
+
+SYSTEM_PROMPT = "Bạn là trợ lý pháp luật Việt Nam. Trả lời ngắn gọn, trích dẫn điều luật."
+USER_PROMPT = (
+    "TÀI LIỆU:\n- Bộ luật Lao động 2019: Điều 25. Thời gian thử việc do hai bên thỏa thuận căn cứ vào "
+    "tính chất và mức độ phức tạp của công việc nhưng chỉ được thử việc một lần đối với một công việc.\n\n"
+    "CÂU HỎI: Thời gian thử việc tối đa đối với công việc cần trình độ cao đẳng là bao lâu?"
+)
+
+
+def build_inputs(tokenizer, model):
+    text = tokenizer.apply_chat_template(
+        [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": USER_PROMPT}],
+        tokenize=False,
+        add_generation_prompt=True,
+        enable_thinking=False
+    )
+    return tokenizer([text], return_tensors="pt").to(model.device)
+
+
+def timed_generate(model, tokenizer, inputs, max_new_tokens: int):
+    started = time.perf_counter()
+    with torch.no_grad():
+        output = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            min_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.pad_token_id
+        )
+    elapsed = time.perf_counter() - started
+    return output[0][inputs.input_ids.shape[1]:].tolist(), elapsed
+
+
+def benchmark_profile(model_name: str, profile: str, tokenizer, max_new_tokens: int, runs: int):
+    started = time.perf_counter()
+    model = load_causal_lm(model_name, profile)
+    load_s = time.perf_counter() - started
+
+    inputs = build_inputs(tokenizer, model)
+    timed_generate(model, tokenizer, inputs, 8)  # warm-up
+
+    ttft, decode, tokens = [], [], None
+    for _ in range(runs):
+        _, first = timed_generate(model, tokenizer, inputs, 1)
+        tokens, elapsed = timed_generate(model, tokenizer, inputs, max_new_tokens)
+        ttft.append(first)
+        decode.append(elapsed)
+
+    ttft_s = sorted(ttft)[len(ttft) // 2]
+    total_s = sorted(decode)[len(decode) // 2]
+    # Trừ phần prefill để ra thông lượng decode thuần
+    decode_s = max(total_s - ttft_s, 1e-9)
+    result = {
+        "profile": profile,
+        "device": str(model.device),
+        "dtype": str(model.dtype),
+        "prompt_tokens": inputs.input_ids.shape[1],
+        "load_s": round(load_s, 2),
+        "ttft_ms": round(ttft_s * 1000, 1),
+        "tokens_per_second": round((len(tokens) - 1) / decode_s, 2),
+        "tokens": tokens
+    }
+    del model
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("MODEL_NAME", "Qwen/Qwen3-0.6B"))
+    parser.add_argument("--profiles", default=",".join(INFERENCE_PROFILES), help="Danh sách profile, profile đầu là mốc so sánh")
+    parser.add_argument("--threads", type=int, default=None, help="Số thread intra-op cho các profile CPU (LLM_NUM_THREADS)")
+    parser.add_argument("--interop-threads", type=int, default=1, help="LLM_NUM_INTEROP_THREADS")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    if any(is_cpu_profile(p) for p in profiles):
+        print(f"Threads: {configure_cpu_threads(args.threads, args.interop_threads)}")
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model, trust_remote_code=True)
+    results = []
+    for profile in profiles:
+        print(f"[{profile}] Đang tải {args.model}...")
+        results.append(benchmark_profile(args.model, profile, tokenizer, args.max_new_tokens, args.runs))
+
+    baseline = results[0]
+    print("\n===== Kết quả =====")
+    print(f"{'profile':<10} {'device':<8} {'dtype':<16} {'load_s':>7} {'ttft_ms':>8} {'tok/s':>8} {'speedup':>8} {'agree':>6}")
+    for r in results:
+        same = sum(a == b for a, b in zip(r["tokens"], baseline["tokens"]))
+        r["speedup"] = round(r["tokens_per_second"] / baseline["tokens_per_second"], 2) if baseline["tokens_per_second"] else None
+        r["agree"] = round(same / max(len(baseline["tokens"]), 1), 3)
+        print(
+            f"{r['profile']:<10} {r['device']:<8} {r['dtype']:<16} {r['load_s']:>7} {r['ttft_ms']:>8} "
+            f"{r['tokens_per_second']:>8} {r['speedup']:>8} {r['agree']:>6.1%}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "tokens"} for r in results], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Chọn ngưỡng GATE_HIGH_SCORE / GATE_LOW_SCORE cho llm-gateway từ một tập câu hỏi có nhãn.
+
+File nhãn là JSONL, mỗi dòng một câu hỏi:
+    {"query": "Thời gian thử việc tối đa là bao lâu?", "relevant": true}
+hoặc dùng điều luật mong đợi để script tự gán nhãn theo kết quả top-1:
+    {"query": "...", "expected_article": "Điều 25", "expected_source": "bo_luat_lao_dong.pdf"}
+
+Script chạy đúng truy vấn semantic mà gateway dùng (hybrid alpha=0.5, limit=SEMANTIC_SEARCH_LIMIT)
+và RetrievalGate cũng chỉ so điểm của truy vấn này (không dùng kết quả strict/HyDE/article index),
+nên thang điểm khớp với điểm mà gate nhìn thấy.
+
+    python scripts/calibrate_retrieval_gate.py labelled_queries.jsonl --precision 0.95
+"""
+import argparse
+import json
+import os
+import sys
+
+import requests
+import weaviate
+
+CLASS_NAME = "LegalDocument"
+
+
+def load_labelled_queries(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def top_hit(client, embedding_url: str, query: str, limit: int):
+    res = requests.post(embedding_url, json={"text": query}, timeout=60)
+    res.raise_for_status()
+    vector = res.json()["embedding"]
+
+    response = (
+        client.query
+        .get(CLASS_NAME, ["source", "article"])
+        .with_hybrid(query=query, vector=vector, alpha=0.5, properties=["text", "source", "article^3", "chapter"])
+        .with_additional(["score"])
+        .with_limit(limit)
+        .do()
+    )
+    hits = response.get("data", {}).get("Get", {}).get(CLASS_NAME, []) or []
+    if not hits:
+        return None
+    best = max(hits, key=lambda h: float(h["_additional"]["score"]))
+    return float(best["_additional"]["score"]), best
+
+
+def is_relevant(sample: dict, hit: dict) -> bool:
+    if "relevant" in sample:
+        return bool(sample["relevant"])
+    if sample.get("expected_article") and hit.get("article") != sample["expected_article"]:
+        return False
+    if sample.get("expected_source") and hit.get("source") != sample["expected_source"]:
+        return False
+    return True
+
+
+def pick_high_threshold(scored, precision: float, min_support: int):
+    # Ngưỡng thấp nhất mà mọi câu có score >= ngưỡng đều đúng với tỉ lệ >= precision
+    for threshold, _ in sorted(scored):
+        above = [label for score, label in scored if score >= threshold]
+        if len(above) >= min_support and sum(above) / len(above) >= precision:
+            return threshold
+    return None
+
+
+def pick_low_threshold(scored, precision: float, min_support: int):
+    # Ngưỡng cao nhất mà các câu có score < ngưỡng đều sai với tỉ lệ >= precision
+    for threshold, _ in sorted(scored, reverse=True):
+        below = [label for score, label in scored if score < threshold]
+        if len(below) >= min_support and (len(below) - sum(below)) / len(below) >= precision:
+            return threshold
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("labelled_file")
+    parser.add_argument("--precision", type=float, default=0.95, help="Độ chính xác tối thiểu cho mỗi nhánh bỏ qua grader")
+    parser.add_argument("--min-support", type=int, default=5, help="Số câu tối thiểu nằm trong mỗi nhánh")
+    args = parser.parse_args()
+
+    weaviate_url = os.getenv("WEAVIATE_URL", "http://localhost:8080")
+    embedding_url = os.getenv("EMBEDDING_API_URL", "http://localhost:5000/embed")
+    limit = int(os.getenv("SEMANTIC_SEARCH_LIMIT", "8"))
+    client = weaviate.Client(url=weaviate_url, timeout_config=(5, 15))
+
+    scored = []
+    for sample in load_labelled_queries(args.labelled_file):
+        result = top_hit(client, embedding_url, sample["query"], limit)
+        if result is None:
+            print(f"[skip] Không có kết quả: {sample['query']}")
+            continue
+        score, hit = result
+        label = is_relevant(sample, hit)
+        scored.append((score, label))
+        print(f"{score:.4f} | {'REL' if label else '---'} | {sample['query']}")
+
+    if not scored:
+        print("Không có câu hỏi nào được chấm điểm.")
+        sys.exit(1)
+
+    high = pick_high_threshold(scored, args.precision, args.min_support)
+    low = pick_low_threshold(scored, args.precision, args.min_support)
+    if high is not None and low is not None and low > high:
+        low = high
+
+    skipped = sum(1 for score, _ in scored if (high is not None and score >= high) or (low is not None and score < low))
+    print("\n===== Kết quả =====")
+    print(f"Số câu: {len(scored)} | Tỉ lệ relevant: {sum(l for _, l in scored) / len(scored):.2%}")
+    print(f"Bỏ qua grader cho {skipped}/{len(scored)} câu ({skipped / len(scored):.2%})")
+    print(f"GATE_HIGH_SCORE={high if high is not None else ''}")
+    print(f"GATE_LOW_SCORE={low if low is not None else ''}")
+
+
+if __name__ == "__main__":
+    main()
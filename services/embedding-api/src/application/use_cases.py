@@ -1,4 +1,8 @@
-from src.domain.interfaces import IEmbeddingService
+import asyncio
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+import numpy as np
+from src.domain.interfaces import IEmbeddingService, IRerankService
 
 class CreateEmbeddingUseCase:
     def __init__(self, service: IEmbeddingService):
@@ -17,6 +21,12 @@ class CreateEmbeddingUseCase:
             "dimension": len(vector)
         }
 
+    def execute_matrix(self, text: str) -> np.ndarray:
+        """Vector dạng ma trận [1, dim] cho định dạng nhị phân"""
+        if not text:
+            raise ValueError("Text cannot be empty")
+        return np.asarray([self.service.embed(text)], dtype=np.float32)
+
 class HealthCheckUseCase:
     def __init__(self, service: IEmbeddingService):
         self.service = service
@@ -25,6 +35,13 @@ class HealthCheckUseCase:
         info = self.service.get_info()
         return {"status": "active", **info}
 
+class MetricsUseCase:
+    def __init__(self, service: IEmbeddingService):
+        self.service = service
+
+    def execute(self) -> dict:
+        return {"embedding": self.service.get_stats()}
+
 class BatchEmbeddingUseCase:
     def __init__(self, service: IEmbeddingService):
         self.service = service
@@ -33,9 +50,80 @@ class BatchEmbeddingUseCase:
         if not texts:
             return {"embeddings": []}
             
-        vectors = self.service.embed_batch(texts)
+        vectors, truncated = self.execute_matrix(texts)
+        return {
+            "embeddings": vectors.tolist(),
+            "count": vectors.shape[0],
+            "dimension": vectors.shape[1],
+            # Index (theo thứ tự đầu vào) của các text bị cắt tại max_seq_length
+            "truncated": truncated
+        }
+
+    def execute_matrix(self, texts: list[str]) -> Tuple[np.ndarray, List[int]]:
+        """Ma trận float32 [len(texts), dim] và index text bị cắt, không chuyển sang list"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32), []
+        return self.service.embed_batch_detailed(texts)
+
+class StreamEmbeddingUseCase:
+    """
+    Embed một luồng (id, text) không biết trước độ dài, trả kết quả theo từng cụm chunk_size.
+    Cụm tiếp theo được đọc từ request trong lúc cụm trước đang encode ở thread riêng,
+    nên model không phải chờ client gửi nốt dữ liệu.
+    """
+    def __init__(self, service: IEmbeddingService, chunk_size: int = 32):
+        self.service = service
+        self.chunk_size = chunk_size
+
+    async def execute(self, items: AsyncIterator[Tuple[Any, str]]) -> AsyncIterator[dict]:
+        pending = None
+        chunk: List[Tuple[Any, str]] = []
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) < self.chunk_size:
+                continue
+            if pending is not None:
+                for result in await pending:
+                    yield result
+            pending = asyncio.ensure_future(asyncio.to_thread(self._encode, chunk))
+            chunk = []
+
+        if pending is not None:
+            for result in await pending:
+                yield result
+        if chunk:
+            for result in await asyncio.to_thread(self._encode, chunk):
+                yield result
+
+    def _encode(self, chunk: List[Tuple[Any, str]]) -> List[dict]:
+        ids = [item_id for item_id, _ in chunk]
+        vectors, truncated = self.service.embed_batch_detailed([text for _, text in chunk])
+        truncated = set(truncated)
+        return [
+            {"id": item_id, "embedding": vectors[i].tolist(), "truncated": i in truncated}
+            for i, item_id in enumerate(ids)
+        ]
+
+class RerankUseCase:
+    def __init__(self, service: IRerankService):
+        self.service = service
+
+    def execute(self, query: str, passages: list[str], top_k: Optional[int] = None) -> dict:
+        if not query:
+            raise ValueError("Query cannot be empty")
+        if not passages:
+            return {"results": [], "count": 0}
+
+        scores = self.service.rerank(query, passages)
+        # Sắp xếp giảm dần theo điểm, giữ index gốc để client map lại
+        results = sorted(
+            ({"index": i, "score": float(s)} for i, s in enumerate(scores)),
+            key=lambda r: r["score"],
+            reverse=True
+        )
+        if top_k:
+            results = results[:top_k]
         return {
-            "embeddings": vectors,
-            "count": len(vectors),
-            "dimension": len(vectors[0]) if vectors else 0
-        }
\ No newline at end of file
+            "results": results,
+            "count": len(results)
+        }
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Tuple
+
+import numpy as np
 
 class IEmbeddingService(ABC):
     @abstractmethod
@@ -12,4 +14,22 @@ class IEmbeddingService(ABC):
     
     @abstractmethod
     def get_info(self) -> dict:
-        pass
\ No newline at end of file
+        pass
+
+    def embed_batch_detailed(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """(ma trận float32 [len(texts), dim], index các text dài hơn max_seq_length và bị cắt bớt khi encode)"""
+        return np.asarray(self.embed_batch(texts), dtype=np.float32).reshape(len(texts), -1), []
+
+    def get_stats(self) -> dict:
+        """Số liệu vận hành (batch, hàng đợi) cho /metrics; mặc định không có"""
+        return {}
+
+class IRerankService(ABC):
+    @abstractmethod
+    def rerank(self, query: str, passages: List[str]) -> List[float]:
+        """Trả về điểm liên quan của từng passage với query, đúng thứ tự đầu vào"""
+        pass
+
+    @abstractmethod
+    def get_info(self) -> dict:
+        pass
@@ -0,0 +1,47 @@
+from sentence_transformers import CrossEncoder
+import torch
+import logging
+import os
+from src.domain.interfaces import IRerankService
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderRerankAdapter(IRerankService):
+    def __init__(self):
+        # Cross-encoder đa ngôn ngữ cỡ nhỏ, đủ nhanh để chạy trên CPU
+        self.model_name = os.getenv("RERANK_MODEL_NAME", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+        self.model_path = "./models"
+        # Mặc định chạy trên CPU để không tranh GPU với model embedding
+        self.device = os.getenv("RERANK_DEVICE", "cpu")
+        self.batch_size = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        self.max_length = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+
+        logger.info(f"ĐANG KHỞI TẠO RERANKER: {self.model_name}")
+        logger.info(f"THIẾT BỊ SỬ DỤNG: {self.device.upper()}")
+
+        try:
+            self.model = CrossEncoder(
+                self.model_name,
+                device=self.device,
+                max_length=self.max_length,
+                cache_folder=self.model_path
+            )
+            logger.info(" Reranker đã tải thành công.")
+        except Exception as e:
+            logger.error(f" Lỗi tải reranker: {str(e)}")
+            raise e
+
+    def rerank(self, query: str, passages: list[str]) -> list[float]:
+        if not passages:
+            return []
+
+        pairs = [(query, p) for p in passages]
+        with torch.inference_mode():
+            scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return scores.tolist()
+
+    def get_info(self) -> dict:
+        return {
+            "rerank_model_name": self.model_name,
+            "rerank_device": self.device
+        }
@@ -1,7 +1,9 @@
 from sentence_transformers import SentenceTransformer
+import numpy as np
 import torch
 import logging
 import os
+from typing import List, Tuple
 from src.domain.interfaces import IEmbeddingService
 
 logger = logging.getLogger(__name__)
@@ -13,38 +15,88 @@ class HuggingFaceEmbeddingAdapter(IEmbeddingService):
         self.model_path = "./models"
         
         # Tự động chọn thiết bị
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = self._select_device()
+        # Batch theo ngân sách token (số text x độ dài token lớn nhất sau padding) thay vì số text cố định
+        self.tokens_per_batch = int(os.getenv("EMBED_TOKENS_PER_BATCH", "16384"))
+        self.max_texts_per_batch = int(os.getenv("EMBED_MAX_TEXTS_PER_BATCH", "256"))
         
         logger.info(f"ĐANG KHỞI TẠO MODEL: {self.model_name}")
         logger.info(f"THIẾT BỊ SỬ DỤNG: {self.device.upper()}")
 
         try:
-            self.model = SentenceTransformer(
-                self.model_name, 
-                device=self.device, 
-                cache_folder=self.model_path
-            )
+            self.model = self._load_model()
             logger.info(" Model đã tải thành công.")
         except Exception as e:
             logger.error(f" Lỗi tải model: {str(e)}")
             raise e
 
+    def _select_device(self) -> str:
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    def _load_model(self) -> SentenceTransformer:
+        return SentenceTransformer(
+            self.model_name, 
+            device=self.device, 
+            cache_folder=self.model_path
+        )
+
     def embed(self, text: str) -> list:
         embedding = self.model.encode(text)
         return embedding.tolist()
 
     def embed_batch(self, texts: list[str]) -> list[list[float]]:
         """Xử lý batch nhiều text cùng lúc để tăng tốc độ"""
+        vectors, _ = self.embed_batch_detailed(texts)
+        return vectors.tolist()
+
+    def embed_batch_detailed(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Sắp xếp text theo số token rồi chia bucket theo ngân sách token để text ngắn
+        không bị pad tới độ dài của text dài nhất. Kết quả trả về đúng thứ tự đầu vào,
+        kèm index các text vượt max_seq_length (bị cắt khi encode).
+        """
         if not texts:
-            return []
-        
-        # encode trả về numpy array -> convert to list
-        embeddings = self.model.encode(texts, batch_size=32, show_progress_bar=False)
-        return embeddings.tolist()
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32), []
+
+        max_len = self.model.max_seq_length
+        # Độ dài thật (kể cả token đặc biệt), không cắt, để biết text nào bị mất nội dung
+        lengths = [len(ids) for ids in self.model.tokenizer(texts, add_special_tokens=True, truncation=False)["input_ids"]]
+        truncated = [i for i, n in enumerate(lengths) if n > max_len]
+        if truncated:
+            logger.warning(f"{len(truncated)}/{len(texts)} text vượt max_seq_length={max_len}, bị cắt: {truncated[:20]}")
+
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+        result = np.zeros((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        for bucket in self._buckets(order, lengths, max_len):
+            embeddings = self.model.encode(
+                [texts[i] for i in bucket],
+                batch_size=len(bucket),
+                show_progress_bar=False
+            )
+            result[bucket] = embeddings
+
+        return result, truncated
+
+    def _buckets(self, order: List[int], lengths: List[int], max_len: int) -> List[List[int]]:
+        # order giảm dần theo độ dài -> phần tử đầu của bucket quyết định độ dài padding
+        buckets, current, padded_len = [], [], 0
+        for i in order:
+            if not current:
+                padded_len = min(lengths[i], max_len)
+            elif (len(current) + 1) * padded_len > self.tokens_per_batch or len(current) >= self.max_texts_per_batch:
+                buckets.append(current)
+                current, padded_len = [], min(lengths[i], max_len)
+            current.append(i)
+        if current:
+            buckets.append(current)
+        return buckets
 
     def get_info(self) -> dict:
         return {
             "model_name": self.model_name,
+            "backend": "torch",
             "device": self.device,
-            "cuda_available": torch.cuda.is_available()
+            "cuda_available": torch.cuda.is_available(),
+            "max_seq_length": self.model.max_seq_length,
+            "tokens_per_batch": self.tokens_per_batch
         }
\ No newline at end of file
@@ -0,0 +1,155 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from src.domain.interfaces import IEmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Histogram bucket cố định, đếm tích luỹ theo kiểu Prometheus (le = nhỏ hơn hoặc bằng)"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = list(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        self._count += 1
+        self._sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self._counts[i] += 1
+
+    def to_dict(self) -> dict:
+        buckets = {f"le_{bound:g}": count for bound, count in zip(self.buckets, self._counts)}
+        buckets["le_inf"] = self._count
+        return {
+            "buckets": buckets,
+            "count": self._count,
+            "sum": round(self._sum, 3),
+            "avg": round(self._sum / self._count, 3) if self._count else 0.0
+        }
+
+
+class _PendingText:
+    __slots__ = ("text", "future", "enqueued_at")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatchingEmbeddingService(IEmbeddingService):
+    """
+    Gom các request nhỏ đến gần như cùng lúc thành một lần model.encode: /embed đơn lẻ và
+    /embed/batch ít hơn max_batch_size text (gateway gộp truy vấn chat thành các batch 1-3 text).
+    Request đầu tiên mở cửa sổ max_wait_ms; batch chạy khi hết cửa sổ hoặc đủ max_batch_size.
+    Route là hàm đồng bộ (chạy trong threadpool của FastAPI) nên mỗi caller chỉ cần chờ
+    Future của mình; client không phải thay đổi gì.
+    """
+
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+    QUEUE_WAIT_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+    def __init__(self, service: IEmbeddingService, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: "queue.Queue[_PendingText]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_size_hist = Histogram(self.BATCH_SIZE_BUCKETS)
+        self._queue_wait_hist = Histogram(self.QUEUE_WAIT_MS_BUCKETS)
+        self._encode_ms_total = 0.0
+        self._errors = 0
+        self._bypassed = 0
+
+        threading.Thread(target=self._worker_loop, daemon=True).start()
+
+    def embed(self, text: str) -> List[float]:
+        pending = _PendingText(text)
+        self._queue.put(pending)
+        vector, _ = pending.future.result()
+        return vector.tolist()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        vectors, _ = self.embed_batch_detailed(texts)
+        return vectors.tolist()
+
+    def embed_batch_detailed(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        if not texts or len(texts) >= self.max_batch_size:
+            # Request batch đã đủ lớn, không cần xếp hàng
+            with self._stats_lock:
+                self._bypassed += 1
+            return self.service.embed_batch_detailed(texts)
+
+        pending = [_PendingText(text) for text in texts]
+        for item in pending:
+            self._queue.put(item)
+        results = [item.future.result() for item in pending]
+        truncated = [i for i, (_, is_truncated) in enumerate(results) if is_truncated]
+        return np.stack([vector for vector, _ in results]), truncated
+
+    def get_info(self) -> dict:
+        return {
+            **self.service.get_info(),
+            "micro_batching": {"max_batch_size": self.max_batch_size, "max_wait_ms": self.max_wait * 1000}
+        }
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            batches = self._batch_size_hist.to_dict()
+            return {
+                "batches": batches["count"],
+                "requests": int(batches["sum"]),
+                "errors": self._errors,
+                "bypassed_batches": self._bypassed,
+                "queue_size": self._queue.qsize(),
+                "avg_encode_ms": round(self._encode_ms_total / batches["count"], 2) if batches["count"] else 0.0,
+                "batch_size": batches,
+                "queue_wait_ms": self._queue_wait_hist.to_dict()
+            }
+
+    def _collect_batch(self) -> List[_PendingText]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Hết cửa sổ vẫn lấy nốt các request đã xếp hàng trong lúc batch trước chạy
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.monotonic()
+            try:
+                vectors, truncated = self.service.embed_batch_detailed([p.text for p in batch])
+                truncated = set(truncated)
+                for i, pending in enumerate(batch):
+                    pending.future.set_result((vectors[i], i in truncated))
+            except Exception as e:
+                logger.error(f"Micro-batch encode error ({len(batch)} texts): {e}")
+                for pending in batch:
+                    pending.future.set_exception(e)
+                with self._stats_lock:
+                    self._errors += 1
+
+            with self._stats_lock:
+                self._batch_size_hist.observe(len(batch))
+                self._encode_ms_total += (time.monotonic() - started) * 1000
+                for pending in batch:
+                    self._queue_wait_hist.observe((started - pending.enqueued_at) * 1000)
@@ -0,0 +1,65 @@
+import logging
+import os
+
+from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+from src.infrastructure.huggingface_adapter import HuggingFaceEmbeddingAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxEmbeddingAdapter(HuggingFaceEmbeddingAdapter):
+    """
+    Cùng model SentenceTransformer nhưng chạy trên ONNX Runtime (CPU), dành cho node không có GPU.
+    - Lần đầu chạy: export model sang ONNX (nếu repo chưa có sẵn) và lưu vào thư mục cache.
+    - EMBEDDING_ONNX_INT8=true: lượng tử hoá động int8 theo EMBEDDING_ONNX_QUANT_CONFIG
+      (arm64 | avx2 | avx512 | avx512_vnni), chỉ export một lần rồi dùng lại file đã lưu.
+    Tokenize, bucket theo độ dài và báo text bị cắt dùng chung với HuggingFaceEmbeddingAdapter.
+    Độ lệch so với vector PyTorch kiểm tra bằng scripts/benchmark_embedding_backends.py.
+    """
+
+    def __init__(self):
+        self.quantize = os.getenv("EMBEDDING_ONNX_INT8", "false").lower() == "true"
+        self.quant_config = os.getenv("EMBEDDING_ONNX_QUANT_CONFIG", "avx512_vnni")
+        self.onnx_file = None
+        super().__init__()
+
+    def _select_device(self) -> str:
+        return "cpu"
+
+    def _load_model(self) -> SentenceTransformer:
+        if not self.quantize:
+            self.onnx_file = "onnx/model.onnx"
+            return SentenceTransformer(
+                self.model_name,
+                device=self.device,
+                cache_folder=self.model_path,
+                backend="onnx"
+            )
+
+        export_dir = os.path.join(self.model_path, "onnx-export", self.model_name.replace("/", "__"))
+        self.onnx_file = f"onnx/model_qint8_{self.quant_config}.onnx"
+        if not os.path.exists(os.path.join(export_dir, self.onnx_file)):
+            logger.info(f"Export ONNX int8 ({self.quant_config}) cho {self.model_name} -> {export_dir}")
+            model = SentenceTransformer(
+                self.model_name,
+                device=self.device,
+                cache_folder=self.model_path,
+                backend="onnx"
+            )
+            model.save(export_dir)
+            export_dynamic_quantized_onnx_model(model, self.quant_config, export_dir)
+
+        return SentenceTransformer(
+            export_dir,
+            device=self.device,
+            backend="onnx",
+            model_kwargs={"file_name": self.onnx_file}
+        )
+
+    def get_info(self) -> dict:
+        return {
+            **super().get_info(),
+            "backend": "onnx",
+            "onnx_file": self.onnx_file
+        }
@@ -1,25 +1,48 @@
 from fastapi import FastAPI
 from src.presentation.routes import router
 from src.infrastructure.huggingface_adapter import HuggingFaceEmbeddingAdapter
-from src.application.use_cases import CreateEmbeddingUseCase, HealthCheckUseCase, BatchEmbeddingUseCase
+from src.infrastructure.cross_encoder_adapter import CrossEncoderRerankAdapter
+from src.infrastructure.onnx_adapter import OnnxEmbeddingAdapter
+from src.infrastructure.micro_batcher import MicroBatchingEmbeddingService
+from src.application.use_cases import CreateEmbeddingUseCase, HealthCheckUseCase, BatchEmbeddingUseCase, MetricsUseCase, RerankUseCase, StreamEmbeddingUseCase
 import logging
+import os
 
 # Cấu hình log
 logging.basicConfig(level=logging.INFO)
 
-embedding_service = HuggingFaceEmbeddingAdapter()
+# EMBEDDING_BACKEND=onnx: ONNX Runtime (tuỳ chọn int8) cho node chỉ có CPU
+if os.getenv("EMBEDDING_BACKEND", "torch").lower() == "onnx":
+    embedding_service = OnnxEmbeddingAdapter()
+else:
+    embedding_service = HuggingFaceEmbeddingAdapter()
+# Gom các request /embed đơn lẻ đồng thời thành một lần encode
+if os.getenv("EMBED_BATCH_ENABLED", "true").lower() == "true":
+    embedding_service = MicroBatchingEmbeddingService(
+        embedding_service,
+        max_batch_size=int(os.getenv("EMBED_BATCH_MAX_SIZE", "32")),
+        max_wait_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+    )
+# Reranker chạy cùng service nhưng có thể tắt để tiết kiệm RAM
+rerank_service = CrossEncoderRerankAdapter() if os.getenv("RERANK_ENABLED", "true").lower() == "true" else None
 
 # 2. KHỞI TẠO USE CASES
 create_uc = CreateEmbeddingUseCase(embedding_service)
 health_uc = HealthCheckUseCase(embedding_service)
 batch_uc = BatchEmbeddingUseCase(embedding_service)
+stream_uc = StreamEmbeddingUseCase(embedding_service, chunk_size=int(os.getenv("EMBED_STREAM_CHUNK_SIZE", "32")))
+metrics_uc = MetricsUseCase(embedding_service)
+rerank_uc = RerankUseCase(rerank_service) if rerank_service else None
 
 # Dependency Container đơn giản
 def get_dependencies():
     return {
         "create": create_uc,
         "health": health_uc,
-        "batch": batch_uc
+        "batch": batch_uc,
+        "stream": stream_uc,
+        "metrics": metrics_uc,
+        "rerank": rerank_uc
     }
 
 app = FastAPI(title="Vietnamese Law Embedding API ")
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
-from typing import List
-from src.application.use_cases import CreateEmbeddingUseCase, HealthCheckUseCase, BatchEmbeddingUseCase
+from typing import List, Optional
+from src.application.use_cases import CreateEmbeddingUseCase, HealthCheckUseCase, BatchEmbeddingUseCase, MetricsUseCase, RerankUseCase
+from src.presentation.vector_codec import VECTOR_MEDIA_TYPE, encode_vectors, negotiate_vector_dtype
 
 # DTO (Data Transfer Object)
 class TextRequest(BaseModel):
@@ -10,6 +15,11 @@ class TextRequest(BaseModel):
 class BatchTextRequest(BaseModel):
     texts: List[str]
 
+class RerankRequest(BaseModel):
+    query: str
+    passages: List[str]
+    top_k: Optional[int] = None
+
 router = APIRouter()
 
 # Dependency Injection helper (sẽ được override ở main.py)
@@ -17,12 +27,18 @@ def get_use_cases():
     raise NotImplementedError
 
 @router.post("/embed")
-def create_embedding(request: TextRequest, use_cases = Depends(get_use_cases)):
+def create_embedding(request: TextRequest, http_request: Request, use_cases = Depends(get_use_cases)):
     import logging
     logger = logging.getLogger("embedding-api")
     logger.info("Received single embedding request")
     try:
         create_use_case = use_cases["create"]
+        # Accept: application/x-vectors -> trả vector nhị phân thay cho JSON
+        dtype = negotiate_vector_dtype(http_request.headers.get("accept"))
+        if dtype:
+            matrix = create_use_case.execute_matrix(request.text)
+            logger.info(f"Completed single embedding request ({dtype} binary)")
+            return Response(content=encode_vectors(matrix, dtype), media_type=VECTOR_MEDIA_TYPE)
         result = create_use_case.execute(request.text)
         logger.info("Completed single embedding request")
         return result
@@ -33,13 +49,23 @@ def create_embedding(request: TextRequest, use_cases = Depends(get_use_cases)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/embed/batch")
-def create_batch_embedding(request: BatchTextRequest, use_cases = Depends(get_use_cases)):
+def create_batch_embedding(request: BatchTextRequest, http_request: Request, use_cases = Depends(get_use_cases)):
     """Endpoint xử lý nhiều text cùng lúc"""
     import logging
     logger = logging.getLogger("embedding-api")
     logger.info(f"Received batch embedding request: {len(request.texts)} texts")
     try:
         batch_use_case = use_cases["batch"]
+        dtype = negotiate_vector_dtype(http_request.headers.get("accept"))
+        if dtype:
+            matrix, truncated = batch_use_case.execute_matrix(request.texts)
+            logger.info(f"Completed batch embedding request: {len(request.texts)} texts ({dtype} binary)")
+            # Index text bị cắt đi kèm trong header vì body chỉ chứa vector
+            return Response(
+                content=encode_vectors(matrix, dtype),
+                media_type=VECTOR_MEDIA_TYPE,
+                headers={"X-Truncated": ",".join(map(str, truncated))}
+            )
         result = batch_use_case.execute(request.texts)
         logger.info(f"Completed batch embedding request: {len(request.texts)} texts")
         return result
@@ -47,6 +73,112 @@ def create_batch_embedding(request: BatchTextRequest, use_cases = Depends(get_us
         logger.error(f"Error in batch embedding: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    Với ASGI spec < 2.4, StreamingResponse chạy song song một task chờ http.disconnect bằng receive(),
+    task đó nuốt mất các phần body request chưa đọc. /embed/stream đọc request trong lúc đang trả
+    response nên bỏ task này (giống nhánh spec >= 2.4 của Starlette): client ngắt kết nối sẽ lỗi khi send.
+    """
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+async def _read_ndjson_items(http_request: Request):
+    """Đọc body NDJSON theo từng dòng ngay khi nhận được; mỗi dòng {"id": ..., "text": ...}"""
+    buffer = b""
+    index = 0
+    async for data in http_request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            # Dòng không có id thì dùng số thứ tự dòng
+            yield item.get("id", index), item["text"]
+            index += 1
+    if buffer.strip():
+        item = json.loads(buffer)
+        yield item.get("id", index), item["text"]
+
+_END_OF_STREAM = object()
+
+async def _drain_request(http_request: Request, items: asyncio.Queue):
+    """
+    Đọc hết request vào hàng đợi trong task riêng, không phụ thuộc tốc độ client đọc response.
+    Client half-duplex (requests/urllib3) chỉ đọc response sau khi gửi xong body: nếu server ngừng
+    đọc request khi buffer gửi đầy thì cả hai bên chờ nhau mãi.
+    """
+    try:
+        async for item in _read_ndjson_items(http_request):
+            items.put_nowait(item)
+        items.put_nowait(_END_OF_STREAM)
+    except Exception as e:
+        items.put_nowait(e)
+
+async def _queued_items(items: asyncio.Queue):
+    while True:
+        item = await items.get()
+        if item is _END_OF_STREAM:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+@router.post("/embed/stream")
+async def stream_embeddings(http_request: Request, use_cases = Depends(get_use_cases)):
+    """Nhận text dạng NDJSON, trả vector dạng NDJSON {"id", "embedding", "truncated"} theo từng cụm đã encode"""
+    import logging
+    logger = logging.getLogger("embedding-api")
+    stream_use_case = use_cases["stream"]
+
+    async def body():
+        count = 0
+        items: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.ensure_future(_drain_request(http_request, items))
+        try:
+            async for result in stream_use_case.execute(_queued_items(items)):
+                count += 1
+                yield json.dumps(result) + "\n"
+            logger.info(f"Completed streaming embedding request: {count} texts")
+        except Exception as e:
+            # Response đã bắt đầu (status 200) nên lỗi được báo bằng một dòng cuối
+            logger.error(f"Error in streaming embedding after {count} texts: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            reader.cancel()
+
+    logger.info("Received streaming embedding request")
+    return _DuplexStreamingResponse(body(), media_type="application/x-ndjson")
+
+@router.post("/rerank")
+def rerank_passages(request: RerankRequest, use_cases = Depends(get_use_cases)):
+    """Chấm điểm (query, passage) bằng cross-encoder, trả về index gốc theo thứ tự giảm dần"""
+    import logging
+    logger = logging.getLogger("embedding-api")
+    rerank_use_case = use_cases.get("rerank")
+    if rerank_use_case is None:
+        raise HTTPException(status_code=503, detail="Reranker is disabled")
+    logger.info(f"Received rerank request: {len(request.passages)} passages")
+    try:
+        result = rerank_use_case.execute(request.query, request.passages, request.top_k)
+        logger.info(f"Completed rerank request: {len(request.passages)} passages")
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in rerank: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/metrics")
+def get_metrics(use_cases = Depends(get_use_cases)):
+    """Histogram kích thước micro-batch và thời gian chờ trong hàng đợi của /embed"""
+    return use_cases["metrics"].execute()
+
 @router.get("/")
 def health_check(use_cases = Depends(get_use_cases)):
     return use_cases["health"].execute()
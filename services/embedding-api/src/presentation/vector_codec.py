@@ -0,0 +1,35 @@
+import struct
+from typing import Optional
+
+import numpy as np
+
+# Định dạng nhị phân cho vector (thay cho mảng float JSON):
+#   header 16 byte little-endian: magic "VEC1" | dtype (u8) | 3 byte dự trữ | rows (u32) | dim (u32)
+#   tiếp theo là rows x dim số thực little-endian, theo thứ tự hàng
+VECTOR_MEDIA_TYPE = "application/x-vectors"
+MAGIC = b"VEC1"
+HEADER = struct.Struct("<4sB3xII")
+DTYPE_CODES = {"float32": 1, "float16": 2}
+NUMPY_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+
+
+def negotiate_vector_dtype(accept: Optional[str]) -> Optional[str]:
+    """
+    Trả về dtype nếu client chấp nhận định dạng nhị phân, None nếu phải trả JSON.
+    Ví dụ Accept: "application/x-vectors; dtype=float16, application/json;q=0.5"
+    """
+    for media_range in (accept or "").split(","):
+        media_type, *params = [p.strip() for p in media_range.split(";")]
+        if media_type.lower() != VECTOR_MEDIA_TYPE:
+            continue
+        options = dict(p.split("=", 1) for p in params if "=" in p)
+        dtype = options.get("dtype", "float32").lower()
+        return dtype if dtype in DTYPE_CODES else "float32"
+    return None
+
+
+def encode_vectors(matrix: np.ndarray, dtype: str = "float32") -> bytes:
+    code = DTYPE_CODES[dtype]
+    data = np.ascontiguousarray(matrix, dtype=NUMPY_DTYPES[code])
+    rows, dim = data.shape
+    return HEADER.pack(MAGIC, code, rows, dim) + data.tobytes()
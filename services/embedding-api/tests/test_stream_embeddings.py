@@ -0,0 +1,77 @@
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+import requests
+
+uvicorn = pytest.importorskip("uvicorn")
+
+from fastapi import FastAPI
+
+from src.application.use_cases import StreamEmbeddingUseCase
+from src.domain.interfaces import IEmbeddingService
+from src.presentation import routes
+
+DIM = 768
+
+
+class ZeroEmbeddingService(IEmbeddingService):
+    def embed(self, text):
+        return [0.0] * DIM
+
+    def embed_batch(self, texts):
+        return [[0.0] * DIM for _ in texts]
+
+    def embed_batch_detailed(self, texts):
+        return np.zeros((len(texts), DIM), dtype=np.float32), []
+
+    def get_info(self):
+        return {}
+
+
+@pytest.fixture(scope="module")
+def stream_url():
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[routes.get_use_cases] = lambda: {
+        "stream": StreamEmbeddingUseCase(ZeroEmbeddingService(), chunk_size=32)
+    }
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    yield f"http://127.0.0.1:{port}/embed/stream"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+def test_stream_larger_than_socket_buffers(stream_url):
+    # Request và response đều vài chục MB, vượt buffer socket của kernel: client requests
+    # (half-duplex) gửi hết body rồi mới đọc response
+    count = 20000
+    article = "Người sử dụng lao động phải bảo đảm điều kiện làm việc. " * 70
+
+    def lines():
+        for i in range(count):
+            yield (json.dumps({"id": i, "text": f"Điều {i}. {article}"}, ensure_ascii=False) + "\n").encode("utf-8")
+
+    with requests.post(stream_url, data=lines(), stream=True, timeout=(5, 30)) as response:
+        response.raise_for_status()
+        ids = [json.loads(line)["id"] for line in response.iter_lines() if line]
+
+    assert ids == list(range(count))
+
+
+def test_stream_reports_invalid_line(stream_url):
+    body = b'{"id": 0, "text": "a"}\n{"id": 1}\n'
+    response = requests.post(stream_url, data=body, timeout=(5, 30))
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert "error" in results[-1]
@@ -1,3 +1,4 @@
+from typing import Iterator, List
 from src.infrastructure.gateway_api import GatewayAPI
 from src.domain.schemas import ChatResponse
 
@@ -8,12 +9,27 @@ class ChatService:
     def send_message(self, query: str) -> str:
         response = self.api.chat(query)
         
-        formatted_text = response.answer
-        if response.sources:
-            formatted_text += "\n\n---\n**Nguồn tham khảo:**\n"
-            for src in response.sources:
-                formatted_text += f"- {src}\n"
-        
+        return response.answer + self._format_sources(response.sources)
+
+    def stream_message(self, query: str) -> Iterator[str]:
+        """Trả về từng đoạn text để giao diện hiển thị dần, nguồn tham khảo ở cuối"""
+        for event in self.api.chat_stream(query):
+            if event.event == "token":
+                yield event.data.get("content", "")
+            elif event.event == "sources":
+                yield self._format_sources(event.data.get("sources", []))
+            elif event.event == "error":
+                yield f"\n\n Lỗi: {event.data.get('detail', '')}"
+                return
+            elif event.event == "done":
+                return
+
+    def _format_sources(self, sources: List[str]) -> str:
+        if not sources:
+            return ""
+        formatted_text = "\n\n---\n**Nguồn tham khảo:**\n"
+        for src in sources:
+            formatted_text += f"- {src}\n"
         return formatted_text
 
     def is_service_ready(self) -> bool:
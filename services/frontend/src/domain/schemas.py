@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class Message(BaseModel):
     role: str
@@ -9,6 +9,10 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[str] = []
 
+class StreamEvent(BaseModel):
+    event: str
+    data: Dict[str, Any] = {}
+
 class UploadStatus(BaseModel):
     success: bool
     message: str
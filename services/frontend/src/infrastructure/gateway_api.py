@@ -1,5 +1,7 @@
+import json
 import requests
-from src.domain.schemas import ChatResponse
+from typing import Iterator
+from src.domain.schemas import ChatResponse, StreamEvent
 
 class GatewayAPI:
     def __init__(self, base_url: str):
@@ -11,10 +13,48 @@ class GatewayAPI:
             if res.status_code == 200:
                 data = res.json()
                 return ChatResponse(answer=data.get("answer"), sources=data.get("sources", []))
+            if res.status_code == 429:
+                return ChatResponse(answer=self._busy_message(res), sources=[])
             return ChatResponse(answer=f" Lỗi Server: {res.status_code}", sources=[])
         except Exception as e:
             return ChatResponse(answer=f" Không thể kết nối AI: {str(e)}", sources=[])
 
+    def chat_stream(self, query: str) -> Iterator[StreamEvent]:
+        """Đọc Server-Sent Events từ /chat/stream, trả về từng event khi nhận được"""
+        try:
+            with requests.post(
+                f"{self.base_url}/chat/stream",
+                json={"query": query},
+                stream=True,
+                timeout=(5, 300)
+            ) as res:
+                if res.status_code == 429:
+                    yield StreamEvent(event="error", data={"detail": self._busy_message(res)})
+                    return
+                if res.status_code != 200:
+                    yield StreamEvent(event="error", data={"detail": f"Lỗi Server: {res.status_code}"})
+                    return
+
+                event_name, data_lines = "message", []
+                for line in res.iter_lines(decode_unicode=True):
+                    if line is None:
+                        continue
+                    if line == "":
+                        if data_lines:
+                            yield StreamEvent(event=event_name, data=json.loads("\n".join(data_lines)))
+                        event_name, data_lines = "message", []
+                    elif line.startswith("event:"):
+                        event_name = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[len("data:"):].strip())
+        except Exception as e:
+            yield StreamEvent(event="error", data={"detail": f"Không thể kết nối AI: {str(e)}"})
+
+    @staticmethod
+    def _busy_message(res) -> str:
+        retry_after = res.headers.get("Retry-After", "vài")
+        return f" Hệ thống đang quá tải, vui lòng thử lại sau {retry_after} giây."
+
     def check_health(self) -> bool:
         try:
             res = requests.get(f"{self.base_url}/health", timeout=2)
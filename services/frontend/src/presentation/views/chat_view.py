@@ -34,7 +34,10 @@ def render_chat_view(service: ChatService):
                 message_placeholder.markdown("_Đang tra cứu văn bản luật..._")
                 
                 try:
-                    response_text = service.send_message(prompt)
+                    response_text = ""
+                    for chunk in service.stream_message(prompt):
+                        response_text += chunk
+                        message_placeholder.markdown(response_text + "▌")
                     message_placeholder.markdown(response_text)
                     st.session_state.messages.append({"role": "assistant", "content": response_text})
                     
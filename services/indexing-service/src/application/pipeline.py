@@ -6,11 +6,14 @@ from src.domain.models import ProcessingResult, LegalChunk # Import type
 logger = logging.getLogger(__name__)
 
 class IndexingPipeline:
-    def __init__(self, loader, chunker, embedder, db):
+    def __init__(self, loader, chunker, embedder, db, notifier=None, streaming: bool = False):
         self.loader = loader
         self.chunker = chunker
         self.embedder = embedder
         self.db = db
+        self.notifier = notifier
+        # streaming=True: embed qua /embed/stream và ghi Weaviate ngay khi vector về
+        self.streaming = streaming
 
     def run_pipeline(self, file_path: str):
         filename = os.path.basename(file_path)
@@ -37,6 +40,7 @@ class IndexingPipeline:
             ts = time.time()
             vectors = []
             valid_chunks = []
+            truncated_chunks = []
             
             # Chuẩn bị list texts
             texts_to_embed = []
@@ -48,16 +52,24 @@ class IndexingPipeline:
                     texts_to_embed.append(text_content)
                     chunks_to_embed.append(chunk)
 
-            if texts_to_embed:
+            saved = False
+            if texts_to_embed and self.streaming:
+                logger.info(f" Đang stream {len(texts_to_embed)} chunks tới Embedding Service, ghi Weaviate song song...")
+                truncated_chunks = self._embed_and_save_streaming(chunks_to_embed, texts_to_embed, filename)
+                valid_chunks = chunks_to_embed
+                saved = True
+            elif texts_to_embed:
                 logger.info(f" Đang gửi {len(texts_to_embed)} chunks tới Embedding Service (Batch Mode)...")
                 try:
                     # Gọi Batch API 1 lần duy nhất
-                    batch_vectors = self.embedder.get_embeddings_batch(texts_to_embed)
+                    batch_result = self.embedder.embed_texts(texts_to_embed)
+                    batch_vectors = batch_result.embeddings
                     
                     if len(batch_vectors) == len(chunks_to_embed):
                         vectors = batch_vectors
                         valid_chunks = chunks_to_embed
                         logger.info(f" Đã nhận được {len(vectors)} vectors.")
+                        truncated_chunks = self._flag_truncated(chunks_to_embed, batch_result.truncated)
                     else:
                         logger.error(f" Lỗi: Số lượng vector trả về ({len(batch_vectors)}) không khớp số lượng chunk ({len(chunks_to_embed)})")
                 
@@ -68,10 +80,17 @@ class IndexingPipeline:
 
             # 4. Save Batch
             ts = time.time()
-            if valid_chunks:
+            if valid_chunks and saved:
+                # Đã ghi trong lúc stream, thời gian ghi nằm trong phần Embed
+                logger.info(f" Đã lưu thành công {len(valid_chunks)} chunks có metadata vào Weaviate (streaming).")
+                if self.notifier:
+                    self.notifier.notify_documents_indexed(filename, len(valid_chunks))
+            elif valid_chunks:
                 # Hàm save_chunks của DB adapter cần xử lý việc map metadata từ chunk vào Weaviate properties
                 self.db.save_chunks(valid_chunks, vectors)
                 logger.info(f" Đã lưu thành công {len(valid_chunks)} chunks có metadata vào Weaviate.")
+                if self.notifier:
+                    self.notifier.notify_documents_indexed(filename, len(valid_chunks))
             else:
                 logger.warning(" Không có chunk nào hợp lệ để lưu.")
             timings["save"] = time.time() - ts
@@ -85,12 +104,15 @@ class IndexingPipeline:
                 f"Embed: {timings['embed']:.2f}s, "
                 f"Save: {timings['save']:.2f}s)"
             )
+            if truncated_chunks:
+                detail_message += f" Cảnh báo: {len(truncated_chunks)} chunk bị cắt bớt khi embed."
 
             return ProcessingResult(
                 filename=filename,
                 status="success",
                 total_chunks=len(valid_chunks),
-                message=detail_message
+                message=detail_message,
+                truncated_chunks=truncated_chunks
             )
 
         except Exception as e:
@@ -101,3 +123,43 @@ class IndexingPipeline:
                 message=str(e),
                 total_chunks=0
             )
+
+    def _embed_and_save_streaming(self, chunks: list, texts: list, filename: str) -> list:
+        """
+        Ghép từng vector trả về từ stream với chunk tương ứng rồi chuyển thẳng cho Weaviate.
+        Lỗi giữa chừng: WeaviateClient xoá phần đã ghi của lần này, gateway vẫn được báo vì
+        cache câu trả lời có thể đã dùng các chunk tạm thời đó.
+        """
+        truncated = []
+        stream = self.embedder.stream_embeddings(texts)
+
+        def items():
+            for idx, vector, is_truncated in stream:
+                if is_truncated:
+                    truncated.append(idx)
+                    metadata = chunks[idx].metadata if hasattr(chunks[idx], 'metadata') else chunks[idx].setdefault('metadata', {})
+                    metadata["truncated"] = True
+                yield idx, chunks[idx], vector
+
+        try:
+            self.db.save_chunk_stream(items())
+        except Exception:
+            if self.notifier:
+                self.notifier.notify_documents_indexed(filename, 0)
+            raise
+        finally:
+            # Đóng stream để thread đọc response thoát và trả kết nối
+            stream.close()
+        return self._flag_truncated(chunks, sorted(truncated))
+
+    def _flag_truncated(self, chunks: list, truncated: list) -> list:
+        """Đánh dấu metadata "truncated" cho chunk dài hơn max_seq_length của model embedding"""
+        labels = []
+        for idx in truncated:
+            chunk = chunks[idx]
+            metadata = chunk.metadata if hasattr(chunk, 'metadata') else chunk.setdefault('metadata', {})
+            metadata["truncated"] = True
+            labels.append(metadata.get("article") or f"chunk {idx}")
+        if labels:
+            logger.warning(f" {len(labels)} chunk vượt độ dài tối đa của model embedding, phần cuối không được embed: {labels[:20]}")
+        return labels
@@ -5,8 +5,16 @@ class LegalChunk(BaseModel):
     text: str
     metadata: Dict[str, Any]
 
+class EmbeddingBatchResult(BaseModel):
+    # Ma trận numpy (n, dim) khi nhận vector nhị phân, hoặc List[List[float]]
+    embeddings: Any
+    # Index (theo thứ tự đầu vào) của các text bị embedding-api cắt tại max_seq_length
+    truncated: List[int] = []
+
 class ProcessingResult(BaseModel):
     filename: str
     total_chunks: int
     status: str
-    message: str
\ No newline at end of file
+    message: str
+    # Chunk bị cắt bớt khi embed (vector không phủ hết nội dung), dạng "Điều 5" hoặc "chunk 12"
+    truncated_chunks: List[str] = []
\ No newline at end of file
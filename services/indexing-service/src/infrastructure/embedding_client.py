@@ -1,22 +1,34 @@
+import json
+import queue
 import requests
 import logging
+import threading
+import numpy as np
+from src.domain.models import EmbeddingBatchResult
+from src.infrastructure.vector_codec import accept_header, decode_vectors, is_vector_response
 
 # Tạo logger để ghi log chuẩn thay vì print
 logger = logging.getLogger(__name__)
 
 class EmbeddingClient:
     # 1. Đổi tên tham số từ api_url thành base_url để khớp với main.py
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, transport: str = "binary", transport_dtype: str = "float32", stream_prefetch: int = 256):
         self.base_url = base_url
+        self.stream_prefetch = stream_prefetch
+        # transport="binary": nhận vector dạng application/x-vectors, đọc thẳng vào NumPy
+        self.headers = {"Accept": accept_header(transport_dtype)} if transport == "binary" else {}
 
     def get_embedding(self, text: str) -> list[float]:
         try:
             response = requests.post(
                 self.base_url, 
                 json={"text": text},
+                headers=self.headers,
                 timeout=30
             )
             response.raise_for_status()
+            if is_vector_response(response.headers.get("content-type")):
+                return decode_vectors(response.content)[0].tolist()
             return response.json()["embedding"]
             
         except requests.exceptions.RequestException as e:
@@ -27,11 +39,15 @@ class EmbeddingClient:
             return []
 
     def get_embeddings_batch(self, texts: list[str]) -> list[list[float]]:
+        return [list(vector) for vector in self.embed_texts(texts).embeddings]
+
+    def embed_texts(self, texts: list[str]) -> EmbeddingBatchResult:
         """Gọi API batch theo từng cụm nhỏ để tránh block service quá lâu"""
         if not texts:
-            return []
+            return EmbeddingBatchResult(embeddings=[])
             
         all_embeddings = []
+        truncated = []
         batch_size = 32 # Chia nhỏ batch để interleaving với các request khác (như từ Chat)
         
         # Xử lý URL: chuyển http://.../embed -> http://.../embed/batch
@@ -44,14 +60,92 @@ class EmbeddingClient:
                 response = requests.post(
                     batch_url, 
                     json={"texts": current_batch},
+                    headers=self.headers,
                     timeout=60
                 )
                 response.raise_for_status()
-                data = response.json()
-                all_embeddings.extend(data.get("embeddings", []))
+                if is_vector_response(response.headers.get("content-type")):
+                    all_embeddings.append(decode_vectors(response.content))
+                    batch_truncated = [int(j) for j in response.headers.get("x-truncated", "").split(",") if j]
+                else:
+                    data = response.json()
+                    all_embeddings.append(np.asarray(data.get("embeddings", []), dtype=np.float32))
+                    batch_truncated = data.get("truncated", [])
+                # Index trong sub-batch -> index trong toàn bộ danh sách
+                truncated.extend(i + j for j in batch_truncated)
             except Exception as e:
                 logger.error(f"Error calling Sub-Batch Embedding API: {e}")
                 # Pipeline chính mong muốn độ dài khớp, nên tốt nhất là raise
                 raise e
                 
-        return all_embeddings
\ No newline at end of file
+        return EmbeddingBatchResult(embeddings=np.concatenate(all_embeddings), truncated=truncated)
+
+
+    def stream_embeddings(self, texts: list[str]):
+        """
+        Gửi toàn bộ texts qua một kết nối /embed/stream (NDJSON) và yield (index, vector, truncated)
+        ngay khi embedding-api encode xong từng cụm. Một thread nền đọc trước tối đa
+        stream_prefetch vector để kết nối không bị nghẽn trong lúc caller ghi vào Weaviate.
+        """
+        stream_url = self.base_url.rstrip("/") + "/stream"
+        results: queue.Queue = queue.Queue(maxsize=self.stream_prefetch)
+        done = object()
+        # Caller dừng giữa chừng (lỗi Weaviate, generator bị đóng): reader phải thoát và trả kết nối
+        cancelled = threading.Event()
+        active = {}
+
+        def request_lines():
+            for i, text in enumerate(texts):
+                yield (json.dumps({"id": i, "text": text}, ensure_ascii=False) + "\n").encode("utf-8")
+
+        def put(item) -> bool:
+            while not cancelled.is_set():
+                try:
+                    results.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def reader():
+            try:
+                with requests.post(
+                    stream_url,
+                    data=request_lines(),
+                    headers={"Content-Type": "application/x-ndjson"},
+                    stream=True,
+                    timeout=(10, 300)
+                ) as response:
+                    active["response"] = response
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if line and not put(json.loads(line)):
+                            return
+            except Exception as e:
+                put(e)
+                return
+            put(done)
+
+        threading.Thread(target=reader, daemon=True).start()
+
+        received = 0
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    logger.error(f"Error calling Streaming Embedding API: {item}")
+                    raise item
+                if "error" in item:
+                    raise RuntimeError(f"Embedding API stream error: {item['error']}")
+                received += 1
+                yield item["id"], item["embedding"], item.get("truncated", False)
+        finally:
+            cancelled.set()
+            response = active.get("response")
+            if response is not None:
+                response.close()
+
+        if received != len(texts):
+            raise RuntimeError(f"Embedding stream ended after {received}/{len(texts)} vectors")
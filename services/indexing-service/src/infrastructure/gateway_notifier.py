@@ -0,0 +1,22 @@
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+class GatewayNotifier:
+    """Báo cho llm-gateway biết có chunk mới để gateway làm mới cache/index của nó"""
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def notify_documents_indexed(self, source: str, chunks: int):
+        try:
+            response = requests.post(
+                f"{self.base_url}/events/documents-indexed",
+                json={"source": source, "chunks": chunks},
+                timeout=5
+            )
+            response.raise_for_status()
+            logger.info(f" Đã báo llm-gateway: {chunks} chunks mới từ '{source}'")
+        except Exception as e:
+            # Không làm hỏng pipeline nếu gateway chưa chạy, chỉ ghi log
+            logger.warning(f" Không thể báo llm-gateway tại {self.base_url}: {e}")
@@ -0,0 +1,28 @@
+import struct
+
+import numpy as np
+
+# Định dạng nhị phân của embedding-api (Accept: application/x-vectors):
+#   header 16 byte little-endian: magic "VEC1" | dtype (u8) | 3 byte dự trữ | rows (u32) | dim (u32)
+#   tiếp theo là rows x dim số thực little-endian, theo thứ tự hàng
+VECTOR_MEDIA_TYPE = "application/x-vectors"
+MAGIC = b"VEC1"
+HEADER = struct.Struct("<4sB3xII")
+NUMPY_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+
+
+def accept_header(dtype: str = "float32") -> str:
+    # JSON vẫn được chấp nhận để làm việc với embedding-api bản cũ
+    return f"{VECTOR_MEDIA_TYPE}; dtype={dtype}, application/json;q=0.5"
+
+
+def is_vector_response(content_type: str) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() == VECTOR_MEDIA_TYPE
+
+
+def decode_vectors(body: bytes) -> np.ndarray:
+    """Ma trận [rows, dim] đọc thẳng trên buffer của response (không copy, chỉ đọc)"""
+    magic, code, rows, dim = HEADER.unpack_from(body)
+    if magic != MAGIC or code not in NUMPY_DTYPES:
+        raise ValueError(f"Invalid vector payload (magic={magic!r}, dtype={code})")
+    return np.frombuffer(body, dtype=NUMPY_DTYPES[code], count=rows * dim, offset=HEADER.size).reshape(rows, dim)
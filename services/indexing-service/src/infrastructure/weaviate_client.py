@@ -29,11 +29,31 @@ class WeaviateClient:
                     {"name": "text", "dataType": ["text"]},
                     {"name": "source", "dataType": ["text"]},
                     {"name": "chunk_id", "dataType": ["int"]},
-                    {"name": "chapter", "dataType": ["text"]}
+                    {"name": "chapter", "dataType": ["text"]},
+                    {"name": "truncated", "dataType": ["boolean"]}
                 ]
             }
             self.client.schema.create_class(schema)
 
+    def _to_properties(self, chunk, chunk_id: int) -> dict:
+        # Xử lý lấy text và metadata an toàn
+        text_content = chunk.text if hasattr(chunk, 'text') else chunk.get('text', '')
+
+        # Lấy metadata
+        if hasattr(chunk, 'metadata'):
+            metadata = chunk.metadata
+        else:
+            metadata = chunk.get('metadata', {})
+
+        return {
+            "text": text_content,
+            "source": metadata.get("source", metadata.get("filename", "unknown")),
+            "chunk_id": chunk_id,
+            "article": metadata.get("article", ""), # Lấy "Điều 34"
+            "chapter": metadata.get("chapter", ""),  # Lấy chương
+            "truncated": metadata.get("truncated", False)  # Vector không phủ hết text
+        }
+
     def save_chunks(self, chunks: list, vectors: list):
         try:
             # Dùng Batch context manager để import nhanh
@@ -41,26 +61,9 @@ class WeaviateClient:
                 batch.batch_size = 100
                 
                 for i, chunk in enumerate(chunks):
-                    # Xử lý lấy text và metadata an toàn
-                    text_content = chunk.text if hasattr(chunk, 'text') else chunk.get('text', '')
-                    
-                    # Lấy metadata
-                    if hasattr(chunk, 'metadata'):
-                        metadata = chunk.metadata
-                    else:
-                        metadata = chunk.get('metadata', {})
-
-                    properties = {
-                        "text": text_content,
-                        "source": metadata.get("source", metadata.get("filename", "unknown")),
-                        "chunk_id": i,
-                        "article": metadata.get("article", ""), # Lấy "Điều 34"
-                        "chapter": metadata.get("chapter", "")  # Lấy chương
-                    }
-                    
                     # Thêm vào batch kèm vector
                     batch.add_data_object(
-                        data_object=properties,
+                        data_object=self._to_properties(chunk, i),
                         class_name=self.class_name,
                         vector=vectors[i]  
                     )
@@ -69,4 +72,44 @@ class WeaviateClient:
             
         except Exception as e:
             logger.error(f" Weaviate Save Error: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def save_chunk_stream(self, items) -> int:
+        """
+        Ghi (chunk_id, chunk, vector) ngay khi vector về từ embedding stream.
+        Batch tự gửi mỗi 100 object nên Weaviate nhận dữ liệu song song với quá trình embed.
+        Stream lỗi giữa chừng: xoá các object đã ghi trong lần này rồi raise lại, để tài liệu
+        không bị lưu dở và lần upload lại không tạo chunk trùng.
+        """
+        uuids = []
+        try:
+            with self.client.batch as batch:
+                batch.batch_size = 100
+                for chunk_id, chunk, vector in items:
+                    uuids.append(batch.add_data_object(
+                        data_object=self._to_properties(chunk, chunk_id),
+                        class_name=self.class_name,
+                        vector=vector
+                    ))
+            logger.info(f" Saved {len(uuids)} streamed chunks to Weaviate.")
+            return len(uuids)
+        except Exception as e:
+            logger.error(f" Weaviate Stream Save Error after {len(uuids)} chunks: {e}")
+            self.delete_objects(uuids)
+            raise e
+
+    def delete_objects(self, uuids: list, group_size: int = 500):
+        """Xoá object theo uuid (bộ lọc id ContainsAny, cần Weaviate >= 1.21)"""
+        deleted = 0
+        for i in range(0, len(uuids), group_size):
+            group = uuids[i : i + group_size]
+            try:
+                self.client.batch.delete_objects(
+                    class_name=self.class_name,
+                    where={"path": ["id"], "operator": "ContainsAny", "valueTextArray": group}
+                )
+                deleted += len(group)
+            except Exception as e:
+                logger.error(f" Weaviate Delete Error ({len(group)} objects): {e}")
+        if uuids:
+            logger.info(f" Rolled back {deleted}/{len(uuids)} streamed chunks in Weaviate.")
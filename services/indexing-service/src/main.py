@@ -17,6 +17,7 @@ logger = logging.getLogger(__name__)
 from src.infrastructure.docling_loader import DoclingLoader
 from src.infrastructure.embedding_client import EmbeddingClient
 from src.infrastructure.weaviate_client import WeaviateClient
+from src.infrastructure.gateway_notifier import GatewayNotifier
 
 from src.application.chunker import LegalChunker
 from src.application.pipeline import IndexingPipeline
@@ -25,13 +26,20 @@ from src.presentation.router import router as api_router, set_pipeline
 
 EMBEDDING_API_URL = os.getenv("EMBEDDING_API_URL", "http://embedding-api:5000/embed")
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
+LLM_GATEWAY_URL = os.getenv("LLM_GATEWAY_URL", "http://llm-gateway:8001")
 
 logger.info(f"Connecting to Embedding API at: {EMBEDDING_API_URL}")
 logger.info(f"Connecting to Weaviate at: {WEAVIATE_URL}")
 
 docling_loader = DoclingLoader()
-embedding_client = EmbeddingClient(base_url=EMBEDDING_API_URL)
+embedding_client = EmbeddingClient(
+    base_url=EMBEDDING_API_URL,
+    transport=os.getenv("EMBEDDING_TRANSPORT", "binary").lower(),
+    transport_dtype=os.getenv("EMBEDDING_TRANSPORT_DTYPE", "float32").lower(),
+    stream_prefetch=int(os.getenv("EMBEDDING_STREAM_PREFETCH", "256"))
+)
 weaviate_client = WeaviateClient(url=WEAVIATE_URL)
+gateway_notifier = GatewayNotifier(base_url=LLM_GATEWAY_URL)
 
 legal_chunker = LegalChunker()
 
@@ -39,7 +47,10 @@ indexing_pipeline = IndexingPipeline(
     loader=docling_loader,
     chunker=legal_chunker,
     embedder=embedding_client,
-    db=weaviate_client
+    db=weaviate_client,
+    notifier=gateway_notifier,
+    # EMBEDDING_STREAMING=true: một kết nối /embed/stream thay cho các sub-batch 32 text tuần tự
+    streaming=os.getenv("EMBEDDING_STREAMING", "false").lower() == "true"
 )
 
 app = FastAPI(
@@ -0,0 +1,160 @@
+# src/application/admission.py
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+# Độ ưu tiên: số nhỏ được phục vụ trước
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class AdmissionRejected(Exception):
+    """Hàng đợi đã đầy hoặc chờ quá lâu -> presentation trả về 429 kèm Retry-After"""
+    def __init__(self, retry_after: int, reason: str = "queue_full"):
+        super().__init__(f"Admission rejected ({reason}), retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class PrioritySemaphore:
+    """
+    Semaphore asyncio giới hạn số tác vụ chạy đồng thời; khi hết chỗ, người chờ được
+    phục vụ theo độ ưu tiên rồi theo thứ tự đến (FIFO trong cùng mức).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active = 0
+        self._waiters: List[list] = []
+        self._seq = itertools.count()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        if self._active < self.limit and self.waiting == 0:
+            self._active += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._seq), fut])
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Đã được trao chỗ đúng lúc bị huỷ -> nhường lại cho người kế tiếp
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                # Chuyển thẳng chỗ cho người chờ, _active giữ nguyên
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+
+class AdmissionController:
+    """
+    Cổng vào của pipeline chat: tối đa max_concurrent request chạy cùng lúc và
+    max_queue request được xếp hàng. Hàng đợi đầy hoặc chờ quá queue_timeout giây thì
+    từ chối ngay (429) thay vì để request dồn tới khi client timeout.
+    Retry-After ước lượng từ thời gian phục vụ trung bình (EWMA) và độ dài hàng đợi.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 16,
+        max_queue: int = 32,
+        queue_timeout: Optional[float] = 30.0,
+        default_retry_after: int = 1
+    ):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.default_retry_after = default_retry_after
+        self._semaphore = PrioritySemaphore(max_concurrent)
+        self._service_time_ewma: Optional[float] = None
+        # Đếm ở đây vì wait_for chỉ đưa người chờ vào semaphore ở vòng lặp event kế tiếp
+        self._queued = 0
+
+        self._admitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """Trả về thời điểm bắt đầu phục vụ, truyền lại cho release()"""
+        semaphore = self._semaphore
+        if semaphore.active + self._queued >= semaphore.limit + self.max_queue:
+            self._rejected += 1
+            raise AdmissionRejected(self.retry_after())
+
+        enqueued = time.monotonic()
+        self._queued += 1
+        try:
+            if self.queue_timeout:
+                await asyncio.wait_for(semaphore.acquire(priority), self.queue_timeout)
+            else:
+                await semaphore.acquire(priority)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise AdmissionRejected(self.retry_after(), reason="queue_timeout")
+        finally:
+            self._queued -= 1
+
+        started = time.monotonic()
+        wait = started - enqueued
+        self._admitted += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        return started
+
+    def release(self, started: float):
+        elapsed = time.monotonic() - started
+        if self._service_time_ewma is None:
+            self._service_time_ewma = elapsed
+        else:
+            self._service_time_ewma = 0.8 * self._service_time_ewma + 0.2 * elapsed
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITY_INTERACTIVE):
+        started = await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    def retry_after(self) -> int:
+        if self._service_time_ewma is None:
+            return self.default_retry_after
+        # Thời gian để hàng đợi hiện tại chạy hết với max_concurrent luồng song song
+        queued = self._queued + 1
+        estimate = self._service_time_ewma * queued / self._semaphore.limit
+        return max(self.default_retry_after, math.ceil(estimate))
+
+    def get_stats(self) -> dict:
+        return {
+            "max_concurrent": self._semaphore.limit,
+            "max_queue": self.max_queue,
+            "active": self._semaphore.active,
+            "queue_depth": self._queued,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "queue_timeouts": self._timeouts,
+            "avg_wait_ms": round(self._wait_total / self._admitted * 1000, 1) if self._admitted else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 1),
+            "avg_service_s": round(self._service_time_ewma, 3) if self._service_time_ewma is not None else None
+        }
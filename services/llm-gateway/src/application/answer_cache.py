@@ -0,0 +1,217 @@
+# src/application/answer_cache.py
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from src.application.citation_parser import CitationParser
+from src.domain.models import ChatResponse
+
+# Chi phí cố định ước lượng cho mỗi entry (dict, object Python...)
+_ENTRY_OVERHEAD_BYTES = 256
+
+# Tập trích dẫn đã chuẩn hoá: (tên luật đã chuẩn hoá, điều, khoản, điểm)
+CitationKey = FrozenSet[Tuple[str, str, Optional[int], Optional[str]]]
+
+
+class _CacheEntry:
+    def __init__(self, key: str, embedding: Optional[np.ndarray], response: ChatResponse, citations: CitationKey):
+        self.key = key
+        self.embedding = embedding
+        self.response = response
+        self.citations = citations
+        self.created_at = time.monotonic()
+        self.size_bytes = (
+            _ENTRY_OVERHEAD_BYTES
+            + (embedding.nbytes if embedding is not None else 0)
+            + len(response.answer.encode("utf-8"))
+            + sum(len(s.encode("utf-8")) for s in response.sources)
+        )
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời theo câu hỏi:
+    - Khớp chính xác theo câu hỏi đã chuẩn hoá (lowercase, NFC, gộp khoảng trắng).
+    - Khớp ngữ nghĩa khi cosine similarity giữa embedding câu hỏi >= similarity_threshold và hai câu
+      trích dẫn đúng cùng các điều/khoản/điểm của cùng luật: câu hỏi chỉ khác số điều có embedding
+      gần như trùng nhau nhưng câu trả lời khác hẳn.
+    Loại bỏ theo LRU, TTL và giới hạn bộ nhớ. Mỗi lần invalidate() tăng generation
+    để các câu trả lời được sinh ra trước thời điểm đó không bị ghi vào cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+        similarity_threshold: float = 0.95
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+        self.citation_parser = CitationParser()
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._generation = 0
+        # Ma trận embedding (đã chuẩn hoá) dựng lại khi cache thay đổi
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+
+        self._exact_hits = 0
+        self._semantic_hits = 0
+        self._citation_mismatches = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        text = unicodedata.normalize("NFC", query).lower().strip()
+        text = re.sub(r"\s+", " ", text)
+        return text.rstrip(" ?.!")
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, query: str, embedding: Optional[List[float]] = None) -> Optional[ChatResponse]:
+        key = self.normalize(query)
+        with self._lock:
+            self._evict_expired()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._exact_hits += 1
+                return entry.response
+
+            vector = self._to_unit_vector(embedding)
+            if vector is not None and self._entries:
+                matrix = self._similarity_matrix()
+                if matrix is not None and matrix.shape[1] == vector.shape[0]:
+                    scores = matrix @ vector
+                    above = np.flatnonzero(scores >= self.similarity_threshold)
+                    if above.size:
+                        citations = self._citation_key(query)
+                        # Entry giống nhất có cùng tập trích dẫn; giống về ngữ nghĩa nhưng khác điều luật thì bỏ qua
+                        for index in above[np.argsort(-scores[above])]:
+                            best_key = self._matrix_keys[index]
+                            if self._entries[best_key].citations == citations:
+                                self._entries.move_to_end(best_key)
+                                self._semantic_hits += 1
+                                return self._entries[best_key].response
+                        self._citation_mismatches += 1
+
+            self._misses += 1
+            return None
+
+    def get_exact(self, query: str) -> Optional[ChatResponse]:
+        """Chỉ khớp chính xác, không cần embedding; không khớp thì không tính là miss (get() sẽ được gọi tiếp)"""
+        key = self.normalize(query)
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._exact_hits += 1
+            return entry.response
+
+    def put(
+        self,
+        query: str,
+        embedding: Optional[List[float]],
+        response: ChatResponse,
+        generation: Optional[int] = None
+    ):
+        with self._lock:
+            # Câu trả lời được tính trước lần invalidate gần nhất -> bỏ qua
+            if generation is not None and generation != self._generation:
+                return
+
+            key = self.normalize(query)
+            entry = _CacheEntry(key, self._to_unit_vector(embedding), response, self._citation_key(query))
+            if entry.size_bytes > self.max_bytes:
+                return
+
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._total_bytes += entry.size_bytes
+            self._matrix = None
+
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self._matrix = None
+            self._generation += 1
+            self._invalidations += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits = self._exact_hits + self._semantic_hits
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "exact_hits": self._exact_hits,
+                "semantic_hits": self._semantic_hits,
+                "citation_mismatches": self._citation_mismatches,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+                "generation": self._generation
+            }
+
+    def _citation_key(self, query: str) -> CitationKey:
+        return frozenset(
+            (CitationParser.law_key(c.law) if c.law else "", c.article, c.clause, c.point)
+            for c in self.citation_parser.parse(query)
+        )
+
+    def _to_unit_vector(self, embedding) -> Optional[np.ndarray]:
+        if embedding is None or len(embedding) == 0:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _similarity_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None:
+            keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            if not keys:
+                return None
+            self._matrix_keys = keys
+            self._matrix = np.stack([self._entries[k].embedding for k in keys])
+        return self._matrix
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if now - e.created_at > self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+            self._expirations += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size_bytes
+        self._matrix = None
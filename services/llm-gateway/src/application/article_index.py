@@ -0,0 +1,128 @@
+# src/application/article_index.py
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.application.citation_parser import CitationParser
+from src.domain.models import RetrievedDocument
+
+# (id, chapter, text) - giữ dạng tuple cho gọn, chỉ dựng RetrievedDocument khi tra cứu
+_Entry = Tuple[Optional[str], str, str]
+
+
+class ArticleIndex:
+    """
+    Index trong bộ nhớ: source -> "Điều N" -> các chunk của điều đó.
+    Dựng toàn bộ từ Weaviate lúc khởi động (cursor pagination) và làm mới từng source
+    khi indexing-service báo có tài liệu mới, nhờ đó trích dẫn chính xác không cần embedding
+    hay truy vấn Weaviate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_source: Dict[str, Dict[str, List[_Entry]]] = {}
+        self._ready = False
+        # Source được làm mới trong lúc đang dựng toàn bộ: giữ bản mới hơn khi swap
+        self._building = False
+        self._touched: set = set()
+
+        self._hits = 0
+        self._misses = 0
+        self._build_seconds = 0.0
+        self._refreshes = 0
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def begin_build(self):
+        with self._lock:
+            self._building = True
+            self._touched = set()
+
+    def finish_build(self, docs: Iterable[RetrievedDocument], started_at: float):
+        by_source = self._group(docs)
+        with self._lock:
+            for source in self._touched:
+                if source in self._by_source:
+                    by_source[source] = self._by_source[source]
+                else:
+                    by_source.pop(source, None)
+            self._by_source = by_source
+            self._building = False
+            self._touched = set()
+            self._ready = True
+            self._build_seconds = time.monotonic() - started_at
+
+    def abort_build(self):
+        with self._lock:
+            self._building = False
+            self._touched = set()
+
+    def replace_source(self, source: str, docs: Iterable[RetrievedDocument]):
+        articles = self._group(docs).get(source, {})
+        with self._lock:
+            if articles:
+                self._by_source[source] = articles
+            else:
+                self._by_source.pop(source, None)
+            if self._building:
+                self._touched.add(source)
+            self._refreshes += 1
+
+    def lookup(self, article: str, law: Optional[str] = None) -> List[RetrievedDocument]:
+        with self._lock:
+            hits = [
+                RetrievedDocument(
+                    id=chunk_id,
+                    title=source,
+                    content=f"Chương: {chapter}\nĐiều: {article}\nNội dung: {text}",
+                    article=article,
+                    chapter=chapter
+                )
+                for source, articles in self._by_source.items()
+                if law is None or CitationParser.matches_source(law, source)
+                for chunk_id, chapter, text in articles.get(article, [])
+            ]
+            if hits:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return hits
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            chunks = sum(len(e) for articles in self._by_source.values() for e in articles.values())
+            text_bytes = sum(
+                len(text.encode("utf-8"))
+                for articles in self._by_source.values()
+                for entries in articles.values()
+                for _, _, text in entries
+            )
+            return {
+                "ready": self._ready,
+                "sources": len(self._by_source),
+                "articles": sum(len(a) for a in self._by_source.values()),
+                "chunks": chunks,
+                "text_bytes": text_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "refreshes": self._refreshes,
+                "build_seconds": round(self._build_seconds, 3)
+            }
+
+    def _group(self, docs: Iterable[RetrievedDocument]) -> Dict[str, Dict[str, List[_Entry]]]:
+        by_source: Dict[str, Dict[str, List[_Entry]]] = defaultdict(lambda: defaultdict(list))
+        for doc in docs:
+            if not doc.article:
+                continue
+            by_source[doc.title][doc.article].append((doc.id, doc.chapter, self._raw_text(doc)))
+        return {source: dict(articles) for source, articles in by_source.items()}
+
+    @staticmethod
+    def _raw_text(doc: RetrievedDocument) -> str:
+        # content có dạng "Chương: ...\nĐiều: ...\nNội dung: <text>"
+        marker = "\nNội dung: "
+        pos = doc.content.find(marker)
+        return doc.content[pos + len(marker):] if pos >= 0 else doc.content
@@ -1,112 +1,543 @@
 # src/application/chat_service.py
-from typing import List, Optional
+from typing import AsyncIterator, Callable, List, Optional, Tuple
 import logging
-import re
 import asyncio
+import os
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
-from src.domain.models import ChatQuery, ChatResponse, RetrievedDocument
-from src.domain.ports import EmbeddingPort, VectorDBPort, LLMPort
+from src.domain.models import HYDE_PROFILE, ChatQuery, Citation, ChatResponse, DocumentsIndexedEvent, GenerationProfile, GenerationResult, PackedContext, RetrievedDocument
+from src.domain.ports import AsyncEmbeddingPort, AsyncLLMPort, AsyncVectorDBPort, EmbeddingPort, VectorDBPort, LLMPort, RerankPort
+from src.application.admission import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PrioritySemaphore
+from src.application.answer_cache import SemanticAnswerCache
+from src.application.article_index import ArticleIndex
+from src.application.citation_parser import CitationParser
+from src.application.context_packer import ContextPacker
+from src.application.result_fusion import ResultFusion
+from src.application.single_flight import SingleFlight
+from src.application.retrieval_gate import RetrievalGate
 
 logger = logging.getLogger(__name__)
 
+LOADING_MESSAGE = "Hệ thống đang tải mô hình ngôn ngữ (Qwen), vui lòng đợi trong giây lát..."
+NOT_FOUND_MESSAGE = "Xin lỗi, tôi không tìm thấy thông tin phù hợp trong cơ sở dữ liệu luật."
+STREAM_ERROR_MESSAGE = "Xin lỗi, hệ thống đang gặp sự cố xử lý."
+
+# System prompt cố định của từng loại lời gọi LLM (được đăng ký để adapter giữ sẵn KV cache)
+GRADER_SYSTEM_PROMPT = "You are a stricter Relevance Grader. Check if the document contains the answer to the query."
+HYDE_SYSTEM_PROMPT = "Bạn là chuyên gia luật."
+ANSWER_SYSTEM_PROMPT = "Bạn là trợ lý luật sư Việt Nam. Trả lời bằng Tiếng Việt."
+
+
 class ChatService:
-    def __init__(self, embedder: EmbeddingPort, vector_db: VectorDBPort, llm: LLMPort):
+    def __init__(
+        self,
+        embedder: EmbeddingPort,
+        vector_db: VectorDBPort,
+        llm: LLMPort,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        retrieval_gate: Optional[RetrievalGate] = None,
+        reranker: Optional[RerankPort] = None,
+        fusion: Optional[ResultFusion] = None,
+        article_index: Optional[ArticleIndex] = None,
+        single_flight: Optional[SingleFlight] = None
+    ):
         self.embedder = embedder
         self.vector_db = vector_db
         self.llm = llm
-        self.executor = ThreadPoolExecutor(max_workers=5)
-        self.article_pattern = re.compile(
-            r"\b(?:điều|khoản)\s+(\d+)\b(?!\s*(?:năm|tháng|ngày|giờ|phút|triệu|tỷ|nghìn|trăm|đồng|vnd|usd))", 
-            re.IGNORECASE
+        self.answer_cache = answer_cache
+        self.retrieval_gate = retrieval_gate or RetrievalGate()
+        self.reranker = reranker
+        self.fusion = fusion or ResultFusion()
+        self.article_index = article_index
+        self.single_flight = single_flight
+        self.article_index_page_size = int(os.getenv("ARTICLE_INDEX_PAGE_SIZE", "500"))
+        # Nhờ fusion, mỗi truy vấn con có thể lấy ít kết quả hơn mà không mất recall
+        self.semantic_limit = int(os.getenv("SEMANTIC_SEARCH_LIMIT", "8"))
+        self.strict_limit = int(os.getenv("STRICT_SEARCH_LIMIT", "5"))
+        # Số tài liệu giữ lại sau khi rerank
+        self.rerank_top_k = int(os.getenv("RERANK_TOP_K", "5"))
+        # LLM chạy trên executor riêng: mỗi worker chỉ chờ future của GenerationScheduler
+        llm_workers = int(os.getenv("LLM_EXECUTOR_WORKERS", "16"))
+        self.llm_executor = ThreadPoolExecutor(max_workers=llm_workers, thread_name_prefix="llm")
+        # Khi hết chỗ, câu trả lời cuối được xếp trước grader/HyDE
+        self.llm_slots = PrioritySemaphore(int(os.getenv("LLM_MAX_CONCURRENCY", str(llm_workers))))
+        # Chỉ dùng khi adapter không có bản async (I/O không chiếm chỗ của LLM)
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("IO_EXECUTOR_WORKERS", "32")),
+            thread_name_prefix="io"
+        )
+        self.grader_threshold = float(os.getenv("GRADER_THRESHOLD", "0.5"))
+        # Ngân sách token cho câu trả lời cuối: hết THINKING_BUDGET sẽ bị ép đóng </think>
+        self.answer_profile = GenerationProfile(
+            thinking_budget=int(os.getenv("THINKING_BUDGET", "1024")),
+            answer_max_tokens=int(os.getenv("ANSWER_MAX_TOKENS", "2048"))
+        )
+        # Ngân sách token cho phần TÀI LIỆU trong prompt (quyết định thời gian prefill)
+        self.context_packer = ContextPacker(
+            count_tokens=self.llm.count_tokens,
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "4096")),
+            max_doc_tokens=int(os.getenv("CONTEXT_DOC_MAX_TOKENS", "0"))
         )
+        # HyDE suy đoán: chạy song song với grader lần đầu thay vì chờ grader trả lời NO
+        self.speculative_hyde = os.getenv("SPECULATIVE_HYDE", "false").lower() == "true"
+        # Deadline (giây) cho từng stage, 0 = không giới hạn
+        self.stage_deadlines = {
+            "retrieval": float(os.getenv("RETRIEVAL_DEADLINE_S", "0")),
+            "grading": float(os.getenv("GRADING_DEADLINE_S", "0")),
+            "hyde": float(os.getenv("HYDE_DEADLINE_S", "0")),
+            "rerank": float(os.getenv("RERANK_DEADLINE_S", "0"))
+        }
+        self._stage_stats = {
+            "speculative_hyde_started": 0,
+            "speculative_hyde_cancelled": 0,
+            "speculative_hyde_used": 0,
+            "retrieval_timeouts": 0,
+            "grading_timeouts": 0,
+            "hyde_timeouts": 0,
+            "rerank_calls": 0,
+            "rerank_failures": 0,
+            "rerank_timeouts": 0,
+            "context_docs_trimmed": 0,
+            "context_docs_dropped": 0,
+            "citations": 0
+        }
+        self.citation_parser = CitationParser()
+        for system_prompt in (ANSWER_SYSTEM_PROMPT, GRADER_SYSTEM_PROMPT, HYDE_SYSTEM_PROMPT):
+            self.llm.register_prefix(system_prompt)
 
     async def process_question(self, req: ChatQuery) -> ChatResponse:
         if not self.llm.is_ready:
-            return ChatResponse(
-                answer="Hệ thống đang tải mô hình ngôn ngữ (Qwen), vui lòng đợi trong giây lát...",
-                sources=[]
-            )
+            return ChatResponse(answer=LOADING_MESSAGE, sources=[])
         logger.info(f"Câu hỏi: {req.query}")
 
-        docs = await self._parallel_retrieval(req.query)
+        if self.single_flight:
+            # Các câu hỏi giống hệt nhau đang chạy đồng thời dùng chung một lần xử lý
+            key = SemanticAnswerCache.normalize(req.query)
+            return await self.single_flight.do(key, lambda: self._answer_question(req))
+        return await self._answer_question(req)
+
+    async def _answer_question(self, req: ChatQuery) -> ChatResponse:
+        cached = self._cache_lookup_exact(req.query)
+        if cached:
+            return cached
+        query_vector = await self._embed(req.query)
+        cached = self._cache_lookup(req.query, query_vector)
+        if cached:
+            return cached
+        generation = self.answer_cache.generation if self.answer_cache else None
+
+        docs = await self._retrieve_relevant_documents(req.query, query_vector)
+        if not docs:
+            return ChatResponse(answer=NOT_FOUND_MESSAGE, sources=[])
+
+        response = await self._generate_final_response(req.query, docs)
+        # answer_tokens == 0 nghĩa là LLM lỗi, không cache thông báo lỗi
+        if self.answer_cache and response.answer_tokens > 0:
+            self.answer_cache.put(req.query, query_vector, response, generation)
+        return response
+
+    async def stream_question(self, req: ChatQuery) -> AsyncIterator[dict]:
+        """
+        Phiên bản streaming của process_question: trả về chuỗi event
+        token -> ... -> sources -> done để presentation đẩy ra dạng SSE.
+        """
+        if not self.llm.is_ready:
+            yield {"event": "token", "data": {"content": LOADING_MESSAGE}}
+            yield {"event": "sources", "data": {"sources": []}}
+            yield {"event": "done", "data": {}}
+            return
+        logger.info(f"Câu hỏi (stream): {req.query}")
+
+        if self.single_flight:
+            # Câu hỏi giống hệt đang stream: nhận lại các token đã sinh rồi theo tiếp cùng một lần sinh
+            key = SemanticAnswerCache.normalize(req.query)
+            async for event in self.single_flight.stream(key, lambda: self._stream_answer(req)):
+                yield event
+            return
+        async for event in self._stream_answer(req):
+            yield event
+
+    async def _stream_answer(self, req: ChatQuery) -> AsyncIterator[dict]:
+        cached = self._cache_lookup_exact(req.query)
+        if not cached:
+            query_vector = await self._embed(req.query)
+            cached = self._cache_lookup(req.query, query_vector)
+        if cached:
+            yield {"event": "token", "data": {"content": cached.answer}}
+            yield {"event": "sources", "data": {"sources": cached.sources}}
+            yield {"event": "done", "data": {}}
+            return
+        generation = self.answer_cache.generation if self.answer_cache else None
+
+        docs = await self._retrieve_relevant_documents(req.query, query_vector)
+        if not docs:
+            yield {"event": "token", "data": {"content": NOT_FOUND_MESSAGE}}
+            yield {"event": "sources", "data": {"sources": []}}
+            yield {"event": "done", "data": {}}
+            return
+
+        packed = await self._pack_context(docs)
+        sys_prompt, user_prompt = self._build_answer_prompt(req.query, packed.docs)
+        chunks = []
+        failed = False
+        await self.llm_slots.acquire(PRIORITY_INTERACTIVE)
+        try:
+            async for chunk in self._iterate_in_executor(self.llm.stream_answer, sys_prompt, user_prompt, self.answer_profile):
+                chunks.append(chunk)
+                yield {"event": "token", "data": {"content": chunk}}
+        except Exception as e:
+            # Adapter raise khi sinh lỗi: báo cho người dùng nhưng không cache câu trả lời dở
+            failed = True
+            logger.error(f"Stream answer error: {e}")
+            yield {"event": "token", "data": {"content": STREAM_ERROR_MESSAGE}}
+        finally:
+            self.llm_slots.release()
+
+        sources = list(set([d.title for d in packed.docs]))
+        yield {"event": "sources", "data": {"sources": sources}}
+        yield {"event": "done", "data": {"context_tokens": packed.used_tokens, "dropped_chunks": packed.dropped}}
+
+        if self.answer_cache and chunks and not failed:
+            response = ChatResponse(
+                answer="".join(chunks),
+                sources=sources,
+                context_tokens=packed.used_tokens,
+                dropped_chunks=packed.dropped
+            )
+            self.answer_cache.put(req.query, query_vector, response, generation)
+
+    def on_documents_indexed(self, event: DocumentsIndexedEvent):
+        logger.info(f"Indexed {event.chunks} chunks from '{event.source}' -> invalidating answer cache")
+        if self.answer_cache:
+            self.answer_cache.invalidate()
+        if self.article_index:
+            self.io_executor.submit(self._refresh_article_index, event.source)
+
+    def start_article_index(self):
+        """Dựng article index ở background, trong lúc đó tra cứu điều luật vẫn đi qua Weaviate"""
+        if self.article_index:
+            self.io_executor.submit(self._build_article_index)
+
+    def _build_article_index(self):
+        started_at = time.monotonic()
+        self.article_index.begin_build()
+        try:
+            docs = []
+            for page in self.vector_db.iter_documents(page_size=self.article_index_page_size):
+                docs.extend(page)
+            self.article_index.finish_build(docs, started_at)
+            logger.info(f"Article index: {self.article_index.get_stats()}")
+        except Exception as e:
+            self.article_index.abort_build()
+            logger.error(f"Không dựng được article index: {e}")
+
+    def _refresh_article_index(self, source: str):
+        try:
+            self.article_index.replace_source(source, self.vector_db.fetch_by_source(source))
+            logger.info(f"Article index: đã làm mới '{source}'")
+        except Exception as e:
+            logger.error(f"Không làm mới được article index cho '{source}': {e}")
+
+    def get_metrics(self) -> dict:
+        metrics = {
+            "embedding": self.embedder.get_stats(),
+            "retrieval_gate": self.retrieval_gate.get_stats(),
+            "fusion": self.fusion.get_stats(),
+            "llm": self.llm.get_stats(),
+            "pipeline": dict(self._stage_stats),
+            "llm_slots": {
+                "limit": self.llm_slots.limit,
+                "active": self.llm_slots.active,
+                "waiting": self.llm_slots.waiting
+            }
+        }
+        if self.answer_cache:
+            metrics["answer_cache"] = self.answer_cache.get_stats()
+        if self.article_index:
+            metrics["article_index"] = self.article_index.get_stats()
+        if self.single_flight:
+            metrics["single_flight"] = self.single_flight.get_stats()
+        return metrics
+
+    def _cache_lookup_exact(self, query: str) -> Optional[ChatResponse]:
+        """Khớp chính xác trước khi embed: cache hit không tốn round trip tới embedding-api"""
+        if not self.answer_cache:
+            return None
+        cached = self.answer_cache.get_exact(query)
+        if cached:
+            logger.info("Answer cache hit (exact).")
+        return cached
+
+    def _cache_lookup(self, query: str, query_vector: List[float]) -> Optional[ChatResponse]:
+        if not self.answer_cache:
+            return None
+        cached = self.answer_cache.get(query, query_vector)
+        if cached:
+            logger.info("Answer cache hit.")
+        return cached
+
+    async def _embed(self, text: str) -> List[float]:
+        if isinstance(self.embedder, AsyncEmbeddingPort):
+            return await self.embedder.aget_embedding(text)
+        LOOP = asyncio.get_running_loop()
+        return await LOOP.run_in_executor(self.io_executor, self.embedder.get_embedding, text)
+
+    async def _search(self, **kwargs) -> List[RetrievedDocument]:
+        if isinstance(self.vector_db, AsyncVectorDBPort):
+            return await self.vector_db.asearch(**kwargs)
+        LOOP = asyncio.get_running_loop()
+        return await LOOP.run_in_executor(self.io_executor, lambda: self.vector_db.search(**kwargs))
+
+    async def _search_many(self, queries: List[dict]) -> List[List[RetrievedDocument]]:
+        if isinstance(self.vector_db, AsyncVectorDBPort):
+            return await self.vector_db.asearch_many(queries)
+        LOOP = asyncio.get_running_loop()
+        return await LOOP.run_in_executor(self.io_executor, self.vector_db.search_many, queries)
+
+    async def aclose(self):
+        for adapter in (self.embedder, self.vector_db, self.reranker):
+            if isinstance(adapter, (AsyncEmbeddingPort, AsyncVectorDBPort, RerankPort)):
+                await adapter.aclose()
+        self.io_executor.shutdown(wait=False)
+        self.llm_executor.shutdown(wait=False)
+
+    async def _retrieve_relevant_documents(self, query: str, query_vector: List[float]) -> List[RetrievedDocument]:
+        docs, semantic_docs = await self._with_deadline(
+            "retrieval", self._parallel_retrieval(query, query_vector), default=([], [])
+        )
+        docs = await self._rerank(query, docs)
+
+        # Ngưỡng của gate được hiệu chỉnh trên truy vấn semantic nên chỉ so điểm của truy vấn đó
+        decision = self.retrieval_gate.decide(docs, semantic_docs)
+        hyde_task = None
+        if self.speculative_hyde and decision == RetrievalGate.GRADE:
+            # Chạy HyDE song song với grader, huỷ nếu grader trả lời YES
+            hyde_task = asyncio.create_task(self._run_hyde_search(query))
+            self._stage_stats["speculative_hyde_started"] += 1
+
+        try:
+            is_relevant = await self._with_deadline("grading", self._check_relevance(query, docs, decision), default=None)
+            if is_relevant is None:
+                logger.warning("Grading quá hạn -> dùng tài liệu đang có")
+                return docs
+            if is_relevant:
+                if hyde_task:
+                    self._stage_stats["speculative_hyde_cancelled"] += 1
+                return docs
 
-        is_relevant = False
-        if docs:
-            is_relevant = await self._grade_documents(req.query, docs)
-        
-        if not is_relevant:
             logger.warning(f"Documents not relevant.")
             logger.info("Kích hoạt HyDE...")
-            hyde_docs = await self._run_hyde_search(req.query)
-            
-            if await self._grade_documents(req.query, hyde_docs):
-                docs = hyde_docs
-            else:
-                logger.info("HyDE failed -> No results found.")
-                return ChatResponse(answer="Xin lỗi, tôi không tìm thấy thông tin phù hợp trong cơ sở dữ liệu luật.", sources=[])
+            if hyde_task:
+                self._stage_stats["speculative_hyde_used"] += 1
+            hyde_docs = await self._with_deadline("hyde", hyde_task or self._run_hyde_search(query), default=None)
+            if hyde_docs is None:
+                logger.warning("HyDE quá hạn -> dùng tài liệu ban đầu")
+                return docs
+            hyde_docs = await self._rerank(query, hyde_docs)
 
-        return await self._generate_final_response(req.query, docs)
+            # Score HyDE (alpha=0.7) không cùng thang với ngưỡng gate -> luôn hỏi grader
+            hyde_relevant = await self._with_deadline(
+                "grading", self._check_relevance(query, hyde_docs, RetrievalGate.GRADE), default=None
+            )
+            if hyde_relevant is None:
+                logger.warning("Grading HyDE quá hạn -> dùng tài liệu HyDE")
+                return hyde_docs or docs
+            if hyde_relevant:
+                return hyde_docs
 
-    async def _parallel_retrieval(self, query: str) -> List[RetrievedDocument]:
-        LOOP = asyncio.get_running_loop()
-        article_match = self.article_pattern.search(query)
-        tasks = []
+            logger.info("HyDE failed -> No results found.")
+            return []
+        finally:
+            if hyde_task and not hyde_task.done():
+                hyde_task.cancel()
 
-        tasks.append(self._run_semantic_search(query))
+    async def _rerank(self, query: str, docs: List[RetrievedDocument]) -> List[RetrievedDocument]:
+        """Sắp xếp lại ứng viên bằng cross-encoder rồi cắt còn rerank_top_k; lỗi thì giữ nguyên thứ tự cũ"""
+        if not self.reranker or not docs:
+            return docs
 
-        if article_match:
-            article_num = article_match.group(1)
-            target = f"Điều {article_num}"
-            logger.info(f"Detected Article: {target}")
-            tasks.append(self._run_strict_search(target))
+        self._stage_stats["rerank_calls"] += 1
+        try:
+            scores = await self._with_deadline("rerank", self.reranker.arerank(query, [d.content for d in docs]), default=None)
+        except Exception as e:
+            self._stage_stats["rerank_failures"] += 1
+            logger.error(f"Rerank error: {e}")
+            return docs
+        if not scores or len(scores) != len(docs):
+            return docs
 
-        results = await asyncio.gather(*tasks)
-        
-        all_docs = []
-        for r in results:
-            all_docs.extend(r)
-            
-        unique_docs = {}
-        for d in all_docs:
-            key = f"{d.title}_{len(d.content)}"
-            if key not in unique_docs:
-                unique_docs[key] = d
-                
-        return list(unique_docs.values())
-
-    async def _run_semantic_search(self, query: str):
-        LOOP = asyncio.get_running_loop()
-        vector = await LOOP.run_in_executor(self.executor, self.embedder.get_embedding, query)
-        
-        return await LOOP.run_in_executor(
-            self.executor, 
-            lambda: self.vector_db.search(query_text=query, vector=vector, limit=8, alpha=0.5)
+        ranked = sorted(
+            (d.model_copy(update={"rerank_score": s}) for d, s in zip(docs, scores)),
+            key=lambda d: d.rerank_score,
+            reverse=True
         )
+        logger.info(f"Rerank: {len(docs)} -> {min(len(ranked), self.rerank_top_k)} docs, top={ranked[0].rerank_score:.3f}")
+        return ranked[:self.rerank_top_k]
+
+    async def _with_deadline(self, stage: str, awaitable, default=None):
+        """Chờ một stage với deadline riêng; quá hạn thì trả về default thay vì vượt SLO"""
+        timeout = self.stage_deadlines.get(stage)
+        if not timeout:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self._stage_stats[f"{stage}_timeouts"] += 1
+            logger.warning(f"Stage '{stage}' vượt deadline {timeout}s")
+            return default
+
+    async def _run_llm(self, priority: int, fn: Callable, *args):
+        """
+        Gọi LLM sau khi giành được một slot theo độ ưu tiên. Hàm async được await trực tiếp nên
+        huỷ task (HyDE suy đoán, deadline) là huỷ luôn lượt sinh; hàm đồng bộ chạy trong llm_executor.
+        """
+        await self.llm_slots.acquire(priority)
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                return await fn(*args)
+            LOOP = asyncio.get_running_loop()
+            return await LOOP.run_in_executor(self.llm_executor, fn, *args)
+        finally:
+            self.llm_slots.release()
+
+    async def _llm_generate(self, priority: int, system_prompt: str, user_prompt: str, profile: GenerationProfile) -> GenerationResult:
+        if isinstance(self.llm, AsyncLLMPort):
+            # Độ ưu tiên đi tiếp vào hàng đợi của scheduler, nơi các lời gọi thực sự tranh model
+            return await self._run_llm(priority, self.llm.agenerate, system_prompt, user_prompt, profile, priority)
+        return await self._run_llm(priority, self.llm.generate, system_prompt, user_prompt, profile)
 
-    async def _run_strict_search(self, target: str):
+    async def _llm_classify(self, priority: int, system_prompt: str, user_prompt: str) -> float:
+        if isinstance(self.llm, AsyncLLMPort):
+            return await self._run_llm(priority, self.llm.aclassify_yes_no, system_prompt, user_prompt, priority)
+        return await self._run_llm(priority, self.llm.classify_yes_no, system_prompt, user_prompt)
+
+    async def _iterate_in_executor(self, gen_fn: Callable, *args) -> AsyncIterator:
+        """Chạy một generator đồng bộ trong executor và đẩy từng phần tử về event loop."""
         LOOP = asyncio.get_running_loop()
-        vector = await LOOP.run_in_executor(self.executor, self.embedder.get_embedding, target)
-        
-        return await LOOP.run_in_executor(
-            self.executor,
-            lambda: self.vector_db.search(
-                query_text=target,
-                vector=vector,
-                limit=5,
-                where_filter={
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+
+        def _produce():
+            iterator = gen_fn(*args)
+            try:
+                for item in iterator:
+                    if cancelled.is_set():
+                        break
+                    LOOP.call_soon_threadsafe(queue.put_nowait, item)
+            except Exception as e:
+                LOOP.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                # Đóng generator để adapter dừng model.generate khi client đã ngắt
+                close = getattr(iterator, "close", None)
+                if close:
+                    close()
+                LOOP.call_soon_threadsafe(queue.put_nowait, done)
+
+        producer = LOOP.run_in_executor(self.llm_executor, _produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+            await producer
+
+    async def _parallel_retrieval(
+        self, query: str, query_vector: List[float]
+    ) -> Tuple[List[RetrievedDocument], List[RetrievedDocument]]:
+        """Trả về (kết quả đã gộp, kết quả riêng của truy vấn semantic dùng cho gate)"""
+        citations = self.citation_parser.parse(query)
+        tasks = {}
+
+        tasks["semantic"] = self._run_semantic_search(query, query_vector)
+
+        if citations:
+            self._stage_stats["citations"] += len(citations)
+            logger.info(f"Detected citations: {[(c.law, c.article, c.clause, c.point) for c in citations]}")
+            tasks["strict"] = self._run_strict_search(query, query_vector, citations)
+
+        results = dict(zip(tasks.keys(), await asyncio.gather(*tasks.values())))
+        return self.fusion.fuse(results), results["semantic"]
+
+    async def _run_semantic_search(self, query: str, vector: List[float]):
+        return await self._search(query_text=query, vector=vector, limit=self.semantic_limit, alpha=0.5)
+
+    async def _run_strict_search(self, query: str, vector: List[float], citations: List[Citation]):
+        """
+        Trích dẫn chính xác được trả thẳng từ article index. Phần còn lại đi qua một request
+        GraphQL duy nhất (mỗi điều một alias), dùng lại vector của câu hỏi nên không tốn thêm embedding.
+        """
+        targets = list(dict.fromkeys((c.law, c.article) for c in citations))
+        resolved = {}
+        for target in targets:
+            hits = self._lookup_article_index(*target)
+            if hits is not None:
+                resolved[target] = hits
+        pending = [t for t in targets if t not in resolved]
+
+        queries = []
+        for law, article in pending:
+            # Lấy dư khi có tên luật vì cùng số điều có thể nằm ở nhiều văn bản
+            law_key = CitationParser.law_key(law) if law else ""
+            queries.append({
+                "query_text": f"{query} {law_key}".strip(),
+                "vector": vector,
+                "limit": self.strict_limit * 4 if law else self.strict_limit,
+                "where_filter": {
                     "path": ["article"],
                     "operator": "Equal",
-                    "valueString": target
+                    "valueString": article
                 }
-            )
-        )
+            })
+        results = await self._search_many(queries) if queries else []
+
+        for (law, article), hits in zip(pending, results):
+            if law:
+                scoped = [d for d in hits if CitationParser.matches_source(law, d.title)]
+                if scoped:
+                    hits = scoped
+                else:
+                    logger.info(f"Không có nguồn khớp '{law}' cho {article}, giữ kết quả không lọc")
+            resolved[(law, article)] = hits
+
+        docs = []
+        for target in targets:
+            docs.extend(resolved[target][:self.strict_limit])
+        return docs
+
+    def _lookup_article_index(self, law: Optional[str], article: str) -> Optional[List[RetrievedDocument]]:
+        """None = index không trả lời chắc chắn được, cần hỏi Weaviate"""
+        if not self.article_index or not self.article_index.is_ready:
+            return None
+        hits = self.article_index.lookup(article, law)
+        if law:
+            return hits or None
+        # Không có tên luật: chỉ dùng index khi số ứng viên đủ ít, nếu không để hybrid search xếp hạng
+        if len(hits) <= self.strict_limit:
+            return hits
+        return None
+
+    async def _check_relevance(self, query: str, docs: List[RetrievedDocument], decision: str) -> bool:
+        """Dùng quyết định của RetrievalGate để bỏ qua LLM grader khi đã đủ chắc chắn"""
+        if decision == RetrievalGate.ACCEPT:
+            logger.info("Gate: semantic score above high threshold -> accept, skip grader")
+            return True
+        if decision == RetrievalGate.REJECT:
+            logger.info("Gate: retrieval score too low -> skip grader")
+            return False
+        return await self._grade_documents(query, docs)
 
     async def _grade_documents(self, query: str, docs: List[RetrievedDocument]) -> bool:
         if not docs: return False
-        LOOP = asyncio.get_running_loop()
         
         top_doc = docs[0].content[:800]
-        sys_prompt = "You are a stricter Relevance Grader. Check if the document contains the answer to the query."
+        sys_prompt = GRADER_SYSTEM_PROMPT
         user_prompt = (
             f"Query: {query}\n"
             f"Doc: {top_doc}\n"
@@ -115,33 +546,52 @@ class ChatService:
             "Reply strictly YES or NO."
         )
         
-        grade = await LOOP.run_in_executor(self.executor, self.llm.generate_answer, sys_prompt, user_prompt)
-        logger.info(f"Grader: {grade.strip()}")
-        return "YES" in grade.upper()
+        # Chỉ cần một lần forward so sánh logit YES/NO, không sinh token
+        p_yes = await self._llm_classify(PRIORITY_BACKGROUND, sys_prompt, user_prompt)
+        logger.info(f"Grader: P(YES)={p_yes:.3f} (threshold={self.grader_threshold})")
+        return p_yes >= self.grader_threshold
 
     async def _run_hyde_search(self, query: str):
-        LOOP = asyncio.get_running_loop()
-        
-        sys_prompt = "Bạn là chuyên gia luật."
+        sys_prompt = HYDE_SYSTEM_PROMPT
         user_prompt = f"Viết đoạn văn ngắn về: {query}"
-        hyde_doc = await LOOP.run_in_executor(self.executor, self.llm.generate_answer, sys_prompt, user_prompt)
+        hyde_doc = (await self._llm_generate(PRIORITY_BACKGROUND, sys_prompt, user_prompt, HYDE_PROFILE)).text
         
-        vector = await LOOP.run_in_executor(self.executor, self.embedder.get_embedding, hyde_doc)
-        return await LOOP.run_in_executor(
-            self.executor, 
-            lambda: self.vector_db.search(query_text=hyde_doc, vector=vector, limit=8, alpha=0.7)
-        )
+        vector = await self._embed(hyde_doc)
+        return await self._search(query_text=hyde_doc, vector=vector, limit=8, alpha=0.7)
 
     async def _generate_final_response(self, query: str, docs: List) -> ChatResponse:
         if not docs:
              return ChatResponse(answer="Xin lỗi, tôi không tìm thấy thông tin phù hợp.", sources=[])
 
+        packed = await self._pack_context(docs)
+        sources = list(set([d.title for d in packed.docs]))
+
+        sys_prompt, user_prompt = self._build_answer_prompt(query, packed.docs)
+        result = await self._llm_generate(PRIORITY_INTERACTIVE, sys_prompt, user_prompt, self.answer_profile)
+        return ChatResponse(
+            answer=result.text,
+            sources=sources,
+            thinking_tokens=result.thinking_tokens,
+            answer_tokens=result.answer_tokens,
+            context_tokens=packed.used_tokens,
+            dropped_chunks=packed.dropped
+        )
+
+    async def _pack_context(self, docs: List[RetrievedDocument]) -> PackedContext:
+        # Tokenizer chạy đồng bộ (cỡ ms mỗi điều luật dài) -> không chạy trên event loop
         LOOP = asyncio.get_running_loop()
-        context_str = "\n".join([f"- {d.title}: {d.content}" for d in docs])
-        sources = list(set([d.title for d in docs]))
+        packed = await LOOP.run_in_executor(self.io_executor, self.context_packer.pack, docs)
+        self._stage_stats["context_docs_trimmed"] += len(packed.trimmed)
+        self._stage_stats["context_docs_dropped"] += len(packed.dropped)
+        logger.info(
+            f"Context: {len(packed.docs)}/{len(docs)} docs, {packed.used_tokens}/{self.context_packer.token_budget} tokens"
+            f" | trimmed={packed.trimmed} | dropped={packed.dropped}"
+        )
+        return packed
 
-        sys_prompt = "Bạn là trợ lý luật sư Việt Nam. Trả lời bằng Tiếng Việt."
+    def _build_answer_prompt(self, query: str, docs: List[RetrievedDocument]):
+        context_str = "\n".join([ContextPacker.format_doc(d) for d in docs])
+
+        sys_prompt = ANSWER_SYSTEM_PROMPT
         user_prompt = f"TÀI LIỆU:\n{context_str}\n\nCÂU HỎI: {query}\n\nTrả lời chi tiết dựa trên tài liệu:"
-        
-        answer = await LOOP.run_in_executor(self.executor, self.llm.generate_answer, sys_prompt, user_prompt)
-        return ChatResponse(answer=answer, sources=sources)
\ No newline at end of file
+        return sys_prompt, user_prompt
\ No newline at end of file
@@ -0,0 +1,102 @@
+# src/application/citation_parser.py
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from src.domain.models import Citation
+
+# Số đi sau "Điều/khoản" nhưng thực chất là số lượng (VD: "khoản 5 triệu đồng")
+_NOT_A_REFERENCE = r"(?!\s*(?:năm|tháng|ngày|giờ|phút|triệu|tỷ|nghìn|trăm|đồng|vnd|usd)\b)"
+
+# [điểm a] [khoản 2] Điều 8[, 9 và 10 | đến 12]
+_REFERENCE = re.compile(
+    r"(?:\bđiểm\s+([a-zđ])\s*,?\s+)?"
+    r"(?:\bkhoản\s+(\d+)\s*,?\s+)?"
+    r"\bđiều\s+(\d+(?:\s*(?:,|và|hoặc|-|đến)\s*\d+\b" + _NOT_A_REFERENCE + r")*)\b" + _NOT_A_REFERENCE,
+    re.IGNORECASE
+)
+
+# Tên luật: "Luật Đất đai", "Bộ luật Lao động 2019"... dừng ở từ nối/số/dấu câu
+_LAW_STOPWORDS = r"(?:và|hoặc|với|về|so|thì|có|là|không|được|quy|điều|khoản|điểm|của|năm|số|mới|nhất|hiện|hành)"
+_LAW = re.compile(
+    r"\b(bộ\s+luật|luật)\s+((?:(?!" + _LAW_STOPWORDS + r"\b)[^\W\d_]+\s*){1,5})",
+    re.IGNORECASE
+)
+
+# Khoảng "Điều 8 đến 12" dài hơn mức này coi như nhập nhầm, chỉ lấy hai đầu
+_MAX_RANGE = 10
+
+
+class CitationParser:
+    """
+    Tách mọi trích dẫn (luật, điều, khoản, điểm) trong câu hỏi:
+        "so sánh Điều 8 và Điều 9 Luật Đất đai"  -> (Luật Đất đai, Điều 8), (Luật Đất đai, Điều 9)
+        "điểm a khoản 2 Điều 5 Bộ luật Lao động"  -> (Bộ luật Lao động, Điều 5, khoản 2, điểm a)
+    Mỗi trích dẫn được gán tên luật xuất hiện ngay sau nó (nếu không có thì tên luật gần nhất phía trước).
+    """
+
+    def parse(self, query: str) -> List[Citation]:
+        query = unicodedata.normalize("NFC", query)
+        laws = [(m.start(), self._clean_law(m.group(0))) for m in _LAW.finditer(query)]
+
+        citations: List[Citation] = []
+        seen = set()
+        for match in _REFERENCE.finditer(query):
+            point, clause, numbers = match.groups()
+            law = self._law_for(match.end(), match.start(), laws)
+            for number in self._expand_numbers(numbers):
+                citation = Citation(
+                    article=f"Điều {number}",
+                    clause=int(clause) if clause else None,
+                    point=point.lower() if point else None,
+                    law=law
+                )
+                key = (citation.law, citation.article, citation.clause, citation.point)
+                if key not in seen:
+                    seen.add(key)
+                    citations.append(citation)
+        return citations
+
+    @staticmethod
+    def law_key(text: str) -> str:
+        """Bỏ dấu, lowercase, bỏ 'bộ luật/luật' và năm: 'Luật Đất đai 2013' -> 'dat dai'"""
+        text = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+        text = "".join(c for c in text if unicodedata.category(c) != "Mn").lower()
+        tokens = re.findall(r"[a-z]+", text)
+        while tokens and tokens[0] in ("bo", "luat"):
+            tokens.pop(0)
+        return " ".join(tokens)
+
+    @classmethod
+    def matches_source(cls, law: str, source: str) -> bool:
+        """Tên file nguồn (VD: 'luat_dat_dai_2013.pdf') có chứa tên luật đã chuẩn hoá hay không"""
+        key = cls.law_key(law)
+        if not key:
+            return True
+        return f" {key} " in f" {cls.law_key(source)} "
+
+    def _law_for(self, end: int, start: int, laws: List[Tuple[int, str]]) -> Optional[str]:
+        after = [name for pos, name in laws if pos >= end]
+        if after:
+            return after[0]
+        before = [name for pos, name in laws if pos < start]
+        return before[-1] if before else None
+
+    def _clean_law(self, text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _expand_numbers(self, numbers: str) -> List[int]:
+        result: List[int] = []
+        parts = re.split(r"\s*(,|và|hoặc|-|đến)\s*", numbers, flags=re.IGNORECASE)
+        values = parts[0::2]
+        separators = parts[1::2]
+        for i, value in enumerate(values):
+            number = int(value)
+            if i > 0 and separators[i - 1].lower() in ("-", "đến") and result:
+                low = result[-1]
+                if 0 < number - low <= _MAX_RANGE:
+                    result.extend(range(low + 1, number + 1))
+                    continue
+            if number not in result:
+                result.append(number)
+        return result
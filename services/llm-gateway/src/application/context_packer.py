@@ -0,0 +1,105 @@
+# src/application/context_packer.py
+import re
+from typing import Callable, List, Optional, Tuple
+
+from src.domain.models import PackedContext, RetrievedDocument
+
+# Khoản bắt đầu bằng "1. ", "2. "... ở đầu dòng
+_CLAUSE_START = re.compile(r"^\d+\.\s")
+_TRIM_MARKER = "\n[...]"
+
+
+class ContextPacker:
+    """
+    Chọn tài liệu đưa vào prompt theo ngân sách token:
+    - Xếp theo độ liên quan (rerank_score, rồi fusion_score, cuối cùng score của retrieval).
+    - Lần lượt thêm tài liệu còn vừa ngân sách.
+    - Điều luật quá dài bị cắt tại ranh giới khoản (giữ phần đầu + các khoản đầu tiên).
+    - Tài liệu không còn chỗ dù đã cắt thì bị loại và được báo lại trong kết quả.
+    pack() gọi tokenizer đồng bộ, nên từ event loop hãy chạy nó trong executor.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], token_budget: int = 4096, max_doc_tokens: int = 0):
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        # 0 = một tài liệu được dùng tối đa toàn bộ ngân sách còn lại
+        self.max_doc_tokens = max_doc_tokens
+
+    @staticmethod
+    def format_doc(doc: RetrievedDocument) -> str:
+        return f"- {doc.title}: {doc.content}"
+
+    @staticmethod
+    def doc_label(doc: RetrievedDocument) -> str:
+        return doc.id or f"{doc.title} | {doc.article}".strip(" |")
+
+    def pack(self, docs: List[RetrievedDocument]) -> PackedContext:
+        result = PackedContext(docs=[])
+        ranked = sorted(docs, key=self._relevance, reverse=True)
+
+        for doc in ranked:
+            remaining = self.token_budget - result.used_tokens
+            limit = min(remaining, self.max_doc_tokens) if self.max_doc_tokens else remaining
+
+            tokens = self.count_tokens(self.format_doc(doc))
+            if tokens <= limit:
+                result.docs.append(doc)
+                result.used_tokens += tokens
+                continue
+
+            trimmed_doc, tokens = self._trim_to_clauses(doc, limit)
+            if trimmed_doc is None:
+                result.dropped.append(self.doc_label(doc))
+                continue
+            result.docs.append(trimmed_doc)
+            result.used_tokens += tokens
+            result.trimmed.append(self.doc_label(doc))
+
+        return result
+
+    def _relevance(self, doc: RetrievedDocument) -> float:
+        if doc.rerank_score is not None:
+            return doc.rerank_score
+        if doc.fusion_score is not None:
+            return doc.fusion_score
+        return doc.score
+
+    def _trim_to_clauses(self, doc: RetrievedDocument, limit: int) -> Tuple[Optional[RetrievedDocument], int]:
+        """Giữ phần mở đầu và các khoản liên tiếp từ đầu cho tới khi chạm limit"""
+        head, clauses = self._split_clauses(doc.content)
+        if not clauses:
+            return None, 0
+
+        # Đếm mỗi khoản một lần rồi cộng dồn thay vì tokenize lại toàn bộ nội dung đã giữ
+        running = (
+            self.count_tokens(self.format_doc(doc.model_copy(update={"content": head})))
+            + self.count_tokens(_TRIM_MARKER)
+        )
+        kept: List[str] = []
+        for clause in clauses:
+            tokens = self.count_tokens("\n" + clause)
+            if running + tokens > limit:
+                break
+            kept.append(clause)
+            running += tokens
+
+        # Tổng từng phần có thể lệch vài token ở ranh giới ghép chuỗi: đếm lại bản cuối, bớt khoản nếu vượt
+        while kept:
+            trimmed = doc.model_copy(update={"content": "\n".join([head, *kept]) + _TRIM_MARKER})
+            tokens = self.count_tokens(self.format_doc(trimmed))
+            if tokens <= limit:
+                return trimmed, tokens
+            kept.pop()
+        return None, 0
+
+    def _split_clauses(self, content: str) -> Tuple[str, List[str]]:
+        head_lines: List[str] = []
+        clauses: List[List[str]] = []
+        for line in content.split("\n"):
+            if _CLAUSE_START.match(line.lstrip("*- ")):
+                clauses.append([line])
+            elif clauses:
+                clauses[-1].append(line)
+            else:
+                head_lines.append(line)
+        return "\n".join(head_lines), ["\n".join(c) for c in clauses]
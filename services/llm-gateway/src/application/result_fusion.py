@@ -0,0 +1,97 @@
+# src/application/result_fusion.py
+import threading
+from typing import Dict, List, Optional
+
+from src.domain.models import RetrievedDocument
+
+
+class ResultFusion:
+    """
+    Gộp kết quả của nhiều chiến lược retrieval (semantic, strict theo điều...) thành một danh sách xếp hạng:
+    - rrf:      score = Σ weight_s / (rrf_k + rank_s), chỉ dùng thứ hạng nên không phụ thuộc thang điểm.
+    - weighted: score = Σ weight_s * min-max(score_s), dùng khi điểm của các chiến lược so sánh được.
+    Tài liệu được nhận diện theo id của Weaviate (không có id thì theo nội dung).
+    Chiến lược không có trong weights có trọng số 1.0.
+    """
+    RRF = "rrf"
+    WEIGHTED = "weighted"
+
+    def __init__(
+        self,
+        method: str = RRF,
+        weights: Optional[Dict[str, float]] = None,
+        rrf_k: int = 60,
+        top_k: int = 8
+    ):
+        if method not in (self.RRF, self.WEIGHTED):
+            raise ValueError(f"Unknown fusion method: {method}")
+        self.method = method
+        self.weights = weights or {}
+        self.rrf_k = rrf_k
+        self.top_k = top_k
+
+        self._lock = threading.Lock()
+        self._fusions = 0
+        self._input_docs = 0
+        self._duplicates = 0
+
+    @staticmethod
+    def parse_weights(value: Optional[str]) -> Dict[str, float]:
+        """'semantic=1.0,strict=2.0' -> {'semantic': 1.0, 'strict': 2.0}"""
+        weights = {}
+        for item in (value or "").split(","):
+            if "=" not in item:
+                continue
+            name, weight = item.split("=", 1)
+            weights[name.strip()] = float(weight)
+        return weights
+
+    @staticmethod
+    def doc_key(doc: RetrievedDocument) -> str:
+        return doc.id or doc.content
+
+    def fuse(self, results: Dict[str, List[RetrievedDocument]]) -> List[RetrievedDocument]:
+        fused: Dict[str, float] = {}
+        best: Dict[str, RetrievedDocument] = {}
+        total = 0
+
+        for strategy, docs in results.items():
+            weight = self.weights.get(strategy, 1.0)
+            contributions = self._contributions(docs)
+            for doc, contribution in zip(docs, contributions):
+                total += 1
+                key = self.doc_key(doc)
+                fused[key] = fused.get(key, 0.0) + weight * contribution
+                # Giữ bản có score retrieval cao nhất để RetrievalGate vẫn thấy điểm gốc
+                if key not in best or doc.score > best[key].score:
+                    best[key] = doc
+
+        ranked = sorted(fused, key=fused.get, reverse=True)[:self.top_k]
+        with self._lock:
+            self._fusions += 1
+            self._input_docs += total
+            self._duplicates += total - len(fused)
+        return [best[key].model_copy(update={"fusion_score": fused[key]}) for key in ranked]
+
+    def _contributions(self, docs: List[RetrievedDocument]) -> List[float]:
+        if self.method == self.RRF:
+            return [1.0 / (self.rrf_k + rank) for rank in range(1, len(docs) + 1)]
+
+        if not docs:
+            return []
+        scores = [d.score for d in docs]
+        low, high = min(scores), max(scores)
+        if high == low:
+            return [1.0] * len(docs)
+        return [(s - low) / (high - low) for s in scores]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "method": self.method,
+                "weights": dict(self.weights),
+                "top_k": self.top_k,
+                "fusions": self._fusions,
+                "input_docs": self._input_docs,
+                "duplicates": self._duplicates
+            }
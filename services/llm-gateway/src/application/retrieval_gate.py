@@ -0,0 +1,60 @@
+# src/application/retrieval_gate.py
+import threading
+from typing import List, Optional
+
+from src.domain.models import RetrievedDocument
+
+
+class RetrievalGate:
+    """
+    Quyết định có cần gọi LLM grader hay không dựa trên hybrid score của Weaviate:
+    - score cao nhất >= high_threshold -> chấp nhận luôn (ACCEPT)
+    - score cao nhất <  low_threshold  -> bỏ qua grader, chuyển thẳng HyDE (REJECT)
+    - nằm giữa hai ngưỡng              -> gọi LLM grader (GRADE)
+    Ngưỡng None nghĩa là tắt nhánh tương ứng. Chọn ngưỡng bằng
+    scripts/calibrate_retrieval_gate.py vì thang điểm phụ thuộc kiểu fusion. Script chỉ chấm
+    truy vấn semantic (hybrid alpha=0.5) nên score đem so ngưỡng cũng phải lấy từ truy vấn đó:
+    kết quả strict/HyDE dùng alpha và bộ lọc khác, tài liệu từ article index có score=0.
+    """
+    ACCEPT = "accept"
+    GRADE = "grade"
+    REJECT = "reject"
+
+    def __init__(self, high_threshold: Optional[float] = None, low_threshold: Optional[float] = None):
+        self.high_threshold = high_threshold
+        self.low_threshold = low_threshold
+        self._lock = threading.Lock()
+        self._counts = {self.ACCEPT: 0, self.GRADE: 0, self.REJECT: 0}
+
+    def decide(self, docs: List[RetrievedDocument], scored_docs: Optional[List[RetrievedDocument]] = None) -> str:
+        """
+        docs: tài liệu sẽ dùng để trả lời. scored_docs: tài liệu mang score cùng thang với lúc
+        hiệu chỉnh (kết quả truy vấn semantic), mặc định là docs.
+        """
+        if scored_docs is None:
+            scored_docs = docs
+        if not docs:
+            decision = self.REJECT
+        elif not scored_docs:
+            # Chỉ có kết quả không so được với ngưỡng (vd. từ article index) -> để grader quyết định
+            decision = self.GRADE
+        else:
+            top_score = max(d.score for d in scored_docs)
+            if self.high_threshold is not None and top_score >= self.high_threshold:
+                decision = self.ACCEPT
+            elif self.low_threshold is not None and top_score < self.low_threshold:
+                decision = self.REJECT
+            else:
+                decision = self.GRADE
+
+        with self._lock:
+            self._counts[decision] += 1
+        return decision
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "high_threshold": self.high_threshold,
+                "low_threshold": self.low_threshold,
+                **self._counts
+            }
@@ -0,0 +1,167 @@
+# src/application/single_flight.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _KeyStats:
+    __slots__ = ("leaders", "followers", "wait_ms_total", "wait_ms_max")
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "avg_wait_ms": round(self.wait_ms_total / self.followers, 1) if self.followers else 0.0,
+            "max_wait_ms": round(self.wait_ms_max, 1)
+        }
+
+
+class _SharedStream:
+    """Các event đã phát của một stream đang chạy; subscriber đến sau phát lại từ đầu rồi theo tiếp"""
+    __slots__ = ("events", "done", "error", "changed", "subscribers", "task")
+
+    def __init__(self):
+        self.events: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        # Thay bằng Event mới sau mỗi lần thay đổi, subscriber chờ Event đang giữ
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Future] = None
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi đồng thời có cùng key: request đầu tiên (leader) chạy pipeline,
+    các request đến sau (follower) chờ chung một future và nhận cùng kết quả.
+    Pipeline chạy trong task riêng nên một client ngắt kết nối không huỷ kết quả của người khác.
+    Chỉ giữ thống kê cho max_tracked_keys key gần nhất để không phình bộ nhớ.
+    """
+
+    def __init__(self, max_tracked_keys: int = 1000, top_keys: int = 20):
+        self.max_tracked_keys = max_tracked_keys
+        self.top_keys = top_keys
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _SharedStream] = {}
+        self._stats: "OrderedDict[str, _KeyStats]" = OrderedDict()
+        self._leaders = 0
+        self._followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        stats = self._key_stats(key)
+        if task is not None:
+            self._followers += 1
+            stats.followers += 1
+            started = time.monotonic()
+            try:
+                return await asyncio.shield(task)
+            finally:
+                wait_ms = (time.monotonic() - started) * 1000
+                stats.wait_ms_total += wait_ms
+                stats.wait_ms_max = max(stats.wait_ms_max, wait_ms)
+
+        self._leaders += 1
+        stats.leaders += 1
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Bản streaming của do(): leader chạy fn() trong task riêng và ghi lại từng event, mọi
+        subscriber (kể cả leader) phát lại các event đã có rồi nhận tiếp event mới.
+        Khi subscriber cuối cùng rời đi, task bị huỷ để dừng pipeline (và model.generate).
+        """
+        shared = self._streams.get(key)
+        stats = self._key_stats(key)
+        started = None
+        if shared is None:
+            self._leaders += 1
+            stats.leaders += 1
+            shared = self._streams[key] = _SharedStream()
+            shared.task = asyncio.ensure_future(self._pump(key, shared, fn))
+        else:
+            self._followers += 1
+            stats.followers += 1
+            started = time.monotonic()
+
+        shared.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(shared.events):
+                    if started is not None:
+                        # Thời gian chờ của follower tính tới event đầu tiên nhận được
+                        wait_ms = (time.monotonic() - started) * 1000
+                        stats.wait_ms_total += wait_ms
+                        stats.wait_ms_max = max(stats.wait_ms_max, wait_ms)
+                        started = None
+                    yield shared.events[index]
+                    index += 1
+                if shared.done:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+                await shared.changed.wait()
+        finally:
+            shared.subscribers -= 1
+            if shared.subscribers == 0 and not shared.done:
+                shared.task.cancel()
+
+    async def _pump(self, key: str, shared: _SharedStream, fn: Callable[[], AsyncIterator]):
+        stream = fn()
+        try:
+            async for event in stream:
+                shared.events.append(event)
+                shared.notify()
+        except Exception as e:
+            shared.error = e
+        finally:
+            await stream.aclose()
+            shared.done = True
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+            shared.notify()
+
+    def _on_done(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Đánh dấu exception đã được đọc khi mọi caller đều đã huỷ
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> dict:
+        busiest = sorted(self._stats.items(), key=lambda kv: kv[1].followers, reverse=True)[:self.top_keys]
+        total = self._leaders + self._followers
+        return {
+            "inflight": len(self._inflight) + len(self._streams),
+            "leaders": self._leaders,
+            "followers": self._followers,
+            "coalesced_rate": round(self._followers / total, 4) if total else 0.0,
+            "keys": {key: s.to_dict() for key, s in busiest if s.followers}
+        }
+
+    def _key_stats(self, key: str) -> _KeyStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _KeyStats()
+            while len(self._stats) > self.max_tracked_keys:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+        return stats
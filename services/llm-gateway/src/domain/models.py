@@ -3,9 +3,31 @@ from typing import List, Optional
 
 # Entity đại diện cho tài liệu tìm được
 class RetrievedDocument(BaseModel):
+    # UUID của object trong Weaviate, dùng làm khoá dedup/fusion
+    id: Optional[str] = None
     title: str
     content: str
+    article: str = ""
+    chapter: str = ""
     score: float = 0.0
+    # Điểm sau khi gộp nhiều chiến lược retrieval, None nếu chưa qua bước fusion
+    fusion_score: Optional[float] = None
+    # Điểm cross-encoder, None nếu chưa qua bước rerank
+    rerank_score: Optional[float] = None
+
+# Ngữ cảnh đã đóng gói theo ngân sách token
+class PackedContext(BaseModel):
+    docs: List[RetrievedDocument] = []
+    used_tokens: int = 0
+    trimmed: List[str] = []
+    dropped: List[str] = []
+
+# Một trích dẫn điều luật trong câu hỏi (VD: điểm a khoản 2 Điều 8 Luật Đất đai)
+class Citation(BaseModel):
+    article: str
+    clause: Optional[int] = None
+    point: Optional[str] = None
+    law: Optional[str] = None
 
 # Input từ người dùng
 class ChatQuery(BaseModel):
@@ -14,4 +36,37 @@ class ChatQuery(BaseModel):
 # Output trả về cho người dùng
 class ChatResponse(BaseModel):
     answer: str
-    sources: List[str]
\ No newline at end of file
+    sources: List[str]
+    thinking_tokens: int = 0
+    answer_tokens: int = 0
+    # Số token ngữ cảnh đưa vào prompt và các chunk bị loại vì vượt ngân sách
+    context_tokens: int = 0
+    dropped_chunks: List[str] = []
+
+# Thông báo từ indexing-service khi có chunk mới được ghi vào Weaviate
+class DocumentsIndexedEvent(BaseModel):
+    source: str
+    chunks: int = 0
+
+# Cấu hình sinh văn bản cho từng loại lời gọi LLM
+class GenerationProfile(BaseModel):
+    enable_thinking: bool = True
+    max_new_tokens: int = 32768
+    do_sample: bool = True
+    temperature: float = 0.6
+    top_p: float = 0.95
+    # Ngân sách token cho phần <think> và phần trả lời (None = không giới hạn riêng)
+    thinking_budget: Optional[int] = None
+    answer_max_tokens: Optional[int] = None
+
+# Kết quả một lần sinh kèm bộ đếm token
+class GenerationResult(BaseModel):
+    text: str
+    thinking_tokens: int = 0
+    answer_tokens: int = 0
+
+# Câu trả lời cuối: bật thinking, sampling theo khuyến nghị của Qwen3
+ANSWER_PROFILE = GenerationProfile()
+
+# HyDE chỉ cần một đoạn văn ngắn, không cần suy luận
+HYDE_PROFILE = GenerationProfile(enable_thinking=False, max_new_tokens=256, temperature=0.7, top_p=0.8)
@@ -1,6 +1,7 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List
-from .models import RetrievedDocument
+from typing import Any, Dict, Iterator, List, Optional
+from .models import GenerationProfile, GenerationResult, RetrievedDocument
 
 # Port cho Embedding Service
 class EmbeddingPort(ABC):
@@ -8,16 +9,100 @@ class EmbeddingPort(ABC):
     def get_embedding(self, text: str) -> List[float]:
         pass
 
+    def get_stats(self) -> dict:
+        return {}
+
 # Port cho Vector Database (Weaviate)
 class VectorDBPort(ABC):
     @abstractmethod
     def search(self, query_text: str, vector: List[float], limit: int = 10) -> List[RetrievedDocument]:
         pass
 
+    def search_many(self, queries: List[Dict[str, Any]]) -> List[List[RetrievedDocument]]:
+        """Chạy nhiều truy vấn (mỗi phần tử là kwargs của search); adapter có thể gộp thành một request."""
+        return [self.search(**q) for q in queries]
+
+    @abstractmethod
+    def iter_documents(self, page_size: int = 500) -> Iterator[List[RetrievedDocument]]:
+        """Duyệt toàn bộ tài liệu theo trang (dùng để dựng index trong bộ nhớ)."""
+        pass
+
+    @abstractmethod
+    def fetch_by_source(self, source: str) -> List[RetrievedDocument]:
+        """Toàn bộ chunk của một source."""
+        pass
+
+# Port bất đồng bộ cho Embedding Service (HTTP client dùng chung kết nối keep-alive)
+class AsyncEmbeddingPort(ABC):
+    @abstractmethod
+    async def aget_embedding(self, text: str) -> List[float]:
+        pass
+
+    @abstractmethod
+    async def aclose(self):
+        pass
+
+# Port bất đồng bộ cho Vector Database
+class AsyncVectorDBPort(ABC):
+    @abstractmethod
+    async def asearch(
+        self,
+        query_text: str,
+        vector: List[float],
+        limit: int = 10,
+        alpha: float = 0.5,
+        properties: Optional[List[str]] = None,
+        where_filter: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedDocument]:
+        pass
+
+    async def asearch_many(self, queries: List[Dict[str, Any]]) -> List[List[RetrievedDocument]]:
+        return list(await asyncio.gather(*(self.asearch(**q) for q in queries)))
+
+    @abstractmethod
+    async def aclose(self):
+        pass
+
+# Port cho Reranker (cross-encoder của embedding-api)
+class RerankPort(ABC):
+    @abstractmethod
+    async def arerank(self, query: str, passages: List[str]) -> List[float]:
+        """Trả về điểm của từng passage theo đúng thứ tự đầu vào"""
+        pass
+
+    @abstractmethod
+    async def aclose(self):
+        pass
+
 # Port cho LLM (Groq)
 class LLMPort(ABC):
     @abstractmethod
-    def generate_answer(self, system_prompt: str, user_prompt: str) -> str:
+    def generate(self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None) -> GenerationResult:
+        pass
+
+    def generate_answer(self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None) -> str:
+        return self.generate(system_prompt, user_prompt, profile).text
+
+    @abstractmethod
+    def stream_answer(self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None) -> Iterator[str]:
+        """Sinh câu trả lời theo từng đoạn text, phần <think> đã được lọc bỏ. Lỗi khi sinh thì raise, không yield thông báo lỗi."""
+        pass
+
+    def count_tokens(self, text: str) -> int:
+        """Số token của text theo tokenizer của model; mặc định ước lượng thô ~3 ký tự/token."""
+        return len(text) // 3 + 1
+
+    def register_prefix(self, system_prompt: str) -> None:
+        """Báo trước một system prompt cố định để adapter có thể giữ sẵn KV cache của nó; mặc định bỏ qua."""
+        return None
+
+    def get_stats(self) -> dict:
+        """Cấu hình suy luận và thông lượng (tokens/s) để báo cáo trên /health và /metrics."""
+        return {}
+
+    @abstractmethod
+    def classify_yes_no(self, system_prompt: str, user_prompt: str) -> float:
+        """Xác suất (0-1) câu trả lời là YES, tính từ logit token YES/NO sau một lần forward."""
         pass
 
     @property
@@ -25,3 +110,15 @@ class LLMPort(ABC):
     def is_ready(self) -> bool:
         pass
 
+# Port bất đồng bộ cho LLM: huỷ coroutine là huỷ luôn lượt sinh (chưa chạy thì bỏ, đang chạy thì dừng).
+# priority: số nhỏ được model phục vụ trước khi có nhiều lời gọi đang chờ
+class AsyncLLMPort(ABC):
+    @abstractmethod
+    async def agenerate(
+        self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None, priority: int = 0
+    ) -> GenerationResult:
+        pass
+
+    @abstractmethod
+    async def aclassify_yes_no(self, system_prompt: str, user_prompt: str, priority: int = 0) -> float:
+        pass
@@ -0,0 +1,87 @@
+# src/infrastructure/assisted_decoding.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AssistedDecoding:
+    """
+    Assisted (speculative) decoding: draft model nhỏ đề xuất vài token, model chính kiểm tra
+    cả cụm trong một lần forward. Draft phải dùng chung tokenizer với model chính (cùng họ Qwen3).
+    transformers chỉ hỗ trợ assisted generation với batch 1 phần tử.
+
+    Tỉ lệ chấp nhận được ước lượng bằng cách đếm số lần forward của từng model trong lời gọi:
+    mỗi lần forward của model chính sinh đúng một token của riêng nó, phần còn lại là token
+    draft được chấp nhận; mỗi lần forward của draft đề xuất một token.
+    """
+
+    def __init__(self, model, draft_model, num_assistant_tokens: Optional[int] = None):
+        self.draft_model = draft_model
+        if num_assistant_tokens:
+            draft_model.generation_config.num_assistant_tokens = num_assistant_tokens
+
+        # Đếm forward theo thread: chỉ lời gọi generate đang được track() mới ghi nhận
+        self._local = threading.local()
+        model.register_forward_hook(lambda *_: self._on_forward("target"))
+        draft_model.register_forward_hook(lambda *_: self._on_forward("draft"))
+
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._new_tokens = 0
+        self._target_forwards = 0
+        self._draft_proposed = 0
+        self._draft_accepted = 0
+        self._seconds = 0.0
+
+    def _on_forward(self, kind: str):
+        counts = getattr(self._local, "counts", None)
+        if counts is not None:
+            counts[kind] += 1
+
+    def generate_kwargs(self) -> dict:
+        return {"assistant_model": self.draft_model}
+
+    @contextmanager
+    def track(self):
+        """Bao quanh một lần model.generate; caller ghi số token sinh ra vào call["new_tokens"]"""
+        call = {"new_tokens": 0}
+        self._local.counts = {"target": 0, "draft": 0}
+        started = time.monotonic()
+        try:
+            yield call
+        finally:
+            elapsed = time.monotonic() - started
+            counts = self._local.counts
+            self._local.counts = None
+            self._record(call["new_tokens"], counts["target"], counts["draft"], elapsed)
+
+    def _record(self, new_tokens: int, target_forwards: int, draft_proposed: int, elapsed: float):
+        accepted = min(max(new_tokens - target_forwards, 0), draft_proposed)
+        with self._lock:
+            self._calls += 1
+            self._new_tokens += new_tokens
+            self._target_forwards += target_forwards
+            self._draft_proposed += draft_proposed
+            self._draft_accepted += accepted
+            self._seconds += elapsed
+
+        acceptance = accepted / draft_proposed if draft_proposed else 0.0
+        logger.info(
+            f"Assisted decoding: tokens={new_tokens} | target_forwards={target_forwards} | "
+            f"draft_accepted={accepted}/{draft_proposed} ({acceptance:.0%}) | "
+            f"{new_tokens / elapsed if elapsed > 0 else 0.0:.1f} tok/s"
+        )
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "new_tokens": self._new_tokens,
+                "acceptance_rate": round(self._draft_accepted / self._draft_proposed, 4) if self._draft_proposed else 0.0,
+                "tokens_per_target_forward": round(self._new_tokens / self._target_forwards, 2) if self._target_forwards else 0.0,
+                "tokens_per_second": round(self._new_tokens / self._seconds, 2) if self._seconds else 0.0
+            }
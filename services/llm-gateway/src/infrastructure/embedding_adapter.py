@@ -1,21 +1,166 @@
+import asyncio
 import requests
+import httpx
 import logging
-from typing import List
-from src.domain.ports import EmbeddingPort
+from typing import Dict, List, Optional, Set, Tuple
+from requests.adapters import HTTPAdapter
+from src.domain.ports import AsyncEmbeddingPort, EmbeddingPort
+from src.infrastructure.embedding_cache import EmbeddingLRUCache
+from src.infrastructure.vector_codec import accept_header, decode_vectors, is_vector_response
 
 logger = logging.getLogger(__name__)
 
-class HttpEmbeddingAdapter(EmbeddingPort):
-    def __init__(self, api_url: str):
+class HttpEmbeddingAdapter(EmbeddingPort, AsyncEmbeddingPort):
+    def __init__(
+        self,
+        api_url: str,
+        max_connections: int = 100,
+        model_name: str = "huyydangg/DEk21_hcmute_embedding",
+        cache_max_bytes: int = 32 * 1024 * 1024,
+        batch_window_ms: float = 5.0,
+        max_batch_size: int = 32,
+        transport: str = "binary",
+        transport_dtype: str = "float32"
+    ):
         self.api_url = api_url
+        self.batch_url = api_url.rstrip("/") + "/batch"
+        self.cache = EmbeddingLRUCache(model_name=model_name, max_bytes=cache_max_bytes)
+        # transport="binary": xin vector nhị phân (application/x-vectors) thay cho mảng float JSON
+        self.headers = {"Accept": accept_header(transport_dtype)} if transport == "binary" else {}
+
+        # Gộp các lời gọi aget_embedding đồng thời thành một request /embed/batch
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Giữ tham chiếu tới task flush đang chạy (event loop chỉ giữ weakref) để aclose() huỷ được
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._batched_texts = 0
+
+        # Session giữ kết nối keep-alive cho đường đồng bộ
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=max_connections))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=max_connections))
+
+        # Client bất đồng bộ dùng chung connection pool cho mọi request
+        self.async_client = httpx.AsyncClient(
+            timeout=60,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
 
     def get_embedding(self, text: str) -> List[float]:
+        cached = self.cache.get(text)
+        if cached is not None:
+            return cached
         try:
-            res = requests.post(self.api_url, json={"text": text}, timeout=60)
+            res = self.session.post(self.api_url, json={"text": text}, headers=self.headers, timeout=60)
             if res.status_code == 200:
-                return res.json()["embedding"]
+                embedding = self._parse_embeddings(res, single=True)[0]
+                self.cache.put(text, embedding)
+                return embedding
             logger.error(f"Embedding API failed: {res.status_code}")
             return []
         except Exception as e:
             logger.error(f"Embedding Connection Error: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        cached = self.cache.get(text)
+        if cached is not None:
+            return cached
+
+        LOOP = asyncio.get_running_loop()
+        key = self.cache.key(text)
+        pending = self._pending.get(key)
+        if pending is None:
+            # Cùng một text đang chờ thì dùng chung future, không gửi lại
+            pending = (text, LOOP.create_future())
+            self._pending[key] = pending
+
+            if len(self._pending) >= self.max_batch_size:
+                self._schedule_flush(LOOP, delay=0)
+            elif self._flush_handle is None:
+                self._schedule_flush(LOOP, delay=self.batch_window)
+
+        # shield: một caller bị huỷ không được huỷ future dùng chung
+        return await asyncio.shield(pending[1])
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, self._start_flush, loop)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop):
+        task = loop.create_task(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self):
+        self._flush_handle = None
+        keys = list(self._pending)[:self.max_batch_size]
+        batch = {key: self._pending.pop(key) for key in keys}
+        if self._pending:
+            self._schedule_flush(asyncio.get_running_loop(), delay=0)
+        if not batch:
+            return
+
+        texts = [text for text, _ in batch.values()]
+        embeddings: List[List[float]] = []
+        try:
+            res = await self.async_client.post(self.batch_url, json={"texts": texts}, headers=self.headers)
+            if res.status_code == 200:
+                embeddings = self._parse_embeddings(res)
+                self._batches += 1
+                self._batched_texts += len(texts)
+            else:
+                logger.error(f"Embedding Batch API failed: {res.status_code}")
+        except asyncio.CancelledError:
+            # Bị huỷ khi shutdown: batch đã rời _pending nên phải tự báo lỗi cho caller
+            self._fail_pending(future for _, future in batch.values())
+            raise
+        except Exception as e:
+            logger.error(f"Embedding Connection Error: {e}")
+
+        if len(embeddings) != len(texts):
+            embeddings = [[] for _ in texts]
+
+        for (text, future), embedding in zip(batch.values(), embeddings):
+            if embedding:
+                self.cache.put(text, embedding)
+            if not future.done():
+                future.set_result(embedding)
+
+    def _fail_pending(self, futures):
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError("HttpEmbeddingAdapter đã đóng"))
+
+    @staticmethod
+    def _parse_embeddings(res, single: bool = False) -> List[List[float]]:
+        if is_vector_response(res.headers.get("content-type")):
+            # Đọc thẳng từ buffer; EmbeddingPort trả List[float] nên chỉ chuyển từng hàng ở cuối
+            return decode_vectors(res.content).tolist()
+        data = res.json()
+        return [data["embedding"]] if single else data.get("embeddings", [])
+
+    def get_stats(self) -> dict:
+        return {
+            "cache": self.cache.get_stats(),
+            "batches": self._batches,
+            "avg_batch_size": round(self._batched_texts / self._batches, 2) if self._batches else 0.0
+        }
+
+    async def aclose(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        tasks = list(self._flush_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Text chưa được gửi đi: caller đang await không được treo mãi
+        self._fail_pending(future for _, future in self._pending.values())
+        self._pending.clear()
+        await self.async_client.aclose()
+        self.session.close()
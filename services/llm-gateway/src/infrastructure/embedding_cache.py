@@ -0,0 +1,72 @@
+# src/infrastructure/embedding_cache.py
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+class EmbeddingLRUCache:
+    """
+    Cache LRU cho vector embedding, giới hạn theo số byte.
+    Key là hash của (tên model, text) nên đổi model không trả nhầm vector cũ.
+    Vector được giữ dưới dạng float32 để tiết kiệm bộ nhớ so với list Python.
+    """
+
+    def __init__(self, model_name: str, max_bytes: int = 32 * 1024 * 1024):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return vector.tolist()
+
+    def put(self, text: str, embedding: List[float]):
+        if not len(embedding):
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.nbytes > self.max_bytes:
+            return
+
+        key = self.key(text)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old.nbytes
+            self._entries[key] = vector
+            self._total_bytes += vector.nbytes
+
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+                self._evictions += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions
+            }
@@ -0,0 +1,290 @@
+# src/infrastructure/generation_scheduler.py
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+from src.infrastructure.assisted_decoding import AssistedDecoding
+from src.infrastructure.prefix_cache import PrefixKVCache
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationRequest:
+    GENERATE = "generate"
+    CLASSIFY = "classify"
+
+    def __init__(
+        self,
+        prompt: str,
+        gen_kwargs: Dict,
+        kind: str = GENERATE,
+        stop_event: Optional[threading.Event] = None,
+        on_tokens: Optional[Callable[[List[int]], None]] = None,
+        priority: int = 0
+    ):
+        self.prompt = prompt
+        self.gen_kwargs = gen_kwargs
+        self.kind = kind
+        # Số nhỏ được phục vụ trước (câu trả lời cuối trước grader/HyDE), cùng mức thì FIFO
+        self.priority = priority
+        # Request streaming nhận token mới của dòng mình ngay trong lúc batch đang sinh
+        self.on_tokens = on_tokens
+        # Caller set stop_event để bỏ request: chưa chạy thì bị loại khỏi batch, đang chạy thì dừng dòng của nó
+        self.stop_event = stop_event or threading.Event()
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def group_key(self) -> tuple:
+        # Chỉ gộp các request cùng loại, cùng tham số sinh vào một lần chạy model
+        return (self.kind,) + tuple(sorted(self.gen_kwargs.items()))
+
+
+class _RowStoppingCriteria(StoppingCriteria):
+    """Dừng từng dòng của batch khi request tương ứng bị huỷ; các dòng khác sinh tiếp"""
+    def __init__(self, stop_events: List[threading.Event]):
+        self.stop_events = stop_events
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stopped = [event.is_set() for event in self.stop_events]
+        return torch.tensor(stopped, dtype=torch.bool, device=input_ids.device)
+
+
+class _BatchStreamer(BaseStreamer):
+    """
+    Streamer cho cả batch: tách token mới theo từng dòng và gọi callback của request tương ứng.
+    Dòng đã kết thúc được generate lấp pad_token_id nên các token pad bị bỏ qua.
+    """
+    def __init__(self, callbacks: List[Optional[Callable[[List[int]], None]]], pad_token_id: Optional[int]):
+        self.callbacks = callbacks
+        self.pad_token_id = pad_token_id
+        self._prompt_seen = False
+
+    def put(self, value):
+        # Lần put đầu tiên là prompt
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        # Decode thường: (batch,) mỗi bước; assisted decoding: (1, số token được chấp nhận)
+        if value.dim() == 1:
+            value = value.unsqueeze(1)
+        for callback, row in zip(self.callbacks, value.tolist()):
+            token_ids = [t for t in row if t != self.pad_token_id]
+            if callback is not None and token_ids:
+                callback(token_ids)
+
+    def end(self):
+        # Kết thúc stream được báo qua Future của từng request
+        pass
+
+
+class GenerationScheduler:
+    """
+    Gom các lời gọi generate đồng thời (grader, HyDE, câu trả lời cuối) thành
+    batch có padding trái và chạy một lần model.generate cho cả nhóm.
+    Mỗi request nhận lại danh sách token id sinh ra qua Future; request có on_tokens (stream)
+    còn nhận token mới của dòng mình sau mỗi bước decode, nên /chat/stream dùng chung batch
+    với các lời gọi generate khác. Hàng đợi xếp theo priority rồi thứ tự đến: khi model bận,
+    câu trả lời cuối không phải chờ sau grader/HyDE đã xếp hàng trước. Huỷ Future trước khi batch
+    chạy thì request bị bỏ qua; set stop_event thì dòng của nó dừng ở bước decode kế tiếp.
+    Request loại classify chỉ chạy một lần forward và nhận về logit của vị trí cuối.
+    Ngân sách thinking_budget/answer_budget trong gen_kwargs được chuyển thành
+    logits processor qua logits_processor_factory (cần độ dài prompt sau padding).
+    Batch chỉ có một request thì sinh bằng draft model của assisted (nếu có), nếu không
+    thì dùng lại KV của system prompt từ prefix_cache. Không dùng cả hai cùng lúc:
+    assisted generation với past_key_values có sẵn cho ra token khác greedy thường.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        logits_processor_factory: Optional[Callable] = None,
+        prefix_cache: Optional[PrefixKVCache] = None,
+        assisted: Optional[AssistedDecoding] = None
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.logits_processor_factory = logits_processor_factory
+        self.prefix_cache = prefix_cache
+        self.assisted = assisted
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        # Phần tử (priority, seq, request): seq giữ FIFO trong cùng mức và tránh so sánh request
+        self._queue: "queue.PriorityQueue[tuple]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        # Thông lượng decode: token sinh ra (không tính padding) / thời gian model.generate
+        self._generated_tokens = 0
+        self._generate_seconds = 0.0
+
+        threading.Thread(target=self._worker_loop, daemon=True).start()
+
+    def submit(
+        self,
+        prompt: str,
+        stop_event: Optional[threading.Event] = None,
+        on_tokens: Optional[Callable[[List[int]], None]] = None,
+        priority: int = 0,
+        **gen_kwargs
+    ) -> Future:
+        request = GenerationRequest(prompt, gen_kwargs, stop_event=stop_event, on_tokens=on_tokens, priority=priority)
+        self._enqueue(request)
+        return request.future
+
+    def submit_classify(self, prompt: str, stop_event: Optional[threading.Event] = None, priority: int = 0) -> Future:
+        request = GenerationRequest(prompt, {}, kind=GenerationRequest.CLASSIFY, stop_event=stop_event, priority=priority)
+        self._enqueue(request)
+        return request.future
+
+    def _enqueue(self, request: GenerationRequest):
+        self._queue.put((request.priority, next(self._seq), request))
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "requests": self._requests,
+                "avg_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+                "queue_size": self._queue.qsize(),
+                "generated_tokens": self._generated_tokens,
+                "tokens_per_second": round(self._generated_tokens / self._generate_seconds, 2) if self._generate_seconds else 0.0
+            }
+
+    def _collect_batch(self) -> List[GenerationRequest]:
+        batch = [self._queue.get()[2]]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining)[2])
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect_batch()
+
+            groups: Dict[tuple, List[GenerationRequest]] = defaultdict(list)
+            for request in batch:
+                # Bỏ qua request đã bị huỷ trong lúc chờ
+                if request.stop_event.is_set():
+                    request.future.cancel()
+                if request.future.set_running_or_notify_cancel():
+                    groups[request.group_key].append(request)
+
+            # Nhóm chứa request ưu tiên cao nhất chạy trước
+            for group in sorted(groups.values(), key=lambda g: min(r.priority for r in g)):
+                self._run_group(group)
+
+    def _run_group(self, group: List[GenerationRequest]):
+        try:
+            model_inputs = self.tokenizer(
+                [r.prompt for r in group],
+                return_tensors="pt",
+                padding=True
+            ).to(self.model.device)
+
+            # Draft model và prefix cache loại trừ nhau (xem docstring); classify không dùng draft
+            use_draft = self.assisted is not None and len(group) == 1 and group[0].kind == GenerationRequest.GENERATE
+            reused, past_key_values = 0, None
+            if self.prefix_cache is not None and len(group) == 1 and not use_draft:
+                reused, past_key_values = self.prefix_cache.match(model_inputs.input_ids[0].tolist())
+
+            started = time.monotonic()
+            if group[0].kind == GenerationRequest.CLASSIFY:
+                self._run_classify(group, model_inputs, reused, past_key_values)
+            else:
+                self._run_generate(group, model_inputs, past_key_values, use_draft)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(group)
+
+            waited = max(started - r.enqueued_at for r in group)
+            logger.info(
+                f"Generation batch ({group[0].kind}): size={len(group)} | wait={waited * 1000:.0f}ms | "
+                f"generate={time.monotonic() - started:.2f}s | "
+                f"prefill_reused={reused}/{model_inputs.input_ids.shape[1]}"
+            )
+        except Exception as e:
+            logger.error(f"Generation batch error: {e}")
+            for request in group:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+    def _run_generate(self, group: List[GenerationRequest], model_inputs, past_key_values=None, use_draft: bool = False):
+        gen_kwargs = dict(group[0].gen_kwargs)
+        thinking_budget = gen_kwargs.pop("thinking_budget", None)
+        answer_budget = gen_kwargs.pop("answer_budget", None)
+
+        prompt_len = model_inputs.input_ids.shape[1]
+        if self.logits_processor_factory:
+            processors = self.logits_processor_factory(prompt_len, thinking_budget, answer_budget)
+            if processors:
+                gen_kwargs["logits_processor"] = processors
+        if past_key_values is not None:
+            # generate tự bỏ qua các token đã có trong cache khi prefill
+            gen_kwargs["past_key_values"] = past_key_values
+
+        # Assisted generation của transformers chỉ chạy với batch 1 phần tử
+        if use_draft:
+            gen_kwargs.update(self.assisted.generate_kwargs())
+        if any(r.on_tokens is not None for r in group):
+            gen_kwargs["streamer"] = _BatchStreamer([r.on_tokens for r in group], self.tokenizer.pad_token_id)
+
+        started = time.monotonic()
+        with self.assisted.track() if use_draft else nullcontext() as call, torch.no_grad():
+            generated_ids = self.model.generate(
+                **model_inputs,
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=StoppingCriteriaList([_RowStoppingCriteria([r.stop_event for r in group])]),
+                **gen_kwargs
+            )
+            new_tokens = int((generated_ids[:, prompt_len:] != self.tokenizer.pad_token_id).sum())
+            if call is not None:
+                call["new_tokens"] = new_tokens
+        elapsed = time.monotonic() - started
+
+        with self._stats_lock:
+            self._generated_tokens += new_tokens
+            self._generate_seconds += elapsed
+
+        for i, request in enumerate(group):
+            request.future.set_result(generated_ids[i][prompt_len:].tolist())
+
+    def _run_classify(self, group: List[GenerationRequest], model_inputs, reused: int = 0, past_key_values=None):
+        # Padding trái nên phải tự tính position_ids từ attention_mask (generate làm việc này nội bộ)
+        attention_mask = model_inputs.attention_mask
+        position_ids = attention_mask.long().cumsum(-1) - 1
+        position_ids.masked_fill_(attention_mask == 0, 1)
+
+        with torch.no_grad():
+            # Có prefix trong cache: chỉ forward phần sau prefix, attention_mask vẫn phủ toàn bộ
+            logits = self.model(
+                input_ids=model_inputs.input_ids[:, reused:],
+                attention_mask=attention_mask,
+                position_ids=position_ids[:, reused:],
+                past_key_values=past_key_values
+            ).logits[:, -1, :].float().cpu()
+
+        for i, request in enumerate(group):
+            request.future.set_result(logits[i])
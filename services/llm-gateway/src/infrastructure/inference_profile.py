@@ -0,0 +1,58 @@
+# src/infrastructure/inference_profile.py
+import logging
+from typing import Optional
+
+import torch
+from transformers import AutoModelForCausalLM
+
+logger = logging.getLogger(__name__)
+
+# fp16:     cấu hình gốc, float16 + device_map="auto" (nhanh trên GPU, chậm trên CPU)
+# cpu-bf16: trọng số bfloat16 trên CPU (AVX512-BF16/AMX dùng kernel gốc)
+# cpu-int8: trọng số float32, các lớp Linear lượng tử hoá động sang int8
+PROFILE_FP16 = "fp16"
+PROFILE_CPU_BF16 = "cpu-bf16"
+PROFILE_CPU_INT8 = "cpu-int8"
+INFERENCE_PROFILES = (PROFILE_FP16, PROFILE_CPU_BF16, PROFILE_CPU_INT8)
+
+
+def is_cpu_profile(profile: str) -> bool:
+    return profile in (PROFILE_CPU_BF16, PROFILE_CPU_INT8)
+
+
+def configure_cpu_threads(num_threads: Optional[int] = None, interop_threads: Optional[int] = None) -> dict:
+    """
+    Đặt số thread intra-op (trong một phép nhân ma trận) và inter-op (giữa các op độc lập).
+    Mọi lời gọi model (generate, classify và cả /chat/stream) đều đi qua thread duy nhất của
+    GenerationScheduler, mỗi lần một batch, nên inter-op mặc định là 1. Ngoại lệ duy nhất là
+    lần forward tính KV của prefix cache khi đăng ký system prompt lúc khởi động.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(interop_threads or 1)
+    except RuntimeError as e:
+        # Chỉ đặt được trước khi torch chạy tác vụ song song đầu tiên
+        logger.warning(f"Không đặt được inter-op threads: {e}")
+    return {"intra_op": torch.get_num_threads(), "inter_op": torch.get_num_interop_threads()}
+
+
+def load_causal_lm(model_name: str, profile: str = PROFILE_FP16):
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"LLM_INFERENCE_PROFILE không hợp lệ: {profile} (hỗ trợ: {', '.join(INFERENCE_PROFILES)})")
+
+    if profile == PROFILE_FP16:
+        return AutoModelForCausalLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            trust_remote_code=True
+        )
+
+    dtype = torch.bfloat16 if profile == PROFILE_CPU_BF16 else torch.float32
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=dtype, trust_remote_code=True)
+    model.eval()
+    if profile == PROFILE_CPU_INT8:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
@@ -1,21 +1,76 @@
 # src/infrastructure/llm_adapter.py
+import asyncio
 import logging
 import torch
 import re
 import threading
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from src.domain.ports import LLMPort
+import math
+import queue
+import time
+from typing import Iterator, List, Optional
+from transformers import AutoTokenizer, LogitsProcessorList, TextStreamer
+from src.domain.models import ANSWER_PROFILE, GenerationProfile, GenerationResult
+from src.domain.ports import AsyncLLMPort, LLMPort
+from src.infrastructure.generation_scheduler import GenerationScheduler
+from src.infrastructure.assisted_decoding import AssistedDecoding
+from src.infrastructure.prefix_cache import PrefixKVCache
+from src.infrastructure.inference_profile import PROFILE_FP16, configure_cpu_threads, is_cpu_profile, load_causal_lm
+from src.infrastructure.think_filter import ThinkTagFilter
+from src.infrastructure.thinking_budget import ThinkingBudgetProcessor, count_generation_tokens
 
 logger = logging.getLogger(__name__)
 
 import os
 
-class QwenLocalAdapter(LLMPort):
+class _TextCollector(TextStreamer):
+    """TextStreamer của transformers (chỉ trả phần text đã ổn định) nhưng gom text lại thay vì print"""
+    def __init__(self, tokenizer):
+        super().__init__(tokenizer, skip_special_tokens=True)
+        self._pending: List[str] = []
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        self._pending.append(text)
+
+    def take(self) -> str:
+        text, self._pending = "".join(self._pending), []
+        return text
+
+class QwenLocalAdapter(LLMPort, AsyncLLMPort):
     def __init__(self, model_name: str = None):
         self.model_name = model_name or os.getenv("MODEL_NAME", "Qwen/Qwen3-0.6B")
         self._is_ready = False
         self.tokenizer = None
         self.model = None
+        self.scheduler = None
+        self.max_batch_size = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))
+        self.batch_wait_ms = float(os.getenv("LLM_BATCH_WAIT_MS", "10"))
+        # Hiệu chỉnh xác suất YES của grader: sigmoid((logit_yes - logit_no) / T + bias)
+        self.grader_temperature = float(os.getenv("GRADER_TEMPERATURE", "1.0"))
+        self.grader_bias = float(os.getenv("GRADER_BIAS", "0.0"))
+        self.yes_token_ids: List[int] = []
+        self.no_token_ids: List[int] = []
+        self.think_start_id: Optional[int] = None
+        self.think_end_id: Optional[int] = None
+        # LLM_INFERENCE_PROFILE: fp16 (mặc định, GPU) | cpu-bf16 | cpu-int8
+        self.inference_profile = os.getenv("LLM_INFERENCE_PROFILE", PROFILE_FP16).lower()
+        num_threads = os.getenv("LLM_NUM_THREADS")
+        interop_threads = os.getenv("LLM_NUM_INTEROP_THREADS")
+        self.num_threads = int(num_threads) if num_threads else None
+        self.interop_threads = int(interop_threads) if interop_threads else None
+        self.warmup_tokens = int(os.getenv("LLM_WARMUP_TOKENS", "16"))
+        self._threads: Optional[dict] = None
+        self._warmup_stats: Optional[dict] = None
+        # KV cache của các system prompt cố định (chỉ áp dụng cho lời gọi không bị gộp batch)
+        self.prefix_cache_enabled = os.getenv("LLM_PREFIX_CACHE_ENABLED", "true").lower() == "true"
+        self.prefix_cache_max = int(os.getenv("LLM_PREFIX_CACHE_MAX", "16"))
+        self.prefix_cache: Optional[PrefixKVCache] = None
+        self._prefix_lock = threading.Lock()
+        self._pending_prefixes: List[str] = []
+        # Draft model cho assisted decoding (cùng tokenizer, ví dụ Qwen3-0.6B cho Qwen3-8B); bỏ trống để tắt
+        self.draft_model_name = os.getenv("DRAFT_MODEL_NAME") or None
+        draft_tokens = os.getenv("DRAFT_NUM_TOKENS")
+        self.draft_num_tokens = int(draft_tokens) if draft_tokens else None
+        self.assisted: Optional[AssistedDecoding] = None
         
         # Tải trong background để không block API chính
         threading.Thread(target=self._load_model, daemon=True).start()
@@ -28,60 +83,334 @@ class QwenLocalAdapter(LLMPort):
                 self.model_name,
                 trust_remote_code=True 
             )
+            # Padding trái để các prompt trong cùng batch kết thúc thẳng hàng khi generate
+            self.tokenizer.padding_side = "left"
+            self.yes_token_ids = self._label_token_ids(["YES", "Yes", "yes"])
+            self.no_token_ids = self._label_token_ids(["NO", "No", "no"])
+            self.think_start_id = self._special_token_id("<think>")
+            self.think_end_id = self._special_token_id("</think>")
             
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                trust_remote_code=True
+            if is_cpu_profile(self.inference_profile):
+                self._threads = configure_cpu_threads(self.num_threads, self.interop_threads)
+            self.model = load_causal_lm(self.model_name, self.inference_profile)
+            if self.draft_model_name:
+                self._load_draft_model()
+            if self.prefix_cache_enabled:
+                self.prefix_cache = PrefixKVCache(self.model, max_prefixes=self.prefix_cache_max)
+                with self._prefix_lock:
+                    pending, self._pending_prefixes = self._pending_prefixes, []
+                for system_prompt in pending:
+                    self._register_prefix(system_prompt)
+            self.scheduler = GenerationScheduler(
+                self.model,
+                self.tokenizer,
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=self.batch_wait_ms,
+                logits_processor_factory=self._budget_processors,
+                prefix_cache=self.prefix_cache,
+                assisted=self.assisted
             )
+            # Chạy thử trước khi nhận request: lần generate đầu tiên chịu chi phí cấp phát/khởi tạo kernel
+            if self.warmup_tokens > 0:
+                self._warmup()
             self._is_ready = True
-            logger.info(f"Đã tải xong model {self.model_name}")
+            logger.info(f"Đã tải xong model {self.model_name} (profile={self.inference_profile})")
         except Exception as e:
             logger.error(f"Lỗi tải model Qwen: {e}")
 
+    def _load_draft_model(self):
+        try:
+            logger.info(f"Đang tải draft model {self.draft_model_name}...")
+            draft_model = load_causal_lm(self.draft_model_name, self.inference_profile)
+            if draft_model.config.vocab_size != self.model.config.vocab_size:
+                logger.warning(
+                    f"Draft model {self.draft_model_name} khác vocab với {self.model_name} "
+                    f"({draft_model.config.vocab_size} != {self.model.config.vocab_size}), tắt assisted decoding"
+                )
+                return
+            self.assisted = AssistedDecoding(self.model, draft_model, num_assistant_tokens=self.draft_num_tokens)
+        except Exception as e:
+            logger.error(f"Lỗi tải draft model, tắt assisted decoding: {e}")
+
+    def _warmup(self):
+        prompt = self._build_prompt("Bạn là trợ lý pháp luật Việt Nam.", "Xin chào", enable_thinking=False)
+        started = time.monotonic()
+        output_ids = self.scheduler.submit(prompt, max_new_tokens=self.warmup_tokens, do_sample=False).result()
+        elapsed = time.monotonic() - started
+        self._warmup_stats = {
+            "tokens": len(output_ids),
+            "seconds": round(elapsed, 3),
+            "tokens_per_second": round(len(output_ids) / elapsed, 2) if elapsed > 0 else 0.0
+        }
+        logger.info(f"Warm-up LLM: {self._warmup_stats}")
+
     @property
     def is_ready(self) -> bool:
         return self._is_ready
 
-    def generate_answer(self, system_prompt: str, user_prompt: str) -> str:
-        if not self._is_ready:
-            return "Hệ thống đang tải mô hình ngôn ngữ, vui lòng đợi trong giây lát..."
-        try:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+    def register_prefix(self, system_prompt: str) -> None:
+        if not self.prefix_cache_enabled:
+            return
+        with self._prefix_lock:
+            # Model chưa tải xong: để _load_model tính KV sau
+            if self.prefix_cache is None:
+                self._pending_prefixes.append(system_prompt)
+                return
+        self._register_prefix(system_prompt)
 
-            text = self.tokenizer.apply_chat_template(
-                messages,
+    def _register_prefix(self, system_prompt: str):
+        try:
+            # Chat template của riêng system message là đoạn đầu chung của mọi prompt dùng nó
+            prefix = self.tokenizer.apply_chat_template(
+                [{"role": "system", "content": system_prompt}],
                 tokenize=False,
-                add_generation_prompt=True,
-                enable_thinking=True 
+                add_generation_prompt=False
             )
-            
-            model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
-
-            with torch.no_grad():
-                generated_ids = self.model.generate(
-                    **model_inputs,
-                    max_new_tokens=32768, 
-                    temperature=0.6,
-                    top_p=0.95
-                )
+            self.prefix_cache.register(self.tokenizer.encode(prefix, add_special_tokens=False))
+        except Exception as e:
+            logger.warning(f"Không tạo được prefix cache cho system prompt: {e}")
 
-            output_ids = generated_ids[0][len(model_inputs.input_ids[0]):].tolist()
-            raw_content = self.tokenizer.decode(output_ids, skip_special_tokens=True)
-            
-            think_match = re.search(r'<think>(.*?)</think>', raw_content, re.DOTALL)
-            if think_match:
-                thinking_process = think_match.group(1).strip()
-                logger.info(f"Model Thinking: {thinking_process[:200]}...") 
-            
-            clean_content = re.sub(r'<think>.*?</think>', '', raw_content, flags=re.DOTALL).strip()
-            
-            return clean_content
+    def get_stats(self) -> dict:
+        stats = {
+            "model": self.model_name,
+            "profile": self.inference_profile,
+            "ready": self._is_ready,
+            "device": str(self.model.device) if self.model is not None else None,
+            "dtype": str(self.model.dtype) if self.model is not None else None,
+            "threads": self._threads,
+            "draft_model": self.draft_model_name if self.assisted is not None else None,
+            "warmup": self._warmup_stats
+        }
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.get_stats()
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.get_stats()
+        if self.assisted is not None:
+            stats["assisted_decoding"] = self.assisted.get_stats()
+        return stats
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return super().count_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def _label_token_ids(self, variants: List[str]) -> List[int]:
+        # Lấy token đầu tiên của mỗi biến thể (có/không có khoảng trắng phía trước)
+        ids = set()
+        for variant in variants:
+            for text in (variant, " " + variant):
+                token_ids = self.tokenizer.encode(text, add_special_tokens=False)
+                if token_ids:
+                    ids.add(token_ids[0])
+        return sorted(ids)
+
+    def _special_token_id(self, token: str) -> Optional[int]:
+        token_id = self.tokenizer.convert_tokens_to_ids(token)
+        if token_id is None or token_id == self.tokenizer.unk_token_id:
+            return None
+        return token_id
+
+    def _gen_kwargs(self, profile: GenerationProfile) -> dict:
+        max_new_tokens = profile.max_new_tokens
+        thinking_bounded = not profile.enable_thinking or profile.thinking_budget is not None
+        if profile.answer_max_tokens is not None and thinking_bounded:
+            # +1 cho token </think> bị ép sinh và +1 cho EOS
+            thinking = profile.thinking_budget + 1 if profile.enable_thinking else 0
+            max_new_tokens = min(max_new_tokens, thinking + profile.answer_max_tokens + 1)
+
+        kwargs = {
+            "max_new_tokens": max_new_tokens,
+            "do_sample": profile.do_sample,
+            "thinking_budget": profile.thinking_budget if profile.enable_thinking else None,
+            "answer_budget": profile.answer_max_tokens
+        }
+        if profile.do_sample:
+            kwargs["temperature"] = profile.temperature
+            kwargs["top_p"] = profile.top_p
+        return kwargs
+
+    def _budget_processors(self, prompt_len: int, thinking_budget: Optional[int], answer_budget: Optional[int]):
+        if thinking_budget is None and answer_budget is None:
+            return None
+        if self.think_start_id is None or self.think_end_id is None:
+            return None
+        return LogitsProcessorList([
+            ThinkingBudgetProcessor(
+                prompt_len=prompt_len,
+                think_start_id=self.think_start_id,
+                think_end_id=self.think_end_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                thinking_budget=thinking_budget,
+                answer_budget=answer_budget
+            )
+        ])
+
+    def _count_tokens(self, output_ids: List[int]):
+        if self.think_start_id is None or self.think_end_id is None:
+            return 0, len(output_ids)
+        ignore_ids = {self.tokenizer.pad_token_id, self.tokenizer.eos_token_id}
+        return count_generation_tokens(output_ids, self.think_start_id, self.think_end_id, ignore_ids)
+
+    def _build_prompt(self, system_prompt: str, user_prompt: str, enable_thinking: bool = True) -> str:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        return self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True,
+            enable_thinking=enable_thinking
+        )
+
+    def generate(self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None) -> GenerationResult:
+        if not self._is_ready:
+            return GenerationResult(text="Hệ thống đang tải mô hình ngôn ngữ, vui lòng đợi trong giây lát...")
+        profile = profile or ANSWER_PROFILE
+        try:
+            prompt = self._build_prompt(system_prompt, user_prompt, profile.enable_thinking)
+
+            # Scheduler gom các lời gọi đồng thời thành một batch generate
+            future = self.scheduler.submit(prompt, **self._gen_kwargs(profile))
+            return self._to_result(future.result())
 
         except Exception as e:
             logger.error(f"Qwen 3 Error: {e}")
-            return "Xin lỗi, hệ thống đang gặp sự cố xử lý."
\ No newline at end of file
+            return GenerationResult(text="Xin lỗi, hệ thống đang gặp sự cố xử lý.")
+
+    async def agenerate(
+        self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None, priority: int = 0
+    ) -> GenerationResult:
+        if not self._is_ready:
+            return GenerationResult(text="Hệ thống đang tải mô hình ngôn ngữ, vui lòng đợi trong giây lát...")
+        profile = profile or ANSWER_PROFILE
+        try:
+            prompt = self._build_prompt(system_prompt, user_prompt, profile.enable_thinking)
+            output_ids = await self._await_scheduler(
+                lambda stop_event: self.scheduler.submit(
+                    prompt, stop_event=stop_event, priority=priority, **self._gen_kwargs(profile)
+                )
+            )
+            return self._to_result(output_ids)
+
+        except Exception as e:
+            logger.error(f"Qwen 3 Error: {e}")
+            return GenerationResult(text="Xin lỗi, hệ thống đang gặp sự cố xử lý.")
+
+    async def _await_scheduler(self, submit):
+        """Chờ future của scheduler mà không chiếm thread; task bị huỷ thì huỷ luôn request trong scheduler"""
+        stop_event = threading.Event()
+        future = submit(stop_event)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Còn trong hàng đợi: bị loại khỏi batch; đang sinh: StoppingCriteria dừng ở token kế tiếp
+            stop_event.set()
+            future.cancel()
+            raise
+
+    def _to_result(self, output_ids: List[int]) -> GenerationResult:
+        thinking_tokens, answer_tokens = self._count_tokens(output_ids)
+        raw_content = self.tokenizer.decode(output_ids, skip_special_tokens=True)
+
+        think_match = re.search(r'<think>(.*?)</think>', raw_content, re.DOTALL)
+        if think_match:
+            thinking_process = think_match.group(1).strip()
+            logger.info(f"Model Thinking: {thinking_process[:200]}...")
+
+        clean_content = re.sub(r'<think>.*?</think>', '', raw_content, flags=re.DOTALL)
+        # Khối <think> chưa đóng (chạm max_new_tokens) cũng không được lộ ra câu trả lời
+        clean_content = re.sub(r'<think>.*', '', clean_content, flags=re.DOTALL).strip()
+        logger.info(f"Token usage: thinking={thinking_tokens} | answer={answer_tokens}")
+
+        return GenerationResult(text=clean_content, thinking_tokens=thinking_tokens, answer_tokens=answer_tokens)
+
+    def stream_answer(self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None) -> Iterator[str]:
+        if not self._is_ready:
+            yield "Hệ thống đang tải mô hình ngôn ngữ, vui lòng đợi trong giây lát..."
+            return
+
+        profile = profile or ANSWER_PROFILE
+        stop_event = threading.Event()
+        token_queue: queue.Queue = queue.Queue()
+        think_filter = ThinkTagFilter()
+        text = _TextCollector(self.tokenizer)
+        future = None
+        try:
+            prompt = self._build_prompt(system_prompt, user_prompt, profile.enable_thinking)
+            # Stream đi qua scheduler như generate: được gộp batch với các request khác, token của
+            # dòng này được đẩy vào token_queue sau mỗi bước decode
+            future = self.scheduler.submit(
+                prompt, stop_event=stop_event, on_tokens=token_queue.put, **self._gen_kwargs(profile)
+            )
+            future.add_done_callback(lambda _: token_queue.put(None))
+
+            while True:
+                token_ids = token_queue.get()
+                if token_ids is None:
+                    break
+                text.put(torch.tensor(token_ids))
+                visible = think_filter.feed(text.take())
+                if visible:
+                    yield visible
+            # Batch lỗi: raise lỗi của scheduler
+            future.result()
+
+            text.end()
+            tail = think_filter.feed(text.take()) + think_filter.flush()
+            if tail:
+                yield tail
+
+            if think_filter.thinking:
+                logger.info(f"Model Thinking: {think_filter.thinking.strip()[:200]}...")
+
+        except Exception as e:
+            # Raise thay vì yield thông báo lỗi: caller cần biết stream hỏng để không cache nó
+            logger.error(f"Qwen 3 Stream Error: {e}")
+            raise
+        finally:
+            # Client ngắt kết nối: bỏ request nếu chưa chạy, dừng dòng của nó nếu đang sinh
+            stop_event.set()
+            if future is not None:
+                future.cancel()
+
+    def first_token_logprobs(self, system_prompt: str, user_prompt: str, top_k: int = 20) -> List[tuple]:
+        """Top-k (token, logprob) của token đầu tiên (thinking tắt) - dùng cho logprobs của worker"""
+        prompt = self._build_prompt(system_prompt, user_prompt, enable_thinking=False)
+        logits = self.scheduler.submit_classify(prompt).result()
+        logprobs = torch.log_softmax(logits.float(), dim=-1)
+        values, indices = torch.topk(logprobs, top_k)
+        return [(self.tokenizer.decode([i]), v) for i, v in zip(indices.tolist(), values.tolist())]
+
+    def classify_yes_no(self, system_prompt: str, user_prompt: str) -> float:
+        if not self._is_ready:
+            return 0.0
+        try:
+            # Tắt thinking để token tiếp theo chính là câu trả lời YES/NO
+            prompt = self._build_prompt(system_prompt, user_prompt, enable_thinking=False)
+            return self._yes_probability(self.scheduler.submit_classify(prompt).result())
+
+        except Exception as e:
+            logger.error(f"Qwen 3 Classify Error: {e}")
+            return 0.0
+
+    async def aclassify_yes_no(self, system_prompt: str, user_prompt: str, priority: int = 0) -> float:
+        if not self._is_ready:
+            return 0.0
+        try:
+            prompt = self._build_prompt(system_prompt, user_prompt, enable_thinking=False)
+            logits = await self._await_scheduler(
+                lambda stop_event: self.scheduler.submit_classify(prompt, stop_event=stop_event, priority=priority)
+            )
+            return self._yes_probability(logits)
+
+        except Exception as e:
+            logger.error(f"Qwen 3 Classify Error: {e}")
+            return 0.0
+
+    def _yes_probability(self, logits) -> float:
+        yes_logit = torch.logsumexp(logits[self.yes_token_ids], dim=0).item()
+        no_logit = torch.logsumexp(logits[self.no_token_ids], dim=0).item()
+        margin = (yes_logit - no_logit) / self.grader_temperature + self.grader_bias
+        return 1.0 / (1.0 + math.exp(-margin))
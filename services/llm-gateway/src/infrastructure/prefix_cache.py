@@ -0,0 +1,85 @@
+# src/infrastructure/prefix_cache.py
+import copy
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixKVCache:
+    """
+    Giữ sẵn past_key_values cho các đoạn đầu prompt cố định (system prompt sau chat template).
+    Prompt có token id bắt đầu bằng một prefix đã đăng ký sẽ chỉ phải prefill phần còn lại.
+    So khớp theo token id (không theo chuỗi) nên ranh giới tokenizer luôn đúng.
+    Chỉ dùng cho batch 1 phần tử: với batch có padding trái, vị trí của prefix lệch theo từng dòng.
+    """
+
+    def __init__(self, model, max_prefixes: int = 16):
+        self.model = model
+        self.max_prefixes = max_prefixes
+        self._lock = threading.Lock()
+        self._prefixes: List[Tuple[Tuple[int, ...], object]] = []
+
+        self._hits = 0
+        self._misses = 0
+        self._tokens_saved = 0
+        self._prompt_tokens = 0
+
+    def register(self, token_ids: List[int]) -> bool:
+        key = tuple(token_ids)
+        if not key:
+            return False
+        with self._lock:
+            if any(prefix == key for prefix, _ in self._prefixes):
+                return True
+            if len(self._prefixes) >= self.max_prefixes:
+                logger.warning(f"Prefix cache đã đủ {self.max_prefixes} prefix, bỏ qua prefix mới")
+                return False
+
+        input_ids = torch.tensor([key], device=self.model.device)
+        with torch.no_grad():
+            past_key_values = self.model(input_ids=input_ids, use_cache=True).past_key_values
+
+        with self._lock:
+            self._prefixes.append((key, past_key_values))
+            # Prefix dài nhất được thử trước
+            self._prefixes.sort(key=lambda p: len(p[0]), reverse=True)
+        logger.info(f"Prefix cache: đăng ký prefix {len(key)} token")
+        return True
+
+    def match(self, input_ids: List[int]) -> Tuple[int, Optional[object]]:
+        """Trả về (số token dùng lại, bản sao past_key_values) hoặc (0, None)"""
+        with self._lock:
+            hit = next(
+                (
+                    (prefix, cache) for prefix, cache in self._prefixes
+                    # Phải còn ít nhất một token để model tính logit của vị trí cuối
+                    if len(prefix) < len(input_ids) and tuple(input_ids[:len(prefix)]) == prefix
+                ),
+                None
+            )
+            self._prompt_tokens += len(input_ids)
+            if hit is None:
+                self._misses += 1
+                return 0, None
+            self._hits += 1
+            self._tokens_saved += len(hit[0])
+
+        # generate ghi thêm token vào cache -> mỗi request dùng một bản sao
+        return len(hit[0]), copy.deepcopy(hit[1])
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "prefixes": len(self._prefixes),
+                "hits": self._hits,
+                "misses": self._misses,
+                "prefill_tokens_saved": self._tokens_saved,
+                "avg_tokens_saved": round(self._tokens_saved / self._hits, 1) if self._hits else 0.0,
+                "saved_ratio": round(self._tokens_saved / self._prompt_tokens, 4) if self._prompt_tokens else 0.0,
+                "lookups": lookups
+            }
@@ -0,0 +1,212 @@
+# src/infrastructure/remote_llm_adapter.py
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from typing import Iterator, List, Optional
+
+import httpx
+
+from src.domain.models import ANSWER_PROFILE, GenerationProfile, GenerationResult
+from src.domain.ports import LLMPort
+from src.infrastructure.think_filter import ThinkTagFilter
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAICompatibleLLMAdapter(LLMPort):
+    """
+    LLMPort gọi tới một server sinh văn bản tương thích OpenAI (/v1/chat/completions),
+    ví dụ src/worker/main.py hoặc vLLM. Model nằm ở tiến trình khác nên gateway có thể
+    chạy nhiều worker uvicorn mà không nhân bản bộ nhớ model.
+    - enable_thinking đi qua chat_template_kwargs (quy ước của vLLM cho Qwen3).
+    - thinking_budget/answer_max_tokens là trường mở rộng, server không hỗ trợ sẽ bỏ qua.
+    - Grader dùng logprobs của token đầu tiên (max_tokens=1) thay cho logit cục bộ.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_connections: int = 64,
+        timeout: float = 300
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model_name = model_name or os.getenv("MODEL_NAME", "Qwen/Qwen3-0.6B")
+        self.grader_temperature = float(os.getenv("GRADER_TEMPERATURE", "1.0"))
+        self.grader_bias = float(os.getenv("GRADER_BIAS", "0.0"))
+        self.grader_top_logprobs = int(os.getenv("GRADER_TOP_LOGPROBS", "20"))
+
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        # Các lời gọi LLMPort đồng bộ chạy trong llm_executor -> dùng chung một client có pool
+        self.client = httpx.Client(
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=5),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+        # is_ready được đọc trên event loop nên trạng thái server do một thread nền cập nhật
+        self._ready = False
+        self.health_interval = float(os.getenv("LLM_BACKEND_HEALTH_INTERVAL_S", "5"))
+        threading.Thread(target=self._poll_health, daemon=True).start()
+
+        # Chỉ tải tokenizer (không tải trọng số) để đếm token cho ContextPacker
+        self.tokenizer = None
+        threading.Thread(target=self._load_tokenizer, daemon=True).start()
+
+    def _load_tokenizer(self):
+        try:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
+        except Exception as e:
+            logger.warning(f"Không tải được tokenizer {self.model_name}, dùng ước lượng token: {e}")
+
+    def _poll_health(self):
+        while True:
+            try:
+                res = self.client.get(f"{self._server_root()}/health", timeout=2)
+                ready = res.status_code == 200 and res.json().get("status", "ready") == "ready"
+            except Exception:
+                ready = False
+            if ready != self._ready:
+                logger.info(f"LLM backend {self.base_url}: {'ready' if ready else 'not ready'}")
+            self._ready = ready
+            time.sleep(self.health_interval)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def get_stats(self) -> dict:
+        return {"model": self.model_name, "backend": self.base_url, "ready": self._ready}
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return super().count_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def generate(self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None) -> GenerationResult:
+        profile = profile or ANSWER_PROFILE
+        try:
+            res = self.client.post(
+                f"{self.base_url}/chat/completions",
+                json=self._payload(system_prompt, user_prompt, profile)
+            )
+            res.raise_for_status()
+            data = res.json()
+
+            raw_content = data["choices"][0]["message"].get("content") or ""
+            clean_content = re.sub(r'<think>.*?</think>', '', raw_content, flags=re.DOTALL)
+            clean_content = re.sub(r'<think>.*', '', clean_content, flags=re.DOTALL).strip()
+
+            usage = data.get("usage") or {}
+            completion_tokens = usage.get("completion_tokens", 0)
+            thinking_tokens = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens", 0)
+            answer_tokens = max(completion_tokens - thinking_tokens, 0)
+            logger.info(f"Token usage: thinking={thinking_tokens} | answer={answer_tokens}")
+
+            return GenerationResult(text=clean_content, thinking_tokens=thinking_tokens, answer_tokens=answer_tokens)
+
+        except Exception as e:
+            logger.error(f"Remote LLM Error: {e}")
+            return GenerationResult(text="Xin lỗi, hệ thống đang gặp sự cố xử lý.")
+
+    def stream_answer(self, system_prompt: str, user_prompt: str, profile: Optional[GenerationProfile] = None) -> Iterator[str]:
+        profile = profile or ANSWER_PROFILE
+        think_filter = ThinkTagFilter()
+        payload = self._payload(system_prompt, user_prompt, profile)
+        payload["stream"] = True
+        try:
+            # Đóng generator -> thoát khỏi with -> đóng kết nối, server tự dừng generate
+            finished = False
+            with self.client.stream("POST", f"{self.base_url}/chat/completions", json=payload) as res:
+                res.raise_for_status()
+                for line in res.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        finished = True
+                        break
+                    event = json.loads(data)
+                    if "error" in event:
+                        raise RuntimeError(f"Generation worker error: {event['error'].get('message')}")
+                    choices = event.get("choices") or []
+                    if not choices:
+                        continue
+                    visible = think_filter.feed(choices[0].get("delta", {}).get("content") or "")
+                    if visible:
+                        yield visible
+
+            if not finished:
+                # Worker đứt kết nối giữa chừng: câu trả lời chưa trọn
+                raise RuntimeError("Generation stream ended before [DONE]")
+
+            tail = think_filter.flush()
+            if tail:
+                yield tail
+
+        except Exception as e:
+            # Raise thay vì yield thông báo lỗi: caller cần biết stream hỏng để không cache nó
+            logger.error(f"Remote LLM Stream Error: {e}")
+            raise
+
+    def classify_yes_no(self, system_prompt: str, user_prompt: str) -> float:
+        profile = GenerationProfile(enable_thinking=False, max_new_tokens=1, do_sample=False)
+        payload = self._payload(system_prompt, user_prompt, profile)
+        payload["logprobs"] = True
+        payload["top_logprobs"] = self.grader_top_logprobs
+        try:
+            res = self.client.post(f"{self.base_url}/chat/completions", json=payload)
+            res.raise_for_status()
+            content = res.json()["choices"][0]["logprobs"]["content"]
+            top = content[0]["top_logprobs"] if content else []
+            return self._yes_probability(top)
+
+        except Exception as e:
+            logger.error(f"Remote LLM Classify Error: {e}")
+            return 0.0
+
+    def _yes_probability(self, top_logprobs: List[dict]) -> float:
+        yes = [t["logprob"] for t in top_logprobs if t["token"].strip().upper() == "YES"]
+        no = [t["logprob"] for t in top_logprobs if t["token"].strip().upper() == "NO"]
+        if not yes and not no:
+            return 0.0
+        # Nhãn không có trong top-k thì logprob của nó không lớn hơn phần tử nhỏ nhất của top-k
+        floor = min(t["logprob"] for t in top_logprobs)
+        yes_logit = self._logsumexp(yes) if yes else floor
+        no_logit = self._logsumexp(no) if no else floor
+        margin = (yes_logit - no_logit) / self.grader_temperature + self.grader_bias
+        return 1.0 / (1.0 + math.exp(-margin))
+
+    @staticmethod
+    def _logsumexp(values: List[float]) -> float:
+        peak = max(values)
+        return peak + math.log(sum(math.exp(v - peak) for v in values))
+
+    def _payload(self, system_prompt: str, user_prompt: str, profile: GenerationProfile) -> dict:
+        payload = {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": profile.max_new_tokens,
+            "chat_template_kwargs": {"enable_thinking": profile.enable_thinking},
+            "thinking_budget": profile.thinking_budget if profile.enable_thinking else None,
+            "answer_max_tokens": profile.answer_max_tokens
+        }
+        if profile.do_sample:
+            payload["temperature"] = profile.temperature
+            payload["top_p"] = profile.top_p
+        else:
+            payload["temperature"] = 0.0
+        return payload
+
+    def _server_root(self) -> str:
+        # /health nằm ở gốc server, không nằm dưới /v1
+        return re.sub(r"/v1$", "", self.base_url)
@@ -0,0 +1,29 @@
+import httpx
+import logging
+from typing import List
+from src.domain.ports import RerankPort
+
+logger = logging.getLogger(__name__)
+
+class HttpRerankAdapter(RerankPort):
+    def __init__(self, api_url: str, max_connections: int = 50, timeout: float = 30):
+        self.api_url = api_url
+        self.async_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def arerank(self, query: str, passages: List[str]) -> List[float]:
+        if not passages:
+            return []
+        res = await self.async_client.post(self.api_url, json={"query": query, "passages": passages})
+        res.raise_for_status()
+
+        # API trả về kết quả đã sắp xếp -> đưa về đúng thứ tự đầu vào
+        scores = [0.0] * len(passages)
+        for item in res.json()["results"]:
+            scores[item["index"]] = float(item["score"])
+        return scores
+
+    async def aclose(self):
+        await self.async_client.aclose()
@@ -0,0 +1,66 @@
+# src/infrastructure/think_filter.py
+
+
+class ThinkTagFilter:
+    """
+    Lọc khối <think>...</think> khỏi luồng text sinh ra theo từng đoạn.
+    Thẻ có thể bị cắt ngang giữa hai đoạn nên phần đuôi có khả năng là
+    đầu của thẻ sẽ được giữ lại trong buffer cho tới đoạn tiếp theo.
+    """
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+        self._started = False
+        self.thinking = ""
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        visible = []
+
+        while self._buffer:
+            tag = self.CLOSE_TAG if self._in_think else self.OPEN_TAG
+            idx = self._buffer.find(tag)
+
+            if idx == -1:
+                keep = self._partial_tag_len(self._buffer, tag)
+                head = self._buffer[:len(self._buffer) - keep]
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                if self._in_think:
+                    self.thinking += head
+                else:
+                    visible.append(head)
+                break
+
+            if self._in_think:
+                self.thinking += self._buffer[:idx]
+            else:
+                visible.append(self._buffer[:idx])
+            self._buffer = self._buffer[idx + len(tag):]
+            self._in_think = not self._in_think
+
+        return self._emit("".join(visible))
+
+    def flush(self) -> str:
+        rest, self._buffer = self._buffer, ""
+        if self._in_think:
+            self.thinking += rest
+            return ""
+        return self._emit(rest)
+
+    def _emit(self, text: str) -> str:
+        # Bỏ khoảng trắng đầu câu trả lời (thường là "\n\n" ngay sau </think>)
+        if not self._started:
+            text = text.lstrip()
+            if text:
+                self._started = True
+        return text
+
+    @staticmethod
+    def _partial_tag_len(text: str, tag: str) -> int:
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:size]):
+                return size
+        return 0
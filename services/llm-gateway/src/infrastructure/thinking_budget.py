@@ -0,0 +1,77 @@
+# src/infrastructure/thinking_budget.py
+from typing import Iterable, Optional, Tuple
+
+import torch
+from transformers import LogitsProcessor
+
+
+class ThinkingBudgetProcessor(LogitsProcessor):
+    """
+    Giới hạn số token suy luận và số token câu trả lời cho từng dòng trong batch.
+    - Đang trong <think> mà đã dùng hết thinking_budget -> ép sinh </think>.
+    - Phần trả lời (sau </think>, hoặc toàn bộ nếu không có thinking) đạt
+      answer_budget -> ép sinh EOS.
+    Trạng thái được suy ra hoàn toàn từ input_ids nên dùng được cho cả batch
+    có padding lẫn assisted decoding.
+    """
+
+    def __init__(
+        self,
+        prompt_len: int,
+        think_start_id: int,
+        think_end_id: int,
+        eos_token_id: int,
+        thinking_budget: Optional[int] = None,
+        answer_budget: Optional[int] = None
+    ):
+        self.prompt_len = prompt_len
+        self.think_start_id = think_start_id
+        self.think_end_id = think_end_id
+        self.eos_token_id = eos_token_id
+        self.thinking_budget = thinking_budget
+        self.answer_budget = answer_budget
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        generated = input_ids[:, self.prompt_len:]
+        gen_len = generated.shape[1]
+
+        for row in range(generated.shape[0]):
+            tokens = generated[row]
+            open_pos = (tokens == self.think_start_id).nonzero()
+            close_pos = (tokens == self.think_end_id).nonzero()
+
+            if len(open_pos) and not len(close_pos):
+                if self.thinking_budget is not None and gen_len - open_pos[0].item() >= self.thinking_budget:
+                    self._force(scores, row, self.think_end_id)
+                continue
+
+            if self.answer_budget is None:
+                continue
+            answer_start = close_pos[0].item() + 1 if len(close_pos) else 0
+            if gen_len - answer_start >= self.answer_budget:
+                self._force(scores, row, self.eos_token_id)
+
+        return scores
+
+    @staticmethod
+    def _force(scores: torch.FloatTensor, row: int, token_id: int):
+        scores[row, :] = -float("inf")
+        scores[row, token_id] = 0.0
+
+
+def count_generation_tokens(
+    output_ids: Iterable[int],
+    think_start_id: int,
+    think_end_id: int,
+    ignore_ids: Iterable[int] = ()
+) -> Tuple[int, int]:
+    """Đếm (số token thinking, số token câu trả lời) trong chuỗi token sinh ra."""
+    ignore = set(ignore_ids)
+    tokens = [t for t in output_ids if t not in ignore]
+
+    if think_end_id in tokens:
+        split = tokens.index(think_end_id) + 1
+        return split, len(tokens) - split
+    if think_start_id in tokens:
+        return len(tokens), 0
+    return 0, len(tokens)
@@ -1,18 +1,112 @@
 import weaviate
+import httpx
 import logging
-from typing import List, Optional, Dict, Any
-from src.domain.ports import VectorDBPort
+from typing import Iterator, List, Optional, Dict, Any
+from src.domain.ports import AsyncVectorDBPort, VectorDBPort
 from src.domain.models import RetrievedDocument
 
 logger = logging.getLogger(__name__)
 
-class WeaviateAdapter(VectorDBPort):
-    def __init__(self, url: str, class_name: str = "LegalDocument"):
+class WeaviateAdapter(VectorDBPort, AsyncVectorDBPort):
+    def __init__(self, url: str, class_name: str = "LegalDocument", max_connections: int = 100):
         self.url = url
         self.class_name = class_name
         logger.info(f"Connecting to Weaviate at: {self.url}")
         self.client = weaviate.Client(url)
 
+        # Đường bất đồng bộ: gửi thẳng GraphQL do query builder của client v3 dựng ra
+        self.graphql_url = f"{url.rstrip('/')}/v1/graphql"
+        self.async_client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    def _build_query(
+        self,
+        query_text: str,
+        vector: List[float],
+        limit: int,
+        alpha: float,
+        properties: Optional[List[str]],
+        where_filter: Optional[Dict[str, Any]]
+    ):
+        if properties is None:
+            properties = ["text", "source", "article^3", "chapter"] 
+
+        logger.info(f"Querying Weaviate: '{query_text}' (Alpha={alpha}) | Filter: {where_filter is not None}")
+        
+        query_obj = (
+            self.client.query
+            .get(self.class_name, ["text", "source", "article", "chapter"])
+            .with_hybrid(
+                query=query_text,
+                vector=vector,
+                alpha=alpha,            
+                properties=properties,
+            )
+        )
+
+        if where_filter:
+            query_obj = query_obj.with_where(where_filter)
+
+        return (
+            query_obj
+            .with_additional(["score", "id"])
+            .with_limit(limit)
+        )
+
+    def _build_multi_query(self, queries: List[Dict[str, Any]]):
+        """Gộp nhiều truy vấn thành một GraphQL request, mỗi truy vấn con có alias q0, q1..."""
+        builders = []
+        for i, q in enumerate(queries):
+            builder = self._build_query(
+                q["query_text"],
+                q["vector"],
+                q.get("limit", 10),
+                q.get("alpha", 0.5),
+                q.get("properties"),
+                q.get("where_filter")
+            )
+            builders.append(builder.with_alias(f"q{i}"))
+        return self.client.query.multi_get(builders)
+
+    def _parse_multi_results(self, response: dict, count: int) -> List[List[RetrievedDocument]]:
+        return [self._parse_results(response, key=f"q{i}") for i in range(count)]
+
+    def _parse_results(self, response: dict, key: Optional[str] = None, verbose: bool = True) -> List[RetrievedDocument]:
+        raw_data = (response.get('data') or {}).get('Get', {}).get(key or self.class_name, []) or []
+        
+        if verbose:
+            logger.info(f"Found {len(raw_data)} raw results.")
+        results = []
+        for i, item in enumerate(raw_data):
+            raw_score = item.get('_additional', {}).get('score', 0)
+            try:
+                score_val = float(raw_score)
+            except (ValueError, TypeError):
+                score_val = 0.0
+            
+            art = item.get('article', 'N/A')
+            if verbose:
+                logger.info(f"[{i}] Score: {score_val:.4f} | Article: {art} | Source: {item.get('source')}")
+
+            chap = item.get('chapter') or ""
+            art = item.get('article') or ""
+            txt = item.get('text') or ""
+
+            full_content = f"Chương: {chap}\nĐiều: {art}\nNội dung: {txt}"
+            
+            results.append(RetrievedDocument(
+                id=item.get('_additional', {}).get('id'),
+                title=item.get("source", "Tài liệu pháp luật"), 
+                content=full_content,
+                article=art,
+                chapter=chap,
+                score=score_val
+            ))
+        
+        return results
+
     def search(
         self, 
         query_text: str, 
@@ -25,62 +119,117 @@ class WeaviateAdapter(VectorDBPort):
         if not vector:
             logger.warning("Vector rỗng, bỏ qua search.")
             return []
-        
-        if properties is None:
-            properties = ["text", "source", "article^3", "chapter"] 
 
         try:
-            logger.info(f"Querying Weaviate: '{query_text}' (Alpha={alpha}) | Filter: {where_filter is not None}")
-            
+            response = self._build_query(query_text, vector, limit, alpha, properties, where_filter).do()
+            return self._parse_results(response)
+
+        except Exception as e:
+            logger.error(f"Weaviate Error: {e}")
+            return []
+
+    def iter_documents(self, page_size: int = 500) -> Iterator[List[RetrievedDocument]]:
+        """Duyệt toàn bộ class bằng cursor (after=<uuid>), không bị giới hạn QUERY_MAXIMUM_RESULTS như offset"""
+        after = None
+        while True:
             query_obj = (
                 self.client.query
                 .get(self.class_name, ["text", "source", "article", "chapter"])
-                .with_hybrid(
-                    query=query_text,
-                    vector=vector,
-                    alpha=alpha,            
-                    properties=properties,
-                )
+                .with_additional(["id"])
+                .with_limit(page_size)
             )
+            if after:
+                query_obj = query_obj.with_after(after)
+            page = self._parse_results(query_obj.do(), verbose=False)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = page[-1].id
 
-            if where_filter:
-                query_obj = query_obj.with_where(where_filter)
-
+    def fetch_by_source(self, source: str, page_size: int = 500) -> List[RetrievedDocument]:
+        """Lấy mọi chunk của một source (cursor không hỗ trợ where nên dùng offset)"""
+        docs = []
+        offset = 0
+        while True:
             response = (
-                query_obj
-                .with_additional(["score"])
-                .with_limit(limit)
+                self.client.query
+                .get(self.class_name, ["text", "source", "article", "chapter"])
+                .with_where({"path": ["source"], "operator": "Equal", "valueText": source})
+                .with_additional(["id"])
+                .with_limit(page_size)
+                .with_offset(offset)
                 .do()
             )
-            
-            raw_data = response.get('data', {}).get('Get', {}).get(self.class_name, [])
-            
-            logger.info(f"Found {len(raw_data)} raw results.")
-            for i, item in enumerate(raw_data):
-                raw_score = item.get('_additional', {}).get('score', 0)
-                try:
-                    score_val = float(raw_score)
-                except (ValueError, TypeError):
-                    score_val = 0.0
-                
-                art = item.get('article', 'N/A')
-                logger.info(f"[{i}] Score: {score_val:.4f} | Article: {art} | Source: {item.get('source')}")
+            page = self._parse_results(response, verbose=False)
+            docs.extend(page)
+            if len(page) < page_size:
+                break
+            offset += page_size
+        # Equal trên field text so khớp theo token -> lọc lại cho đúng tên file
+        return [d for d in docs if d.title == source]
 
-            results = []
-            for item in raw_data:
-                chap = item.get('chapter') or ""
-                art = item.get('article') or ""
-                txt = item.get('text') or ""
-
-                full_content = f"Chương: {chap}\nĐiều: {art}\nNội dung: {txt}"
-                
-                results.append(RetrievedDocument(
-                    title=item.get("source", "Tài liệu pháp luật"), 
-                    content=full_content 
-                ))
-            
-            return results
+    async def asearch(
+        self, 
+        query_text: str, 
+        vector: List[float], 
+        limit: int = 10,
+        alpha: float = 0.5, 
+        properties: Optional[List[str]] = None, 
+        where_filter: Optional[Dict[str, Any]] = None
+    ):
+        if not vector:
+            logger.warning("Vector rỗng, bỏ qua search.")
+            return []
+
+        try:
+            gql = self._build_query(query_text, vector, limit, alpha, properties, where_filter).build()
+            res = await self.async_client.post(self.graphql_url, json={"query": gql})
+            res.raise_for_status()
+            response = res.json()
+            if response.get("errors"):
+                logger.error(f"Weaviate GraphQL Error: {response['errors']}")
+            return self._parse_results(response)
 
         except Exception as e:
             logger.error(f"Weaviate Error: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def search_many(self, queries: List[Dict[str, Any]]) -> List[List[RetrievedDocument]]:
+        if not queries:
+            return []
+        if not all(q.get("vector") for q in queries):
+            logger.warning("Vector rỗng, bỏ qua search.")
+            return [[] for _ in queries]
+
+        try:
+            response = self._build_multi_query(queries).do()
+            return self._parse_multi_results(response, len(queries))
+
+        except Exception as e:
+            logger.error(f"Weaviate Error: {e}")
+            return [[] for _ in queries]
+
+    async def asearch_many(self, queries: List[Dict[str, Any]]) -> List[List[RetrievedDocument]]:
+        if not queries:
+            return []
+        if not all(q.get("vector") for q in queries):
+            logger.warning("Vector rỗng, bỏ qua search.")
+            return [[] for _ in queries]
+
+        try:
+            gql = self._build_multi_query(queries).build()
+            res = await self.async_client.post(self.graphql_url, json={"query": gql})
+            res.raise_for_status()
+            response = res.json()
+            if response.get("errors"):
+                logger.error(f"Weaviate GraphQL Error: {response['errors']}")
+            return self._parse_multi_results(response, len(queries))
+
+        except Exception as e:
+            logger.error(f"Weaviate Error: {e}")
+            return [[] for _ in queries]
+
+    async def aclose(self):
+        await self.async_client.aclose()
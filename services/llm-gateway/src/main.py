@@ -8,9 +8,17 @@ from dotenv import load_dotenv
 from src.infrastructure.embedding_adapter import HttpEmbeddingAdapter
 from src.infrastructure.vector_db_adapter import WeaviateAdapter
 from src.infrastructure.llm_adapter import QwenLocalAdapter
+from src.infrastructure.remote_llm_adapter import OpenAICompatibleLLMAdapter
+from src.infrastructure.rerank_adapter import HttpRerankAdapter
 
+from src.application.admission import AdmissionController
+from src.application.answer_cache import SemanticAnswerCache
+from src.application.article_index import ArticleIndex
 from src.application.chat_service import ChatService
-from src.presentation.router import router, set_chat_service
+from src.application.result_fusion import ResultFusion
+from src.application.retrieval_gate import RetrievalGate
+from src.application.single_flight import SingleFlight
+from src.presentation.router import router, set_admission_controller, set_chat_service
 
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 load_dotenv()
@@ -19,23 +27,93 @@ app = FastAPI(title="Vietnamese Law LLM Gateway")
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://weaviate:8080")
 EMBEDDING_API_URL = os.getenv("EMBEDDING_API_URL", "http://embedding-api:5000/embed")
 
-embedder_adapter = HttpEmbeddingAdapter(api_url=EMBEDDING_API_URL)
+embedder_adapter = HttpEmbeddingAdapter(
+    api_url=EMBEDDING_API_URL,
+    model_name=os.getenv("EMBEDDING_MODEL_NAME", "huyydangg/DEk21_hcmute_embedding"),
+    cache_max_bytes=int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "32")) * 1024 * 1024),
+    batch_window_ms=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")),
+    max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32")),
+    transport=os.getenv("EMBEDDING_TRANSPORT", "binary").lower(),
+    transport_dtype=os.getenv("EMBEDDING_TRANSPORT_DTYPE", "float32").lower()
+)
 weaviate_adapter = WeaviateAdapter(url=WEAVIATE_URL, class_name="LegalDocument")
-llm_adapter = QwenLocalAdapter()
+# LLM_BACKEND=remote: model chạy ở generation worker riêng (src/worker/main.py hoặc vLLM),
+# gateway chỉ giữ HTTP client nên có thể chạy nhiều worker uvicorn
+if os.getenv("LLM_BACKEND", "local").lower() == "remote":
+    llm_adapter = OpenAICompatibleLLMAdapter(
+        base_url=os.getenv("LLM_BACKEND_URL", "http://llm-worker:8002/v1"),
+        api_key=os.getenv("LLM_BACKEND_API_KEY"),
+        max_connections=int(os.getenv("LLM_BACKEND_MAX_CONNECTIONS", "64")),
+        timeout=float(os.getenv("LLM_BACKEND_TIMEOUT_S", "300"))
+    )
+else:
+    llm_adapter = QwenLocalAdapter()
+
+# Reranker tuỳ chọn: bỏ trống RERANK_API_URL để tắt bước rerank
+RERANK_API_URL = os.getenv("RERANK_API_URL")
+rerank_adapter = HttpRerankAdapter(api_url=RERANK_API_URL) if RERANK_API_URL else None
+
+answer_cache = None
+if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true":
+    answer_cache = SemanticAnswerCache(
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        max_bytes=int(float(os.getenv("ANSWER_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    )
 
+def _optional_float(name: str):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+retrieval_gate = RetrievalGate(
+    high_threshold=_optional_float("GATE_HIGH_SCORE"),
+    low_threshold=_optional_float("GATE_LOW_SCORE")
+)
+
+# Strict theo điều khớp chính xác nên được ưu tiên hơn semantic khi gộp
+fusion = ResultFusion(
+    method=os.getenv("FUSION_METHOD", ResultFusion.RRF),
+    weights=ResultFusion.parse_weights(os.getenv("FUSION_WEIGHTS", "semantic=1.0,strict=2.0")),
+    rrf_k=int(os.getenv("FUSION_RRF_K", "60")),
+    top_k=int(os.getenv("FUSION_TOP_K", "8"))
+)
+
+article_index = ArticleIndex() if os.getenv("ARTICLE_INDEX_ENABLED", "true").lower() == "true" else None
+
+single_flight = None
+if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true":
+    single_flight = SingleFlight(max_tracked_keys=int(os.getenv("SINGLE_FLIGHT_TRACKED_KEYS", "1000")))
 
 chat_service = ChatService(
     embedder=embedder_adapter,
     vector_db=weaviate_adapter,
-    llm=llm_adapter
+    llm=llm_adapter,
+    answer_cache=answer_cache,
+    retrieval_gate=retrieval_gate,
+    reranker=rerank_adapter,
+    fusion=fusion,
+    article_index=article_index,
+    single_flight=single_flight
 )
 
 set_chat_service(chat_service)
+
+if os.getenv("ADMISSION_ENABLED", "true").lower() == "true":
+    set_admission_controller(AdmissionController(
+        max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "16")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "30"))
+    ))
 app.include_router(router)
 
-@app.get("/health")
-def health_check():
-    return {"status": "ok", "service": "llm-gateway-local"}
+@app.on_event("startup")
+async def startup():
+    chat_service.start_article_index()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await chat_service.aclose()
 
 if __name__ == "__main__":
     import uvicorn
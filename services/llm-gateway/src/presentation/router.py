@@ -1,6 +1,10 @@
+import json
 import logging
+from typing import Callable, Optional
 from fastapi import APIRouter, HTTPException
-from src.domain.models import ChatQuery, ChatResponse
+from fastapi.responses import StreamingResponse
+from src.domain.models import ChatQuery, ChatResponse, DocumentsIndexedEvent
+from src.application.admission import AdmissionController, AdmissionRejected
 from src.application.chat_service import ChatService
 
 # Tạo Router
@@ -9,10 +13,25 @@ router = APIRouter()
 # Biến global để hứng Service được inject từ main
 chat_service_instance: ChatService = None
 
+# Giới hạn số request chat chạy đồng thời + hàng đợi (None = không giới hạn)
+admission_instance: AdmissionController = None
+
 def set_chat_service(service: ChatService):
     global chat_service_instance
     chat_service_instance = service
 
+def set_admission_controller(controller: AdmissionController):
+    global admission_instance
+    admission_instance = controller
+
+def _too_many_requests(e: AdmissionRejected) -> HTTPException:
+    logging.warning(f"Admission rejected: {e.reason}, retry after {e.retry_after}s")
+    return HTTPException(
+        status_code=429,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 @router.get("/health")
 async def health_check():
     if not chat_service_instance:
@@ -22,18 +41,110 @@ async def health_check():
     return {
         "status": "ready" if is_ready else "loading",
         "service": "llm-gateway",
-        "model_ready": is_ready
+        "model_ready": is_ready,
+        # Profile, thread, warm-up và tokens/s của backend LLM
+        "llm": chat_service_instance.llm.get_stats()
     }
 
+@router.get("/metrics")
+async def metrics():
+    if not chat_service_instance:
+        return {}
+    metrics = chat_service_instance.get_metrics()
+    if admission_instance:
+        metrics["admission"] = admission_instance.get_stats()
+    return metrics
+
+@router.post("/events/documents-indexed")
+async def documents_indexed(event: DocumentsIndexedEvent):
+    """indexing-service gọi sau khi ghi chunk mới vào Weaviate"""
+    if not chat_service_instance:
+        raise HTTPException(status_code=500, detail="Service not initialized")
+    chat_service_instance.on_documents_indexed(event)
+    return {"status": "ok"}
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(req: ChatQuery):
     if not chat_service_instance:
         raise HTTPException(status_code=500, detail="Service not initialized")
         
+    started = None
     try:
+        if admission_instance:
+            started = await admission_instance.acquire()
         # Presentation chỉ chuyển lời gọi vào Application Layer
         response = await chat_service_instance.process_question(req)
         return response
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
     except Exception as e:
         logging.error(f"System Error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    finally:
+        if started is not None:
+            admission_instance.release(started)
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse trả chỗ admission khi response kết thúc theo bất kỳ cách nào. finally trong
+    generator không đủ: client ngắt trước khi body bắt đầu (listener disconnect huỷ stream_response
+    hoặc send lỗi) thì generator không bao giờ chạy và chỗ bị giữ mãi.
+    """
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Đóng generator để pipeline (và model.generate) dừng khi client đã ngắt
+            await self.body_iterator.aclose()
+            self._release()
+
+def _release_once(started: Optional[float]) -> Callable[[], None]:
+    released = False
+
+    def release():
+        nonlocal released
+        if started is None or released:
+            return
+        released = True
+        admission_instance.release(started)
+    return release
+
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatQuery):
+    if not chat_service_instance:
+        raise HTTPException(status_code=500, detail="Service not initialized")
+
+    # Xin chỗ trước khi mở stream để còn trả được 429; chỗ được trả khi stream kết thúc
+    started = None
+    if admission_instance:
+        try:
+            started = await admission_instance.acquire()
+        except AdmissionRejected as e:
+            raise _too_many_requests(e)
+
+    release = _release_once(started)
+
+    async def event_source():
+        try:
+            async for event in chat_service_instance.stream_question(req):
+                yield _format_sse(event["event"], event["data"])
+        except Exception as e:
+            logging.error(f"System Error (stream): {str(e)}")
+            yield _format_sse("error", {"detail": "Internal Server Error"})
+        finally:
+            # Trả chỗ ngay khi sinh xong; response cũng gọi lại (idempotent) cho các đường thoát khác
+            release()
+
+    return _AdmittedStreamingResponse(
+        event_source(),
+        release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,193 @@
+# src/worker/main.py
+"""
+Generation worker tham chiếu: phục vụ model Qwen qua API tương thích OpenAI để
+llm-gateway (LLM_BACKEND=remote) có thể scale tách khỏi tầng model.
+
+    uvicorn src.worker.main:app --host 0.0.0.0 --port 8002
+
+Hỗ trợ tập con của /v1/chat/completions mà OpenAICompatibleLLMAdapter dùng:
+- stream (SSE, kết thúc bằng data: [DONE])
+- chat_template_kwargs.enable_thinking
+- thinking_budget / answer_max_tokens (mở rộng, ánh xạ vào GenerationProfile)
+- logprobs + top_logprobs khi max_tokens=1 (grader)
+"""
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from src.domain.models import GenerationProfile
+from src.infrastructure.llm_adapter import QwenLocalAdapter
+
+logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+logger = logging.getLogger("llm-worker")
+
+app = FastAPI(title="Vietnamese Law LLM Worker")
+llm_adapter = QwenLocalAdapter()
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatCompletionRequest(BaseModel):
+    model: Optional[str] = None
+    messages: List[ChatMessage]
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    stream: bool = False
+    logprobs: bool = False
+    top_logprobs: Optional[int] = None
+    chat_template_kwargs: Dict[str, Any] = {}
+    thinking_budget: Optional[int] = None
+    answer_max_tokens: Optional[int] = None
+
+
+def _split_messages(messages: List[ChatMessage]):
+    system_prompt = "\n".join(m.content for m in messages if m.role == "system")
+    user_prompt = "\n".join(m.content for m in messages if m.role == "user")
+    return system_prompt, user_prompt
+
+
+def _to_profile(req: ChatCompletionRequest) -> GenerationProfile:
+    default = GenerationProfile()
+    do_sample = req.temperature is None or req.temperature > 0
+    return GenerationProfile(
+        enable_thinking=req.chat_template_kwargs.get("enable_thinking", True),
+        max_new_tokens=req.max_tokens or default.max_new_tokens,
+        do_sample=do_sample,
+        temperature=req.temperature if do_sample and req.temperature is not None else default.temperature,
+        top_p=req.top_p if req.top_p is not None else default.top_p,
+        thinking_budget=req.thinking_budget,
+        answer_max_tokens=req.answer_max_tokens
+    )
+
+
+def _completion(model: str, content: str, usage: Optional[dict] = None, logprobs: Optional[dict] = None) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "logprobs": logprobs,
+            "finish_reason": "stop"
+        }],
+        "usage": usage or {}
+    }
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason: Optional[str] = None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _stream_in_thread(gen_fn, *args):
+    """Chạy generator đồng bộ trong thread; client ngắt thì đóng generator để dừng model.generate"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    cancelled = threading.Event()
+
+    def _produce():
+        iterator = gen_fn(*args)
+        try:
+            for item in iterator:
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            iterator.close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = loop.run_in_executor(None, _produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        await producer
+
+
+@app.get("/health")
+def health_check():
+    return {"status": "ready" if llm_adapter.is_ready else "loading", "llm": llm_adapter.get_stats()}
+
+
+@app.get("/v1/models")
+def list_models():
+    return {"object": "list", "data": [{"id": llm_adapter.model_name, "object": "model", "owned_by": "local"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(req: ChatCompletionRequest):
+    if not llm_adapter.is_ready:
+        raise HTTPException(status_code=503, detail="Model is loading")
+
+    model = req.model or llm_adapter.model_name
+    system_prompt, user_prompt = _split_messages(req.messages)
+    loop = asyncio.get_running_loop()
+
+    # Grader: chỉ cần phân phối của token đầu tiên
+    if req.logprobs and req.max_tokens == 1:
+        top = await loop.run_in_executor(
+            None, llm_adapter.first_token_logprobs, system_prompt, user_prompt, req.top_logprobs or 20
+        )
+        top_logprobs = [{"token": token, "logprob": logprob} for token, logprob in top]
+        logprobs = {"content": [{**top_logprobs[0], "top_logprobs": top_logprobs}]}
+        return _completion(model, top[0][0], usage={"completion_tokens": 1}, logprobs=logprobs)
+
+    profile = _to_profile(req)
+    if not req.stream:
+        result = await loop.run_in_executor(None, llm_adapter.generate, system_prompt, user_prompt, profile)
+        usage = {
+            "completion_tokens": result.thinking_tokens + result.answer_tokens,
+            "completion_tokens_details": {"reasoning_tokens": result.thinking_tokens}
+        }
+        return _completion(model, result.text, usage=usage)
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    async def event_source():
+        yield _chunk(completion_id, model, {"role": "assistant"})
+        try:
+            async for text in _stream_in_thread(llm_adapter.stream_answer, system_prompt, user_prompt, profile):
+                yield _chunk(completion_id, model, {"content": text})
+        except Exception as e:
+            # Status 200 đã gửi: báo lỗi bằng event "error" (như vLLM/OpenAI) và không gửi [DONE]
+            yield f"data: {json.dumps({'error': {'message': str(e), 'type': 'server_error'}}, ensure_ascii=False)}\n\n"
+            return
+        yield _chunk(completion_id, model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Cho phép import "src.*" khi chạy pytest từ thư mục service
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,45 @@
+from src.application.answer_cache import SemanticAnswerCache
+from src.domain.models import ChatResponse
+
+# Hai câu hỏi chỉ khác số điều có embedding gần như trùng nhau
+EMBEDDING = [0.6, 0.8, 0.0]
+NEAR_EMBEDDING = [0.6, 0.79, 0.01]
+
+
+def answer(text: str) -> ChatResponse:
+    return ChatResponse(answer=text, sources=["luat_dat_dai_2013.pdf"], answer_tokens=10)
+
+
+def test_semantic_hit_requires_the_same_citations():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.put("so sánh Điều 8 và Điều 7 Luật Đất đai", EMBEDDING, answer("Điều 8 và Điều 7 ..."))
+
+    assert cache.get("so sánh Điều 8 và Điều 9 Luật Đất đai", NEAR_EMBEDDING) is None
+    assert cache.get_stats()["citation_mismatches"] == 1
+
+
+def test_semantic_hit_with_same_citations_in_other_words():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.put("so sánh Điều 8 và Điều 7 Luật Đất đai", EMBEDDING, answer("Điều 8 và Điều 7 ..."))
+
+    cached = cache.get("Điều 7 và Điều 8 Luật Đất đai có gì khác nhau", NEAR_EMBEDDING)
+
+    assert cached is not None and cached.answer == "Điều 8 và Điều 7 ..."
+    assert cache.get_stats()["semantic_hits"] == 1
+
+
+def test_matching_entry_is_found_behind_a_closer_mismatch():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.put("Điều 9 Luật Đất đai quy định gì", EMBEDDING, answer("Điều 9 ..."))
+    cache.put("Điều 8 Luật Đất đai quy định gì", NEAR_EMBEDDING, answer("Điều 8 ..."))
+
+    cached = cache.get("Điều 8 Luật Đất đai quy định những gì", EMBEDDING)
+
+    assert cached is not None and cached.answer == "Điều 8 ..."
+
+
+def test_questions_without_citations_still_match_semantically():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.put("Thời gian thử việc tối đa là bao lâu?", EMBEDDING, answer("Không quá 180 ngày ..."))
+
+    assert cache.get("Thử việc được tối đa bao nhiêu ngày", NEAR_EMBEDDING) is not None
@@ -0,0 +1,262 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from transformers import BatchEncoding, Qwen3Config, Qwen3ForCausalLM
+
+from src.domain.models import HYDE_PROFILE, GenerationProfile
+from src.infrastructure.assisted_decoding import AssistedDecoding
+from src.infrastructure.generation_scheduler import GenerationScheduler
+from src.infrastructure.llm_adapter import QwenLocalAdapter
+from src.infrastructure.prefix_cache import PrefixKVCache
+
+PAD_ID = 0
+PREFIX = [5, 6, 7, 8, 9, 10]
+PROMPT = PREFIX + [11, 12, 13]
+
+
+class IdTokenizer:
+    """Prompt là chuỗi token id cách nhau bởi dấu cách; padding trái như tokenizer thật của gateway"""
+    pad_token_id = PAD_ID
+    eos_token_id = 1
+
+    def apply_chat_template(self, messages, **kwargs):
+        # Mỗi system prompt thành một token riêng để test nhận ra lời gọi nào đã chạy
+        system = next(m["content"] for m in messages if m["role"] == "system")
+        return f"{10 + len(system)} 3 4"
+
+    def decode(self, token_ids, skip_special_tokens=True):
+        return " ".join(str(t) for t in token_ids if t != PAD_ID)
+
+    def __call__(self, prompts, return_tensors="pt", padding=True):
+        rows = [[int(t) for t in p.split()] for p in prompts]
+        width = max(len(r) for r in rows)
+        input_ids = [[PAD_ID] * (width - len(r)) + r for r in rows]
+        attention_mask = [[0] * (width - len(r)) + [1] * len(r) for r in rows]
+        return BatchEncoding({
+            "input_ids": torch.tensor(input_ids),
+            "attention_mask": torch.tensor(attention_mask)
+        })
+
+
+def tiny_qwen3(num_layers: int, seed: int):
+    torch.manual_seed(seed)
+    config = Qwen3Config(
+        vocab_size=128, hidden_size=64, intermediate_size=128, num_hidden_layers=num_layers,
+        num_attention_heads=4, num_key_value_heads=2, head_dim=16, max_position_embeddings=256,
+        pad_token_id=PAD_ID, eos_token_id=1, bos_token_id=2
+    )
+    return Qwen3ForCausalLM(config).eval()
+
+
+def batches_run(scheduler, timeout: float = 5.0) -> int:
+    # Số batch được cộng sau khi future đã có kết quả
+    deadline = time.monotonic() + timeout
+    while scheduler.get_stats()["batches"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return scheduler.get_stats()["batches"]
+
+
+def plain_greedy(model, prompt, max_new_tokens):
+    input_ids = torch.tensor([prompt])
+    with torch.no_grad():
+        output = model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=PAD_ID
+        )
+    return output[0, len(prompt):].tolist()
+
+
+def test_draft_with_prefix_cache_matches_plain_greedy():
+    target = tiny_qwen3(num_layers=2, seed=0)
+    draft = tiny_qwen3(num_layers=1, seed=1)
+    expected = plain_greedy(target, PROMPT, max_new_tokens=10)
+
+    prefix_cache = PrefixKVCache(target)
+    prefix_cache.register(PREFIX)
+    scheduler = GenerationScheduler(
+        target,
+        IdTokenizer(),
+        max_wait_ms=0,
+        prefix_cache=prefix_cache,
+        assisted=AssistedDecoding(target, draft)
+    )
+
+    output = scheduler.submit(" ".join(map(str, PROMPT)), max_new_tokens=10, do_sample=False).result(timeout=60)
+
+    assert output == expected
+    assert scheduler.assisted.get_stats()["calls"] == 1
+    # Draft đang dùng nên generate không nhận KV của prefix
+    assert prefix_cache.get_stats()["hits"] == 0
+
+
+def test_prefix_cache_alone_matches_plain_greedy():
+    target = tiny_qwen3(num_layers=2, seed=0)
+    expected = plain_greedy(target, PROMPT, max_new_tokens=10)
+
+    prefix_cache = PrefixKVCache(target)
+    prefix_cache.register(PREFIX)
+    scheduler = GenerationScheduler(target, IdTokenizer(), max_wait_ms=0, prefix_cache=prefix_cache)
+
+    output = scheduler.submit(" ".join(map(str, PROMPT)), max_new_tokens=10, do_sample=False).result(timeout=60)
+
+    assert output == expected
+    assert prefix_cache.get_stats()["hits"] == 1
+
+
+class ScriptedModel:
+    """
+    Model giả cho scheduler: mỗi bước decode sinh token 7 và hỏi stopping_criteria như generate thật.
+    Prompt bắt đầu bằng BLOCKER_ID chờ release trước khi sinh, để giữ worker bận.
+    """
+    device = "cpu"
+    BLOCKER_ID = 99
+
+    def __init__(self, step_seconds: float = 0.01):
+        self.step_seconds = step_seconds
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.prompts = []
+        self.steps = []
+
+    def generate(self, input_ids, attention_mask, pad_token_id, max_new_tokens, stopping_criteria=None, **kwargs):
+        self.prompts.append([row[mask.bool()].tolist() for row, mask in zip(input_ids, attention_mask)])
+        self.started.set()
+        if self.BLOCKER_ID in input_ids[0].tolist():
+            self.release.wait(10)
+        output = input_ids
+        for step in range(max_new_tokens):
+            time.sleep(self.step_seconds)
+            output = torch.cat([output, torch.full((output.shape[0], 1), 7)], dim=1)
+            if stopping_criteria is not None and stopping_criteria[0](output, None).all():
+                break
+        self.steps.append(step + 1)
+        return output
+
+
+def ready_adapter(monkeypatch, model, max_batch_size: int = 1, max_wait_ms: float = 0) -> QwenLocalAdapter:
+    monkeypatch.setattr(QwenLocalAdapter, "_load_model", lambda self: None)
+    adapter = QwenLocalAdapter("test-model")
+    adapter.tokenizer = IdTokenizer()
+    adapter.model = model
+    adapter.scheduler = GenerationScheduler(model, adapter.tokenizer, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    adapter._is_ready = True
+    return adapter
+
+
+def test_cancelled_hyde_never_reaches_the_model(monkeypatch):
+    model = ScriptedModel()
+    adapter = ready_adapter(monkeypatch, model)
+    blocker = adapter.scheduler.submit(f"{ScriptedModel.BLOCKER_ID} 3 4", max_new_tokens=2, do_sample=False)
+    assert model.started.wait(5)
+
+    async def scenario():
+        # HyDE suy đoán xếp hàng sau lượt sinh đang chạy rồi bị huỷ (grader đã trả lời YES)
+        hyde = asyncio.ensure_future(adapter.agenerate("Bạn là chuyên gia luật.", "Thử việc bao lâu?", HYDE_PROFILE))
+        await asyncio.sleep(0.05)
+        hyde.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await hyde
+
+    asyncio.run(scenario())
+    model.release.set()
+    blocker.result(timeout=5)
+    follow_up = adapter.scheduler.submit("5 3 4", max_new_tokens=1, do_sample=False)
+    follow_up.result(timeout=5)
+
+    hyde_token = 10 + len("Bạn là chuyên gia luật.")
+    assert [p[0][0] for p in model.prompts] == [ScriptedModel.BLOCKER_ID, 5]
+    assert all(p[0][0] != hyde_token for p in model.prompts)
+
+
+def test_cancelling_a_running_generation_stops_decoding(monkeypatch):
+    model = ScriptedModel(step_seconds=0.01)
+    adapter = ready_adapter(monkeypatch, model)
+
+    async def scenario():
+        task = asyncio.ensure_future(adapter.agenerate("Bạn là chuyên gia luật.", "Thử việc bao lâu?", HYDE_PROFILE))
+        await asyncio.get_running_loop().run_in_executor(None, model.started.wait, 5)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    deadline = time.monotonic() + 5
+    while not model.steps and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # HYDE_PROFILE cho phép hàng trăm token; huỷ giữa chừng phải dừng sau vài bước
+    assert model.steps and model.steps[0] < 50
+
+
+def test_streams_share_a_padded_batch_with_generate():
+    model = tiny_qwen3(num_layers=2, seed=0)
+    scheduler = GenerationScheduler(model, IdTokenizer(), max_batch_size=8, max_wait_ms=200)
+    streamed = {"a": [], "b": []}
+
+    futures = {
+        "a": scheduler.submit("5 6 7", on_tokens=streamed["a"].extend, max_new_tokens=6, do_sample=False),
+        "b": scheduler.submit("8 9", on_tokens=streamed["b"].extend, max_new_tokens=6, do_sample=False),
+        "plain": scheduler.submit("5 6 7", max_new_tokens=6, do_sample=False)
+    }
+    results = {name: future.result(timeout=60) for name, future in futures.items()}
+
+    assert batches_run(scheduler) == 1
+    for name in ("a", "b"):
+        assert streamed[name] == [t for t in results[name] if t != PAD_ID]
+    # Dòng stream và dòng generate cùng prompt cho cùng kết quả greedy
+    assert results["a"] == results["plain"]
+
+
+def test_streamed_draft_tokens_match_the_result():
+    target = tiny_qwen3(num_layers=2, seed=0)
+    draft = tiny_qwen3(num_layers=1, seed=1)
+    scheduler = GenerationScheduler(target, IdTokenizer(), max_wait_ms=0, assisted=AssistedDecoding(target, draft))
+    streamed = []
+
+    output = scheduler.submit(" ".join(map(str, PROMPT)), on_tokens=streamed.extend, max_new_tokens=10, do_sample=False).result(timeout=60)
+
+    assert streamed == [t for t in output if t != PAD_ID]
+    assert output == plain_greedy(target, PROMPT, max_new_tokens=10)
+
+
+def test_stream_answer_is_batched_with_generate(monkeypatch):
+    model = tiny_qwen3(num_layers=2, seed=0)
+    adapter = ready_adapter(monkeypatch, model, max_batch_size=8, max_wait_ms=200)
+    profile = GenerationProfile(enable_thinking=False, max_new_tokens=8, do_sample=False)
+    results = {}
+
+    def run_generate():
+        results["generate"] = adapter.generate("Bạn là trợ lý luật.", "Thử việc bao lâu?", profile).text
+
+    thread = threading.Thread(target=run_generate)
+    thread.start()
+    streamed = "".join(adapter.stream_answer("Bạn là trợ lý luật.", "Thử việc bao lâu?", profile))
+    thread.join(60)
+
+    assert batches_run(adapter.scheduler) == 1
+    assert streamed == results["generate"]
+
+
+def test_interactive_request_overtakes_queued_background_work():
+    model = ScriptedModel(step_seconds=0)
+    scheduler = GenerationScheduler(model, IdTokenizer(), max_batch_size=1, max_wait_ms=0)
+    blocker = scheduler.submit(f"{ScriptedModel.BLOCKER_ID} 3 4", max_new_tokens=1, do_sample=False)
+    assert model.started.wait(5)
+
+    # Grader/HyDE (priority 1) xếp hàng trước câu trả lời cuối (priority 0) trong lúc model bận
+    background = [scheduler.submit(f"{40 + i} 3 4", priority=1, max_new_tokens=1, do_sample=False) for i in range(3)]
+    interactive = scheduler.submit("30 3 4", priority=0, max_new_tokens=1, do_sample=False)
+    model.release.set()
+    for future in [blocker, interactive, *background]:
+        future.result(timeout=5)
+
+    assert [p[0][0] for p in model.prompts] == [ScriptedModel.BLOCKER_ID, 30, 40, 41, 42]